@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time the construction of the Activity Graph igraph of synthetic scenes of increasing numbers of episodes, with
+a temporal node for every pair of episodes ("all") or only within temporal horizons.
+
+Example:
+    ./benchmark_graph.py --episodes 100 500 2000 --temporal_horizons 0 30
+"""
+from __future__ import print_function, division
+import argparse
+import timeit
+from benchmark_graphlets import make_episodes
+from qsrlib_qstag.qstag import get_graph
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--episodes", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--objects", type=int, default=6)
+    parser.add_argument("--mean_length", type=int, default=10)
+    parser.add_argument("--temporal_horizons", type=int, nargs="*", default=[0, 30])
+    args = parser.parse_args()
+
+    print("%8s %8s %10s %10s %10s" % ("episodes", "horizon", "vertices", "edges", "seconds"))
+    for num_of_episodes in args.episodes:
+        # the episodes of all the pairs of objects, over the frames needed for num_of_episodes of them
+        pairs = args.objects * (args.objects - 1) // 2
+        episodes, object_types = make_episodes(args.objects, num_of_episodes * args.mean_length // pairs + 1,
+                                               args.mean_length)
+        episodes = episodes[:num_of_episodes]
+        for temporal_horizon in [None] + args.temporal_horizons:
+            result = []
+            secs = timeit.timeit(lambda: result.append(get_graph(episodes, object_types,
+                                                                 temporal_horizon=temporal_horizon)), number=1)
+            graph = result.pop()[0]
+            print("%8d %8s %10d %10d %10.3f" % (len(episodes), "all" if temporal_horizon is None else temporal_horizon,
+                                                graph.vcount(), graph.ecount(), secs))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time the graphlet selection of the QSTAG on synthetic scenes of many objects, with and without the caps.
+
+Every pair of objects gets a row of episodes of random lengths covering the whole scene.
+
+Example:
+    ./benchmark_graphlets.py --objects 50 --frames 300 --max_rows 1 2 --max_row_combinations 2000
+    ./benchmark_graphlets.py --objects 50 --max_rows 2 --processes 1 8
+"""
+from __future__ import print_function, division
+import argparse
+import random
+import timeit
+from itertools import combinations
+from qsrlib_qstag.qstag import get_graphlet_selections
+
+
+def make_episodes(objects, frames, mean_length, seed=0):
+    rng = random.Random(seed)
+    names = ["o%d" % i for i in range(objects)]
+    episodes = []
+    for pair in combinations(names, 2):
+        start = 0
+        while start < frames:
+            end = min(start + rng.randint(1, 2*mean_length), frames) - 1
+            episodes.append((list(pair), {"argd": rng.choice(["touch", "near", "far"])}, (start, end)))
+            start = end + 1
+    return episodes, dict((name, "unknown") for name in names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--mean_length", type=int, default=30)
+    parser.add_argument("--max_eps", type=int, default=3)
+    parser.add_argument("--max_rows", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--max_row_combinations", type=int, default=2000)
+    parser.add_argument("--max_graphlets", type=int, default=20000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1])
+    args = parser.parse_args()
+
+    print("%8s %8s %9s %10s %10s %10s %12s %10s" % ("objects", "episodes", "max_rows", "capped", "processes", "graphlets",
+                                                      "unique", "seconds"))
+    for objects in args.objects:
+        episodes, object_types = make_episodes(objects, args.frames, args.mean_length)
+        for max_rows in args.max_rows:
+            for capped in (False, True):
+                params = {"min_rows": 1, "max_rows": max_rows, "max_eps": args.max_eps}
+                if capped:
+                    params.update({"max_row_combinations": args.max_row_combinations,
+                                   "max_graphlets": args.max_graphlets})
+                elif max_rows > 1 and objects > 10:
+                    # the full enumeration over all combinations of rows does not finish in a sensible time
+                    continue
+                for processes in args.processes:
+                    params["processes"] = processes
+                    result = []
+                    secs = timeit.timeit(lambda: result.append(get_graphlet_selections(episodes, params, object_types)),
+                                         number=1)
+                    graphlets, hashes, _ = result[0]
+                    print("%8d %8d %9d %10s %10d %10d %12d %10.3f" % (objects, len(episodes), max_rows, capped,
+                                                                      processes, len(hashes), len(set(hashes)), secs))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time the QTC variants on synthetic random walks of two objects of increasing length.
+
+Example:
+    ./benchmark_qtc.py --frames 1000 10000 100000 1000000 --qsrs qtcbs qtccs qtcbcs
+"""
+from __future__ import print_function, division
+import argparse
+import timeit
+import numpy as np
+from qsrlib.qsrlib import QSRlib, QSRlib_Request_Message
+from qsrlib_io.world_trace_columnar import World_Trace_Columnar
+
+
+def make_world(frames, seed=0):
+    rng = np.random.RandomState(seed)
+    world = World_Trace_Columnar()
+    t = np.arange(frames)
+    for name in ("o1", "o2"):
+        xy = np.cumsum(rng.normal(scale=0.5, size=(frames, 2)), axis=0)
+        world.add_object_track_from_arrays(name, t, xy[:, 0], xy[:, 1])
+    return world
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--qsrs", type=str, nargs="+", default=["qtcbs", "qtccs", "qtcbcs"])
+    parser.add_argument("--no_collapse", action="store_true")
+    parser.add_argument("--no_validate", action="store_true")
+    args = parser.parse_args()
+
+    qsrlib = QSRlib()
+    dynamic_args = {"qtcs": {"no_collapse": args.no_collapse, "validate": not args.no_validate}}
+    print("%10s %8s %12s %14s" % ("frames", "qsr", "seconds", "us/frame"))
+    for frames in args.frames:
+        world = make_world(frames)
+        for which_qsr in args.qsrs:
+            req = QSRlib_Request_Message(which_qsr, world, dynamic_args)
+            secs = timeit.timeit(lambda: qsrlib.request_qsrs(req), number=1)
+            print("%10d %8s %12.3f %14.2f" % (frames, which_qsr, secs, 1e6*secs/frames))
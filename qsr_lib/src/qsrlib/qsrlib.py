@@ -5,6 +5,7 @@ from datetime import datetime
 from qsrlib_io.world_trace import World_Trace
 from qsrlib_utils.utils import merge_world_qsr_traces
 from qsrlib_utils.filters import *
+from qsrlib_utils.parallel import get_parallel_params, compute_qsrs
 from qsrlib_qsrs import *
 from qsrlib_qstag.qstag import Activity_Graph
 
@@ -151,13 +152,12 @@ class QSRlib(object):
         :rtype: QSRlib_Response_Message
         """
         req_received_at = datetime.now()
-        world_qsr_traces = []
 
         # which_qsrs should always be iterable, even it is only a string, to enable the loop
         which_qsrs = req_msg.which_qsr if isinstance(req_msg.which_qsr, (list, tuple)) else [req_msg.which_qsr]
-        for which_qsr in which_qsrs:
-            world_qsr_traces.append(self.__qsrs_registry[which_qsr].get_qsrs(input_data=req_msg.input_data,
-                                                                             dynamic_args=req_msg.dynamic_args))
+        # the QSRs are computed in worker processes if requested in the dynamic args
+        world_qsr_traces = compute_qsrs(self.__qsrs_registry, which_qsrs, req_msg.input_data, req_msg.dynamic_args,
+                                        get_parallel_params(req_msg.dynamic_args))
         if world_qsr_traces:
             # If the input was a list of QSRs, merge the results
             if isinstance(req_msg.which_qsr, (list, tuple)):
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import print_function, division
+import numpy as np
+from qsrlib_io.world_trace import World_Trace
+from qsrlib_io.world_qsr_trace import World_QSR_Trace, QSR
+from qsrlib_utils.utils import merge_world_qsr_traces
+from qsrlib_utils.filters import Streaming_Median_Filter
+from qsrlib_qsrs.qsr_dyadic_abstractclass import QSR_Dyadic_1t_Abstractclass
+from qsrlib_qsrs.qsr_triadic_abstractclass import QSR_Triadic_1t_Abstractclass
+from qsrlib_qsrs.qsr_monadic_abstractclass import QSR_Monadic_2t_Abstractclass
+from qsrlib_qsrs.qsr_qtc_simplified_abstractclass import QSR_QTC_Simplified_Abstractclass
+
+
+class QSRlib_Session(object):
+    """Compute QSRs incrementally over a live stream of world states.
+
+    The world states are pushed one at a time, in increasing timestamps order, and each push returns only the QSRs
+    that it added. The session keeps what each QSR needs to carry over between timestamps, i.e. the previous world
+    state, the last QTC state of each pair and the median filter windows, so the cost of a push does not depend on
+    how long the session has run.
+
+    Put together, the QSRs returned by the pushes and the final :meth:`flush` are the ones
+    :meth:`QSRlib.request_qsrs <qsrlib.qsrlib.QSRlib.request_qsrs>` returns for the whole trace. In particular the
+    collapsed or validated QTC states are keyed by their index in the sequence of their pair, as in a request.
+
+    Example::
+
+        session = QSRlib_Session(qsrlib, ["rcc8", "qtccs"], dynamic_args)
+        for world_state in tracker_feed:
+            world_qsr_trace = session.push(world_state)
+        world_qsr_trace = session.flush()
+    """
+
+    def __init__(self, qsrlib, which_qsr, dynamic_args={}):
+        """Constructor.
+
+        :param qsrlib: The QSRlib whose QSRs are computed.
+        :type qsrlib: :class:`QSRlib <qsrlib.qsrlib.QSRlib>`
+        :param which_qsr: Name(s) of the wanted QSR(s) to be computed.
+        :type which_qsr: str or list of str
+        :param dynamic_args: User args, as in a request; the QSTAG cannot be computed incrementally.
+        :type dynamic_args: dict
+        :raises ValueError: When a QSR or the QSTAG cannot be computed incrementally.
+        """
+        if "qstag" in dynamic_args:
+            raise ValueError("the QSTAG needs the whole trace and cannot be computed incrementally")
+
+        self.__which_qsrs = list(which_qsr) if isinstance(which_qsr, (list, tuple)) else [which_qsr]
+        """list of str: Names of the QSRs to be computed."""
+
+        self.__qsr_type = ",".join(which_qsr) if isinstance(which_qsr, (list, tuple)) else which_qsr
+        """str: QSR type of the returned World QSR traces."""
+
+        self.__qsrs = {}
+        """dict: The QSRs objects, keyed by their names."""
+
+        self.__qsr_params = {}
+        """dict: The QSR specific parameters of the QTC QSRs, keyed by their names."""
+
+        self.__qtc_states = {}
+        """dict: The last QTC state and the number of states so far of each pair, for each QTC QSR."""
+
+        for name in self.__which_qsrs:
+            qsr = qsrlib.qsrs_registry[name]
+            if isinstance(qsr, QSR_QTC_Simplified_Abstractclass):
+                self.__qsr_params[name] = qsr._process_qsr_parameters_from_request_parameters(
+                    {"dynamic_args": dynamic_args})
+                self.__qtc_states[name] = {}
+            elif not isinstance(qsr, (QSR_Dyadic_1t_Abstractclass, QSR_Triadic_1t_Abstractclass,
+                                      QSR_Monadic_2t_Abstractclass)):
+                raise ValueError("%s cannot be computed incrementally" % name)
+            self.__qsrs[name] = qsr
+
+        self.__dynamic_args = dynamic_args
+        """dict: User args."""
+
+        self.__median_filter_window = None
+        """int: Window of the median filter, None if not requested."""
+        for filter_, params in dynamic_args.get("filters", {}).items():
+            if filter_ != "median_filter":
+                raise ValueError("%s cannot be applied incrementally" % filter_)
+            self.__median_filter_window = params["window"]
+
+        self.__median_filters = {}
+        """dict: The median filter of each pair of objects and QSR."""
+
+        self.__previous_world_state = None
+        """:class:`World_State <qsrlib_io.world_trace.World_State>`: The last accepted world state."""
+
+    def push(self, world_state):
+        """Compute the QSRs of a new world state.
+
+        If a QSR rejects the world state, the error is raised and the session is left as it was before the push, so
+        that the next world state is computed against the last accepted one.
+
+        :param world_state: The world state, whose timestamp has to be greater than those pushed before.
+        :type world_state: :class:`World_State <qsrlib_io.world_trace.World_State>`
+        :return: The new QSRs. With a median filter they are those whose filtered value became known, which are a few
+        timestamps late.
+        :rtype: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        :raises ValueError: When the timestamp is not greater than the previous one.
+        """
+        previous = self.__previous_world_state
+        if previous is not None and not world_state.timestamp > previous.timestamp:
+            raise ValueError("world states have to be pushed in increasing timestamps order")
+
+        world_qsr_traces = []
+        qtc_states = {}
+        for name in self.__which_qsrs:
+            if name in self.__qtc_states:
+                world_qsr_trace, qtc_states[name] = self.__compute_qtc(name, previous, world_state)
+                world_qsr_traces.append(world_qsr_trace)
+            else:
+                world_qsr_traces.append(self.__compute_windowed(name, previous, world_state))
+        world_qsr_trace = merge_world_qsr_traces(world_qsr_traces, self.__qsr_type)
+
+        # All the QSRs accepted the world state, so the session moves on to it.
+        self.__previous_world_state = world_state
+        for name, states in qtc_states.items():
+            self.__qtc_states[name].update(states)
+
+        if self.__median_filter_window is None:
+            return world_qsr_trace
+        return self.__filter(world_qsr_trace)
+
+    def flush(self):
+        """End the session and return the QSRs held back by the median filter.
+
+        :return: The remaining QSRs.
+        :rtype: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        """
+        ret = World_QSR_Trace(qsr_type=self.__qsr_type)
+        for (between, name), median_filter in sorted(self.__median_filters.items()):
+            for t, v in median_filter.flush():
+                self.__add_qsr(ret, t, between, name, v)
+        self.__median_filters = {}
+        return ret
+
+    def __compute_windowed(self, name, previous, world_state):
+        """Compute a QSR over one timestamp, or two for QSRs that need the previous one.
+
+        :param name: Name of the QSR.
+        :type name: str
+        :param previous: The previous world state, None at the start.
+        :type previous: :class:`World_State <qsrlib_io.world_trace.World_State>`
+        :param world_state: The new world state.
+        :type world_state: :class:`World_State <qsrlib_io.world_trace.World_State>`
+        :return: The QSRs of the new world state.
+        :rtype: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        """
+        qsr = self.__qsrs[name]
+        trace = {world_state.timestamp: world_state}
+        if isinstance(qsr, QSR_Monadic_2t_Abstractclass):
+            if previous is None:
+                return World_QSR_Trace(qsr_type=name)
+            trace[previous.timestamp] = previous
+        return qsr.get_qsrs(input_data=World_Trace(trace=trace), dynamic_args=self.__dynamic_args)
+
+    def __compute_qtc(self, name, previous, world_state):
+        """Compute the new QTC states of each pair, collapsing and validating them against the last state of the pair.
+
+        The last state of each pair is not updated, so that it can be left as it was if another QSR rejects the world
+        state; the updates are returned instead.
+
+        :param name: Name of the QTC QSR.
+        :type name: str
+        :param previous: The previous world state, None at the start.
+        :type previous: :class:`World_State <qsrlib_io.world_trace.World_State>`
+        :param world_state: The new world state.
+        :type world_state: :class:`World_State <qsrlib_io.world_trace.World_State>`
+        :return: The new QTC states, keyed by their index in the sequence of their pair, or by the timestamp of the
+        world state if they are neither collapsed nor validated, and the new last state and number of states of each
+        pair.
+        :rtype: (:class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`, dict)
+        """
+        ret = World_QSR_Trace(qsr_type=name)
+        if previous is None:
+            return ret, {}
+        qsr, qsr_params = self.__qsrs[name], self.__qsr_params[name]
+        world_trace = World_Trace(trace={previous.timestamp: previous, world_state.timestamp: world_state})
+        qsr._custom_checks_world_trace(world_trace, qsr_params)
+        qtc_sequence = qsr._make_qtc_sequences(world_trace, [previous.timestamp, world_state.timestamp], qsr_params,
+                                               {"input_data": world_trace, "dynamic_args": self.__dynamic_args}, ret)
+
+        states = self.__qtc_states[name]
+        new_states = {}
+        for between, qtc in qtc_sequence.items():
+            qtc = qtc.reshape(-1)
+            try:
+                last, count = states[between]
+            except KeyError:
+                new = [qtc]
+                count = 0
+            else:
+                sequence = np.array([last, qtc])
+                if not qsr_params["no_collapse"] and len(qsr._collapse_similar_states(sequence.copy())) == 1:
+                    new = []
+                elif qsr_params["validate"]:
+                    new = qsr._validate_qtc_sequence(sequence)[1:]
+                else:
+                    new = [qtc]
+            new_states[between] = (qtc, count+len(new))
+            for q in new:
+                count += 1
+                t = world_state.timestamp if qsr_params["no_collapse"] and not qsr_params["validate"] else count
+                ret.add_qsr(QSR(timestamp=t, between=between, qsr=qsr.qtc_to_output_format(q)), t)
+        return ret, new_states
+
+    def __filter(self, world_qsr_trace):
+        """Pass the new QSRs through the median filter of their pair of objects and QSR.
+
+        :param world_qsr_trace: The new QSRs.
+        :type world_qsr_trace: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        :return: The QSRs whose filtered value became known.
+        :rtype: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        """
+        ret = World_QSR_Trace(qsr_type=self.__qsr_type)
+        for t in world_qsr_trace.get_sorted_timestamps():
+            for between, qsr in world_qsr_trace.trace[t].qsrs.items():
+                for name, v in qsr.qsr.items():
+                    try:
+                        median_filter = self.__median_filters[(between, name)]
+                    except KeyError:
+                        median_filter = Streaming_Median_Filter(self.__median_filter_window)
+                        self.__median_filters[(between, name)] = median_filter
+                    for filtered_t, filtered_v in median_filter.push(t, v):
+                        self.__add_qsr(ret, filtered_t, between, name, filtered_v)
+        return ret
+
+    def __add_qsr(self, world_qsr_trace, t, between, name, v):
+        """Add the value of a QSR to a World QSR trace, next to the other QSRs of the pair at that timestamp.
+
+        :param world_qsr_trace: The World QSR trace.
+        :type world_qsr_trace: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        :param t: Timestamp.
+        :type t: float
+        :param between: The objects of the QSR.
+        :type between: str
+        :param name: Name of the QSR.
+        :type name: str
+        :param v: Value of the QSR.
+        :type v: str
+        """
+        try:
+            world_qsr_trace.trace[t].qsrs[between].qsr[name] = v
+        except KeyError:
+            world_qsr_trace.add_qsr(QSR(timestamp=t, between=between, qsr={name: v}), t)
@@ -0,0 +1,611 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division
+from collections import OrderedDict
+import numpy as np
+from qsrlib_io.world_trace import Object_State, World_State, World_Trace
+
+
+class Object_State_View(Object_State):
+    """Read/write view of one object at one timestamp of a :class:`World_Trace_Columnar`.
+
+    It behaves as an :class:`Object_State <qsrlib_io.world_trace.Object_State>` but its values live in the columns
+    of the trace. Values given as integers are returned as integers, the others as floats, and the rotation as a
+    tuple of floats. Views are invalidated if a timestamp earlier than theirs is later inserted in the trace.
+    """
+
+    def __init__(self, store, name, index):
+        """Constructor.
+
+        :param store: The trace whose columns are viewed.
+        :type store: World_Trace_Columnar
+        :param name: Name of the object.
+        :type name: str
+        :param index: Row of the timestamp in the columns of the trace.
+        :type index: int
+        """
+        self.__store = store
+        self.__index = index
+        self.name = name
+        args, kwargs = store._get_extras(name, float(store.timestamps[index]))
+        # the values are written back unchanged to the columns by the setters
+        super(Object_State_View, self).__init__(name, store.timestamps[index], self.x, self.y, self.z,
+                                                self.xsize, self.ysize, self.zsize, self.rotation, *args, **kwargs)
+
+    def __get(self, field):
+        c = self.__store._get_columns(self.name)
+        v = c[field][self.__index]
+        return int(v) if c["integer"][self.__index, World_Trace_Columnar._field_index[field]] else float(v)
+
+    def __set(self, field, v):
+        c = self.__store._get_columns(self.name)
+        c[field][self.__index] = v
+        c["integer"][self.__index, World_Trace_Columnar._field_index[field]] = _is_integer(v)
+
+    def __deepcopy__(self, memo):
+        return self.as_object_state()
+
+    @property
+    def x(self):
+        return self.__get("x")
+
+    @x.setter
+    def x(self, v):
+        self.__set("x", v)
+
+    @property
+    def y(self):
+        return self.__get("y")
+
+    @y.setter
+    def y(self, v):
+        self.__set("y", v)
+
+    @property
+    def z(self):
+        return self.__get("z")
+
+    @z.setter
+    def z(self, v):
+        self.__set("z", v)
+
+    @property
+    def xsize(self):
+        return self.__get("xsize")
+
+    @xsize.setter
+    def xsize(self, v):
+        if v < 0:
+            raise ValueError("xsize cannot be negative")
+        self.__set("xsize", v)
+
+    @property
+    def ysize(self):
+        return self.__get("ysize")
+
+    @ysize.setter
+    def ysize(self, v):
+        if v < 0:
+            raise ValueError("ysize cannot be negative")
+        self.__set("ysize", v)
+
+    @property
+    def zsize(self):
+        return self.__get("zsize")
+
+    @zsize.setter
+    def zsize(self, v):
+        if v < 0:
+            raise ValueError("zsize cannot be negative")
+        self.__set("zsize", v)
+
+    @property
+    def rotation(self):
+        c = self.__store._get_columns(self.name)
+        n = c["rotation_length"][self.__index]
+        return tuple(c["rotation"][self.__index, :n].tolist())
+
+    @rotation.setter
+    def rotation(self, v):
+        if v and len(v) not in (3, 4):
+            raise ValueError("invalid length of rotation, it must be given as a tuple in roll-pitch-yaw form (3 floats) or quaternion one (4 floats: x,y,z,w) or empty")
+        c = self.__store._get_columns(self.name)
+        c["rotation"][self.__index, :] = np.nan
+        c["rotation"][self.__index, :len(v)] = v
+        c["rotation_length"][self.__index] = len(v)
+
+    @property
+    def args(self):
+        return self.__store._get_extras(self.name, self.timestamp)[0]
+
+    @args.setter
+    def args(self, v):
+        self.__store._set_extras(self.name, self.timestamp, v, self.kwargs)
+
+    @property
+    def kwargs(self):
+        return self.__store._get_extras(self.name, self.timestamp)[1]
+
+    @kwargs.setter
+    def kwargs(self, v):
+        self.__store._set_extras(self.name, self.timestamp, self.args, v)
+
+    def as_object_state(self):
+        """Materialise the view into a standalone object state.
+
+        :return: A copy of the viewed object state.
+        :rtype: :class:`Object_State <qsrlib_io.world_trace.Object_State>`
+        """
+        args, kwargs = self.__store._get_extras(self.name, self.timestamp)
+        return Object_State(self.name, self.timestamp, self.x, self.y, self.z, self.xsize, self.ysize, self.zsize,
+                            self.rotation, *args, **dict(kwargs))
+
+
+class World_State_View(World_State):
+    """View of one timestamp of a :class:`World_Trace_Columnar`.
+
+    `objects` is a dict of :class:`Object_State_View` objects of the objects that are present at the timestamp.
+    The views of a timestamp are made once and kept by the trace, so `trace[t]` returns the same object until the
+    rows of the trace move.
+    """
+
+    def __init__(self, store, index):
+        """Constructor.
+
+        :param store: The trace whose columns are viewed.
+        :type store: World_Trace_Columnar
+        :param index: Row of the timestamp in the columns of the trace.
+        :type index: int
+        """
+        self.__store = store
+        self.__index = index
+        self.__objects = None
+        super(World_State_View, self).__init__(store.timestamps[index], self.objects)
+
+    def __deepcopy__(self, memo):
+        return self.as_world_state()
+
+    @property
+    def objects(self):
+        if self.__objects is None:
+            self.__objects = {name: Object_State_View(self.__store, name, self.__index)
+                              for name in self.__store.get_objects_names_at_index(self.__index)}
+        return self.__objects
+
+    @objects.setter
+    def objects(self, v):
+        if v == self.objects:
+            return
+        self.__store.clear_timestamp(self.timestamp)
+        self.__store.set_object_states_at(self.timestamp, v.values())
+
+    def add_object_state(self, object_state):
+        """Add/Overwrite an object state.
+
+        :param object_state: Object state to be added in the world state.
+        :type object_state: :class:`Object_State <qsrlib_io.world_trace.Object_State>`
+        """
+        self.__store.set_object_states_at(self.timestamp, [object_state])
+
+    def _reset_objects(self):
+        """Drops the views of the objects, after the objects present at the timestamp changed."""
+        self.__objects = None
+
+    def as_world_state(self):
+        """Materialise the view into a standalone world state.
+
+        :return: A copy of the viewed world state.
+        :rtype: :class:`World_State <qsrlib_io.world_trace.World_State>`
+        """
+        return World_State(self.timestamp, {name: o.as_object_state() for name, o in self.objects.items()})
+
+
+class Columnar_Trace(object):
+    """Dict-like view of the timestamps of a :class:`World_Trace_Columnar`, i.e. what `World_Trace.trace` is for
+    :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`. The values are :class:`World_State_View` objects."""
+
+    def __init__(self, store):
+        """Constructor.
+
+        :param store: The trace whose timestamps are viewed.
+        :type store: World_Trace_Columnar
+        """
+        self.__store = store
+
+    def __len__(self):
+        return len(self.__store.timestamps)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, t):
+        return self.__store.get_index_of_timestamp(t) is not None
+
+    def __getitem__(self, t):
+        i = self.__store.get_index_of_timestamp(t)
+        if i is None:
+            raise KeyError(t)
+        return self.__store._get_world_state_view(i)
+
+    def __setitem__(self, t, world_state):
+        self.__store.clear_timestamp(t)
+        self.__store.set_object_states_at(t, world_state.objects.values())
+
+    def get(self, t, default=None):
+        try:
+            return self[t]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.__store.timestamps.tolist()
+
+    def values(self):
+        return [self.__store._get_world_state_view(i) for i in range(len(self))]
+
+    def items(self):
+        return list(zip(self.keys(), self.values()))
+
+
+class World_Trace_Columnar(World_Trace):
+    """Columnar, NumPy-backed alternative to :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`.
+
+    The timestamps are kept in one sorted array and each object has its own contiguous arrays, aligned to these
+    timestamps, for x, y, z, xsize, ysize, zsize, rotation, and a presence mask. `trace[t].objects[name]` returns
+    views on these columns, so existing QSRs run unchanged, while vectorized code can read whole columns via
+    :meth:`get_object_columns` and :attr:`timestamps` without copying.
+
+    The columns are float arrays, and whether each value was given as an integer is kept next to them, so that the
+    views return integers where :class:`World_Trace <qsrlib_io.world_trace.World_Trace>` would, e.g. for the QTC
+    QSRs, which round integer positions differently. Rotations are always returned as floats.
+    """
+
+    _fields = ("x", "y", "z", "xsize", "ysize", "zsize")
+    """tuple: Names of the scalar float columns of every object."""
+
+    _field_index = dict((k, i) for i, k in enumerate(_fields))
+    """dict: Column of each field in the "integer" array of the objects."""
+
+    def __init__(self, description="", trace=None):
+        """Constructor.
+
+        :param description: Optional description of the world.
+        :type description: str
+        :param trace: Optional time series of world states to load, i.e. a dict of objects of type World_State with the keys being the timestamps.
+        :type trace: dict
+        """
+        self.__capacity = 0
+        self.__size = 0
+        self.__timestamps = np.empty(0, dtype=float)
+        self.__columns = OrderedDict()
+        self.__extras = {}
+        self.__views = {}
+        self.__trace_view = Columnar_Trace(self)
+        super(World_Trace_Columnar, self).__init__(description=description, trace=trace)
+
+    @classmethod
+    def from_world_trace(cls, world_trace):
+        """Create a columnar copy of a world trace.
+
+        :param world_trace: The world trace to copy.
+        :type world_trace: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
+        :return: Columnar copy of `world_trace`.
+        :rtype: World_Trace_Columnar
+        """
+        ret = cls(description=world_trace.description)
+        ret.trace = world_trace.trace
+        return ret
+
+    def to_world_trace(self):
+        """Materialise into a standard world trace.
+
+        :return: A copy of this trace made of standalone objects.
+        :rtype: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
+        """
+        return World_Trace(description=self.description,
+                           trace={t: ws.as_world_state() for t, ws in self.trace.items()})
+
+    @property
+    def trace(self):
+        """:class:`Columnar_Trace`: Dict-like time series of :class:`World_State_View` objects with the keys being the
+        timestamps. Assigning a dict of :class:`World_State <qsrlib_io.world_trace.World_State>` objects replaces the
+        contents of the trace."""
+        return self.__trace_view
+
+    @trace.setter
+    def trace(self, trace):
+        self.__capacity = 0
+        self.__size = 0
+        self.__timestamps = np.empty(0, dtype=float)
+        self.__columns = OrderedDict()
+        self.__extras = {}
+        self.__views = {}
+        object_states, timestamps = [], []
+        for t, world_state in trace.items():
+            timestamps.append(t)
+            for o in world_state.objects.values():
+                object_states.append((o, float(t)))
+        self.__insert_timestamps(timestamps)
+        self.__add_object_states(object_states)
+
+    @property
+    def timestamps(self):
+        """numpy.ndarray: Sorted timestamps of the trace, a view without copying."""
+        return self.__timestamps[:self.__size]
+
+    def get_sorted_timestamps(self):
+        """Return a sorted list of the timestamps.
+
+        :return: Sorted list of the timestamps.
+        :rtype: list
+        """
+        return self.timestamps.tolist()
+
+    def get_objects_names(self):
+        """Return the names of all the objects that appear in the trace.
+
+        :return: Objects names in order of first insertion.
+        :rtype: list of str
+        """
+        return list(self.__columns.keys())
+
+    def get_objects_names_at_index(self, index):
+        """Return the names of the objects present at a row of the columns.
+
+        :param index: Row of the timestamp in the columns.
+        :type index: int
+        :return: Names of the present objects.
+        :rtype: list of str
+        """
+        return [name for name, c in self.__columns.items() if c["mask"][index]]
+
+    def get_index_of_timestamp(self, t):
+        """Return the row of a timestamp in the columns.
+
+        :param t: The timestamp.
+        :type t: int or float
+        :return: The row of `t` or None if `t` is not in the trace.
+        :rtype: int or None
+        """
+        ts = self.timestamps
+        i = int(np.searchsorted(ts, t))
+        return i if i < len(ts) and ts[i] == t else None
+
+    def get_object_columns(self, name):
+        """Return the columns of an object, aligned to :attr:`timestamps`, without copying.
+
+        The returned dict has the float arrays "x", "y", "z", "xsize", "ysize", "zsize" of shape (T,), "rotation" of
+        shape (T, 4) padded with NaN, "rotation_length" holding the length of each rotation (0, 3 or 4), the boolean
+        "integer" of shape (T, 6) telling which of the six fields were given as integers, the boolean presence "mask"
+        and the shared "timestamps". Values at rows where the mask is False are NaN.
+
+        :param name: Name of the object.
+        :type name: str
+        :return: The columns of the object.
+        :rtype: dict of numpy.ndarray
+        """
+        c = self.__columns[name]
+        ret = {k: v[:self.__size] for k, v in c.items()}
+        ret["timestamps"] = self.timestamps
+        return ret
+
+    def get_object_bounding_boxes_2d(self, name, xsize_minimal=0, ysize_minimal=0):
+        """Compute the 2D bounding boxes of an object at all timestamps, as
+        :meth:`Object_State.return_bounding_box_2d <qsrlib_io.world_trace.Object_State.return_bounding_box_2d>` does.
+
+        :param name: Name of the object.
+        :type name: str
+        :param xsize_minimal: x-size to use where the object has no x-size.
+        :type xsize_minimal: positive int or float
+        :param ysize_minimal: y-size to use where the object has no y-size.
+        :type ysize_minimal: positive int or float
+        :return: Array of shape (T, 4) with the first and third corners of the boxes, NaN where the object is absent.
+        :rtype: numpy.ndarray
+        """
+        c = self.get_object_columns(name)
+        xsize = np.where(np.isnan(c["xsize"]), xsize_minimal, c["xsize"])
+        ysize = np.where(np.isnan(c["ysize"]), ysize_minimal, c["ysize"])
+        return np.column_stack((c["x"]-xsize/2, c["y"]-ysize/2, c["x"]+xsize/2, c["y"]+ysize/2))
+
+    def _get_columns(self, name):
+        return self.__columns[name]
+
+    def _get_extras(self, name, t):
+        return self.__extras.get((name, t), ((), {}))
+
+    def _set_extras(self, name, t, args, kwargs):
+        if args or kwargs:
+            self.__extras[(name, t)] = (tuple(args), dict(kwargs))
+        else:
+            self.__extras.pop((name, t), None)
+
+    def _get_world_state_view(self, index):
+        t = float(self.__timestamps[index])
+        try:
+            return self.__views[t]
+        except KeyError:
+            view = self.__views[t] = World_State_View(self, index)
+            return view
+
+    def __reset_views(self, timestamps):
+        """Drops the object views of the cached world state views of some timestamps."""
+        for t in timestamps:
+            view = self.__views.get(t)
+            if view is not None:
+                view._reset_objects()
+
+    # *** data adders
+    def add_object_state(self, object_state, timestamp=None):
+        """Add/Overwrite an :class:`Object_State <qsrlib_io.world_trace.Object_State>` object.
+
+        :param object_state: The object state.
+        :type object_state: :class:`Object_State <qsrlib_io.world_trace.Object_State>`
+        :param timestamp: The timestamp where the object state is to be inserted, if not given it is added in the timestamp of the object state.
+        :type timestamp: int or float
+        """
+        timestamp = float(timestamp) if timestamp else object_state.timestamp
+        self.__insert_timestamps([timestamp])
+        self.__add_object_states([(object_state, timestamp)])
+
+    def add_object_state_series(self, object_states):
+        """Add a series of object states.
+
+        The columns are grown once for the whole series instead of once per object state.
+
+        :param object_states: The object states, i.e. a list of :class:`Object_State <qsrlib_io.world_trace.Object_State>` objects.
+        :type object_states: list or tuple
+        """
+        object_states = [(s, s.timestamp) for s in object_states]
+        self.__insert_timestamps([t for _, t in object_states])
+        self.__add_object_states(object_states)
+
+    def add_object_track_from_arrays(self, obj_name, timestamps, x, y, z=None, xsize=None, ysize=None, zsize=None):
+        """Add the data of an object directly from arrays, without creating any object states.
+
+        :param obj_name: Name of the object.
+        :type obj_name: str
+        :param timestamps: Timestamps of the data.
+        :type timestamps: array-like of int or float
+        :param x: x-coordinates.
+        :type x: array-like of int or float
+        :param y: y-coordinates.
+        :type y: array-like of int or float
+        :param z: Optional z-coordinates.
+        :type z: array-like of int or float
+        :param xsize: Optional x-sizes.
+        :type xsize: array-like of positive int or float
+        :param ysize: Optional y-sizes.
+        :type ysize: array-like of positive int or float
+        :param zsize: Optional z-sizes.
+        :type zsize: array-like of positive int or float
+        """
+        timestamps = np.asarray(timestamps, dtype=float)
+        values = {"x": x, "y": y, "z": z, "xsize": xsize, "ysize": ysize, "zsize": zsize}
+        for k in ("xsize", "ysize", "zsize"):
+            if values[k] is not None and np.any(np.asarray(values[k]) < 0):
+                raise ValueError("%s cannot be negative" % k)
+        self.__insert_timestamps(timestamps)
+        rows = np.searchsorted(self.timestamps, timestamps)
+        c = self.__get_or_create_columns(obj_name)
+        for k, v in values.items():
+            if v is None:
+                c[k][rows] = np.nan
+                c["integer"][rows, self._field_index[k]] = False
+            else:
+                v = np.asarray(v)
+                c[k][rows] = v
+                c["integer"][rows, self._field_index[k]] = np.issubdtype(v.dtype, np.integer)
+        c["rotation"][rows] = np.nan
+        c["rotation_length"][rows] = 0
+        c["mask"][rows] = True
+        for t in timestamps.tolist():
+            self.__extras.pop((obj_name, t), None)
+        self.__reset_views(timestamps.tolist())
+
+    def set_object_states_at(self, timestamp, object_states):
+        """Add/Overwrite object states at a timestamp regardless of their own timestamps.
+
+        :param timestamp: The timestamp where the object states are to be inserted.
+        :type timestamp: int or float
+        :param object_states: The object states.
+        :type object_states: list or tuple of :class:`Object_State <qsrlib_io.world_trace.Object_State>`
+        """
+        timestamp = float(timestamp)
+        self.__insert_timestamps([timestamp])
+        self.__add_object_states([(s, timestamp) for s in object_states])
+    # *** end of data adders
+
+    def clear_timestamp(self, t):
+        """Remove all the object states at a timestamp, keeping the timestamp itself as an empty world state.
+
+        :param t: The timestamp.
+        :type t: int or float
+        """
+        t = float(t)
+        self.__insert_timestamps([t])
+        i = self.get_index_of_timestamp(t)
+        for name, c in self.__columns.items():
+            c["mask"][i] = False
+            for k in self._fields:
+                c[k][i] = np.nan
+            c["rotation"][i] = np.nan
+            c["rotation_length"][i] = 0
+            c["integer"][i] = False
+            self.__extras.pop((name, t), None)
+        self.__reset_views([t])
+
+    def __new_columns(self, capacity):
+        ret = OrderedDict((k, np.full(capacity, np.nan)) for k in self._fields)
+        ret["rotation"] = np.full((capacity, 4), np.nan)
+        ret["rotation_length"] = np.zeros(capacity, dtype=np.int8)
+        ret["integer"] = np.zeros((capacity, len(self._fields)), dtype=bool)
+        ret["mask"] = np.zeros(capacity, dtype=bool)
+        return ret
+
+    def __get_or_create_columns(self, name):
+        try:
+            return self.__columns[name]
+        except KeyError:
+            self.__columns[name] = self.__new_columns(self.__capacity)
+            return self.__columns[name]
+
+    def __reallocate(self, capacity, rows):
+        """Move the current rows to `rows` of newly allocated columns of the given capacity."""
+        timestamps = np.full(capacity, np.nan)
+        timestamps[rows] = self.timestamps
+        self.__timestamps = timestamps
+        for name, c in self.__columns.items():
+            new_c = self.__new_columns(capacity)
+            for k, v in c.items():
+                new_c[k][rows] = v[:self.__size]
+            self.__columns[name] = new_c
+        self.__capacity = capacity
+
+    def __insert_timestamps(self, timestamps):
+        new = np.setdiff1d(np.asarray(timestamps, dtype=float), self.timestamps)
+        if len(new) == 0:
+            return
+        size = self.__size + len(new)
+        if self.__size == 0 or new[0] > self.__timestamps[self.__size-1]:
+            # appending in order, the common case of a growing trace
+            if size > self.__capacity:
+                self.__reallocate(max(size, 2*self.__capacity, 16), np.arange(self.__size))
+            self.__timestamps[self.__size:size] = new
+        else:
+            merged = np.union1d(self.timestamps, new)
+            capacity = max(size, self.__capacity)
+            self.__reallocate(capacity, np.searchsorted(merged, self.timestamps))
+            self.__timestamps[:size] = merged
+            # the rows moved, the cached views point to the old ones
+            self.__views = {}
+        self.__size = size
+
+    def __add_object_states(self, object_states):
+        """Write a list of (object state, timestamp) tuples whose timestamps already exist in the trace."""
+        if not object_states:
+            return
+        rows = np.searchsorted(self.timestamps, [t for _, t in object_states])
+        by_name = OrderedDict()
+        for (s, t), i in zip(object_states, rows.tolist()):
+            by_name.setdefault(s.name, []).append((s, t, i))
+        for name, states in by_name.items():
+            c = self.__get_or_create_columns(name)
+            idx = [i for _, _, i in states]
+            for j, k in enumerate(self._fields):
+                values = [getattr(s, k) for s, _, _ in states]
+                c[k][idx] = values
+                c["integer"][idx, j] = [_is_integer(v) for v in values]
+            for s, t, i in states:
+                r = s.rotation
+                c["rotation"][i] = np.nan
+                c["rotation"][i, :len(r)] = r
+                c["rotation_length"][i] = len(r)
+                if s.args or s.kwargs:
+                    self.__extras[(name, t)] = (s.args, s.kwargs)
+                else:
+                    self.__extras.pop((name, t), None)
+            c["mask"][idx] = True
+        self.__reset_views([t for _, t in object_states])
+
+
+def _is_integer(v):
+    return isinstance(v, (int, long, np.integer)) and not isinstance(v, bool)
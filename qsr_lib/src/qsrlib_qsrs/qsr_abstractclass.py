@@ -23,9 +23,13 @@ class QSR_Abstractclass(object):
 
     __metaclass__ = ABCMeta
 
-    _common_dynamic_args = ["qsrs_for"]
+    _common_dynamic_args = ["qsrs_for", "spatial_index"]
     """tuple: Common across all QSRs arguments of `dynamic_args`."""
 
+    _time_shard_overlap = None
+    """int or None: Number of previous timestamps needed by `make_world_qsr_trace` for the QSRs of a timestamp, if the
+    QSR can be computed on consecutive chunks of the timestamps independently, and None if it cannot."""
+
     def __init__(self):
         """Constructor."""
         self._dtype_map = {"points": self._return_points,
@@ -19,6 +19,9 @@ class QSR_Arg_Prob_Relations_Distance(QSR_Arg_Relations_Distance):
     .. seealso:: For further details, refer to its :doc:`description. <../handwritten/qsrs/argprobd>`
     """
 
+    _time_shard_overlap = None
+    """None: The relations depend on the order of the random draws, so the timestamps are not computed in chunks."""
+
     def __init__(self):
         """Constructor."""
         super(QSR_Arg_Prob_Relations_Distance, self).__init__()
@@ -56,6 +56,32 @@ class QSR_Arg_Relations_Distance(QSR_Arg_Relations_Abstractclass):
         except KeyError:
             raise KeyError("qsr_relations_and_values not set")
 
+    def _get_spatial_index_default_relation(self, qsr_params):
+        """Pairs farther than the largest threshold get the last relation.
+
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :return: The last relation.
+        :rtype: str
+        """
+        return self._all_possible_relations[-1]
+
+    def _get_spatial_index_extent(self, object_state, qsr_params):
+        """A square around the point with side the largest threshold, slightly grown to absorb rounding errors, so that
+        points within the largest threshold have intersecting extents.
+
+        :param object_state: The object data.
+        :type object_state: :class:`Object_State <qsrlib_io.world_trace.Object_State>`
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :return: The extent (x1, y1, x2, y2).
+        :rtype: tuple
+        """
+        r = max(self.all_possible_values)
+        x, y = object_state.x, object_state.y
+        m = r/2 + 1e-9*(abs(x) + abs(y) + abs(r))
+        return x-m, y-m, x+m, y+m
+
     def _compute_qsr(self, data1, data2, qsr_params, **kwargs):
         """
 
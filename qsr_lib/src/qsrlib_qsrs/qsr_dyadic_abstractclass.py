@@ -3,10 +3,17 @@ from __future__ import print_function, division
 from abc import ABCMeta, abstractmethod
 from qsrlib_qsrs.qsr_abstractclass import QSR_Abstractclass
 from qsrlib_utils.combinations_and_permutations import *
+from qsrlib_utils.spatial_index import get_candidate_pairs
 from qsrlib_io.world_qsr_trace import *
 
 class QSR_Dyadic_Abstractclass(QSR_Abstractclass):
-    """Abstract class of dyadic QSRs, i.e. QSRs that are computed over two objects."""
+    """Abstract class of dyadic QSRs, i.e. QSRs that are computed over two objects.
+
+    Common `dynamic_args`
+        * **spatial_index** (*bool*) = False: For QSRs that have a default relation for objects far apart (e.g. "dc" of RCC),
+          compute only the pairs whose objects are close according to a per timestamp spatial index and give the default
+          relation to the rest. The results are the same as without the index.
+    """
 
     __metaclass__ = ABCMeta
 
@@ -37,6 +44,64 @@ class QSR_Dyadic_Abstractclass(QSR_Abstractclass):
         """
         return [p for p in qsrs_for if isinstance(p, (list, tuple)) and (len(p) == 2)]
 
+    def _get_spatial_index_default_relation(self, qsr_params):
+        """Return the relation of the pairs that the spatial index finds far apart.
+
+        Overwrite in QSRs that support the spatial index, together with :meth:`_get_spatial_index_extent`.
+
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :return: The default relation, or None if the QSR does not support the spatial index.
+        :rtype: str or None
+        """
+        return None
+
+    def _get_spatial_index_extent(self, object_state, qsr_params):
+        """Return the extent of an object for the spatial index.
+
+        The extents must be such that any pair whose relation is not the default relation has intersecting extents.
+
+        :param object_state: The object data.
+        :type object_state: :class:`Object_State <qsrlib_io.world_trace.Object_State>`
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :return: The extent (x1, y1, x2, y2), or None if the object must be paired with all other objects.
+        :rtype: tuple or None
+        """
+        return None
+
+    def _is_spatial_index_requested(self, req_params):
+        """Check whether the spatial index is requested in `dynamic_args`, QSR namespace first then global one.
+
+        :param req_params: Request parameters.
+        :type req_params: dict
+        :return: True if requested.
+        :rtype: bool
+        """
+        try:
+            return bool(req_params["dynamic_args"][self._unique_id]["spatial_index"])
+        except (KeyError, TypeError):
+            try:
+                return bool(req_params["dynamic_args"]["for_all_qsrs"]["spatial_index"])
+            except (KeyError, TypeError):
+                return False
+
+    def _get_spatial_index_candidates(self, world_state, qsrs_for, qsr_params):
+        """Return the pairs of `qsrs_for` that need computing according to the spatial index.
+
+        :param world_state: The world state.
+        :type world_state: :class:`World_State <qsrlib_io.world_trace.World_State>`
+        :param qsrs_for: Pairs of objects names for which QSRs are to be computed.
+        :type qsrs_for: list
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :return: The candidate pairs; pairs of `qsrs_for` not in it get the default relation.
+        :rtype: set of tuples of str
+        """
+        names = set(o for p in qsrs_for for o in p)
+        return get_candidate_pairs({o: self._get_spatial_index_extent(world_state.objects[o], qsr_params)
+                                    for o in names})
+
     def _return_points(self, data1, data2):
         """Return the arguments as they are in their point form.
 
@@ -67,6 +132,9 @@ class QSR_Dyadic_1t_Abstractclass(QSR_Dyadic_Abstractclass):
 
     __metaclass__ = ABCMeta
 
+    _time_shard_overlap = 0
+    """int: Each timestamp is computed on its own."""
+
     def __init__(self):
         """Constructor."""
         super(QSR_Dyadic_1t_Abstractclass, self).__init__()
@@ -103,11 +171,18 @@ class QSR_Dyadic_1t_Abstractclass(QSR_Dyadic_Abstractclass):
         :rtype: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
         """
         ret = World_QSR_Trace(qsr_type=self._unique_id)
+        default_relation = self._get_spatial_index_default_relation(qsr_params) \
+            if self._is_spatial_index_requested(req_params) else None
         for t in timestamps:
             world_state = world_trace.trace[t]
             qsrs_for = self._process_qsrs_for(world_state.objects.keys(), req_params["dynamic_args"])
+            if default_relation is not None:
+                candidates = self._get_spatial_index_candidates(world_state, qsrs_for, qsr_params)
             for p in qsrs_for:
                 between = ",".join(p)
+                if default_relation is not None and tuple(p) not in candidates:
+                    ret.add_qsr(QSR(timestamp=t, between=between, qsr=self._format_qsr(default_relation)), t)
+                    continue
                 try:
                     data1, data2 = self._dtype_map[self._dtype](world_state.objects[p[0]], world_state.objects[p[1]])
                 except KeyError:
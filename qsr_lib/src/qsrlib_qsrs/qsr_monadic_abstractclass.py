@@ -65,6 +65,9 @@ class QSR_Monadic_2t_Abstractclass(QSR_Monadic_Abstractclass):
 
     __metaclass__ = ABCMeta
 
+    _time_shard_overlap = 1
+    """int: Each timestamp is computed with its previous one."""
+
     def __init__(self):
         """Constructor."""
         super(QSR_Monadic_2t_Abstractclass, self).__init__()
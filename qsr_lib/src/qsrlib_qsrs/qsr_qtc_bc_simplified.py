@@ -29,8 +29,11 @@ class QSR_QTC_BC_Simplified(QSR_QTC_Simplified_Abstractclass):
         self._all_possible_relations = tuple(self.return_all_possible_state_combinations()[0])
         """tuple: All possible relations of the QSR."""
 
-    def make_world_qsr_trace(self, world_trace, timestamps, qsr_params, req_params, **kwargs):
-        """Compute the world QSR trace from the arguments.
+    def _make_qtc_sequences(self, world_trace, timestamps, qsr_params, req_params, world_qsr_trace):
+        """Compute the QTCBCS states of each pair of objects between consecutive timestamps, before they are collapsed
+        and validated.
+
+        Timestamps whose objects differ from the previous timestamp are put empty in `world_qsr_trace`.
 
         :param world_trace: Input data.
         :type world_trace: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
@@ -38,74 +41,37 @@ class QSR_QTC_BC_Simplified(QSR_QTC_Simplified_Abstractclass):
         :type timestamps: list
         :param qsr_params: QSR specific parameters passed in `dynamic_args`.
         :type qsr_params: dict
-        :param req_params: Dynamic arguments passed with the request.
-        :type dynamic_args: dict
-        :param kwargs: kwargs arguments.
-        :return: Computed world QSR trace.
-        :rtype: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        :param req_params: Request parameters.
+        :type req_params: dict
+        :param world_qsr_trace: The world QSR trace being computed.
+        :type world_qsr_trace: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        :return: The QTCCS states of each pair, one per row, with NaN for the QTCCS part beyond the distance threshold.
+        :rtype: dict
         """
-        ret = World_QSR_Trace(qsr_type=self._unique_id)
-        qtc_sequence = {}
+        betweens, steps = [], []
         for t, tp in zip(timestamps[1:], timestamps):
             world_state_now = world_trace.trace[t]
             world_state_previous = world_trace.trace[tp]
             if set(world_state_now.objects.keys()) != set(world_state_previous.objects.keys()):
-                ret.put_empty_world_qsr_state(t)
+                world_qsr_trace.put_empty_world_qsr_state(t)
                 continue # Objects have to be present in both timestamps
             qsrs_for = self._process_qsrs_for(world_state_now.objects.keys(), req_params["dynamic_args"])
             for o1_name, o2_name in qsrs_for:
-                between = str(o1_name) + "," + str(o2_name)
-                qtc = np.array([], dtype=int)
-                k = [world_state_previous.objects[o1_name].x,
-                     world_state_previous.objects[o1_name].y,
-                     world_state_now.objects[o1_name].x,
-                     world_state_now.objects[o1_name].y]
-                l = [world_state_previous.objects[o2_name].x,
-                     world_state_previous.objects[o2_name].y,
-                     world_state_now.objects[o2_name].x,
-                     world_state_now.objects[o2_name].y]
-                qtc = self._create_qtc_representation(
-                    k,
-                    l,
-                    qsr_params["quantisation_factor"]
-                )
-                distance = self._get_euclidean_distance(
-                    (world_state_now.objects[o1_name].x,
-                         world_state_now.objects[o1_name].y),
-                    (world_state_now.objects[o2_name].x,
-                         world_state_now.objects[o2_name].y)
-                )
-
-                try:
-                    qtc_sequence[between]["qtc"] = np.append(
-                        qtc_sequence[between]["qtc"],
-                        qtc
-                    ).reshape(-1,4)
-                    qtc_sequence[between]["distances"] = np.append(
-                            qtc_sequence[between]["distances"],
-                            distance
-                    )
-                except KeyError:
-                    qtc_sequence[between] = {
-                        "qtc": qtc,
-                        "distances": np.array([distance])
-                    }
-
-        for between, qtcbc in qtc_sequence.items():
-            qtcbc["qtc"] = self._create_bc_chain(qtcbc["qtc"], qtcbc["distances"], qsr_params["distance_threshold"])
-            if not qsr_params["no_collapse"]:
-                qtcbc["qtc"] = self._collapse_similar_states(qtcbc["qtc"])
-            if qsr_params["validate"]:
-                qtcbc["qtc"] = self._validate_qtc_sequence(qtcbc["qtc"])
-            for idx, q in enumerate(qtcbc["qtc"]):
-                qsr = QSR(
-                    timestamp=idx+1,
-                    between=between,
-                    qsr=self.qtc_to_output_format(q)
-                )
-                ret.add_qsr(qsr, idx+1)
-
-        return ret
+                betweens.append(str(o1_name) + "," + str(o2_name))
+                steps.append((world_state_previous.objects[o1_name], world_state_now.objects[o1_name],
+                              world_state_previous.objects[o2_name], world_state_now.objects[o2_name]))
+
+        # all the steps of all the pairs in one go
+        positions, integer = self._get_positions_of_qtc_steps(steps)
+        qtc = self._create_qtc_representations(positions[:, 0:2], positions[:, 2:4],
+                                               positions[:, 4:6], positions[:, 6:8],
+                                               qsr_params["quantisation_factor"], integer)
+        distances = self._get_euclidean_distances(positions[:, 2:4], positions[:, 6:8])
+        qtc_sequence = self._split_qtc_by_between(betweens, qtc)
+        for between, d in self._split_qtc_by_between(betweens, distances).items():
+            qtc_sequence[between] = self._create_bc_chain(qtc_sequence[between], np.atleast_1d(d),
+                                                          qsr_params["distance_threshold"])
+        return qtc_sequence
 
     def _create_bc_chain(self, qtc, distances, distance_threshold):
         """
@@ -119,15 +85,10 @@ class QSR_QTC_BC_Simplified(QSR_QTC_Simplified_Abstractclass):
         :return:
         :rtype:
         """
-        ret = np.array([])
-        if len(qtc.shape) == 1:
-            qtc = [qtc]
-        for dist, state in zip(distances, qtc):
-            if dist > distance_threshold:
-                ret = np.append(ret, np.append(state[0:2],[np.nan,np.nan]), axis=0)
-            else:
-                ret = np.append(ret, state, axis=0)
-        return ret.reshape(-1,4)
+        ret = np.array(qtc, dtype=float).reshape(-1,4)
+        with np.errstate(invalid="ignore"):
+            ret[np.asarray(distances) > distance_threshold, 2:] = np.nan
+        return ret
 
     def qtc_to_output_format(self, qtc):
         """Overwrite this for the different QTC variants to select only the parts from the QTCCS tuple that you would
@@ -152,3 +113,15 @@ class QSR_QTC_BC_Simplified(QSR_QTC_Simplified_Abstractclass):
         :rtype: float
         """
         return np.sqrt(np.power((float(p[0])-float(q[0])),2)+np.power((float(p[1])-float(q[1])),2))
+
+    def _get_euclidean_distances(self, p, q):
+        """Vectorized :meth:`_get_euclidean_distance`.
+
+        :param p: x,y coordinates, shape (N, 2).
+        :type p: numpy.array
+        :param q: x,y coordinates, shape (N, 2).
+        :type q: numpy.array
+        :return: Euclidean distances between the rows of `p` and `q`, shape (N,).
+        :rtype: numpy.array
+        """
+        return np.sqrt(np.power(p[:, 0]-q[:, 0], 2)+np.power(p[:, 1]-q[:, 1], 2))
@@ -43,6 +43,9 @@ class QSR_QTC_Simplified_Abstractclass(QSR_Dyadic_Abstractclass):
     _dtype = "points"
     """str: QTC specific type."""
 
+    _cnd_tables = {}
+    """dict: Legal transitions tables, computed once per `qtc_type`."""
+
     def __init__(self):
         """Constructor."""
         super(QSR_QTC_Simplified_Abstractclass, self).__init__()
@@ -114,14 +117,44 @@ class QSR_QTC_Simplified_Abstractclass(QSR_Dyadic_Abstractclass):
         if self.qtc_type == "b":
             qtc = qtc[:,0:2]
 
-        legal_qtc = np.array([qtc[0,:]])
-
-        for i in xrange(1, qtc.shape[0]):
-            insert = np.array(qtc[i,:].copy())
+        if qtc.shape[0] == 1:
+            return np.array(qtc)
+
+        # look up which values of each transition have to be zeroed for the intermediate state, the states that are
+        # not in the table, e.g. of a sequence that was not created by this class, are checked directly
+        states, zeroed_table = self._get_cnd_table()
+        prev_idx, cur_idx = self._get_state_indices(qtc[:-1], states), self._get_state_indices(qtc[1:], states)
+        known = (prev_idx >= 0) & (cur_idx >= 0)
+        zeroed = np.empty(qtc[1:].shape, dtype=bool)
+        zeroed[known] = zeroed_table[prev_idx[known], cur_idx[known]]
+        if not known.all():
+            zeroed[~known] = self._get_cnd_zeroed(qtc[:-1][~known], qtc[1:][~known])
+
+        insert = np.where(zeroed, 0, qtc[1:])
+        inserted = np.any(zeroed & (qtc[1:] != 0), axis=1)
+
+        # each transition contributes its intermediate state, if needed, followed by its state
+        legal_qtc = np.stack((insert, qtc[1:]), axis=1)[np.column_stack((inserted, np.ones_like(inserted)))]
+        return np.concatenate((qtc[0:1], legal_qtc))
+
+    def _get_cnd_zeroed(self, prev, cur):
+        """Find the values of the transitions from `prev` to `cur` that have to be 0 in the intermediate state.
+
+        :param prev: States before the transitions, one QTCS state per row.
+        :type prev: numpy.array
+        :param cur: States after the transitions, one QTCS state per row.
+        :type cur: numpy.array
+        :return: True for the values of `cur` which are replaced by 0 in the intermediate state.
+        :rtype: numpy.array of bool
+        """
+        prev = np.asarray(prev, dtype=float)
+        insert = np.array(cur, dtype=float)
+        with np.errstate(invalid="ignore"):
             ###################################################################
             # self transition = 0, transition form - to + and vice versa = 2
             # transitions from - to 0 or + to 0 and vice versa = 1
-            insert[np.abs(qtc[i-1,:]-insert)>1] = 0
+            zeroed = np.abs(prev-insert) > 1
+            insert[zeroed] = 0
 
             ###################################################################
             # find invalid transitions according to CND:
@@ -131,22 +164,56 @@ class QSR_QTC_Simplified_Abstractclass(QSR_Dyadic_Abstractclass):
             # 2,3: 0-00 <> 00-0 | 0+00 <> 00+0 | 0-00 <> 00+0 | 0+00 <> 00-0
             # 2,4: 0-00 <> 000- | 0+00 <> 000+ | 0-00 <> 000+ | 0+00 <> 000-
             # 3,4: 00-0 <> 000- | 00+0 <> 000+ | 00-0 <> 000+ | 00+0 <> 000-
-            for j1 in xrange(0, len(qtc[i,:])-1):
-                for j2 in xrange(j1+1, len(insert)):
-                    if np.sum(np.abs(qtc[i-1,[j1,j2]])) == 1 \
-                            and np.sum(np.abs(insert[[j1,j2]])) == 1:
-                        if np.nanmax(np.abs(qtc[i-1,[j1,j2]] - insert[[j1,j2]])) > 0 \
-                                and np.sum(qtc[i-1,[j1,j2]] - insert[[j1,j2]]) != 1:
-                            insert[[j1,j2]] = 0
-
-            #print insert
-
-            if not np.array_equal(insert[np.logical_not(np.isnan(insert))], qtc[i, np.logical_not(np.isnan(insert))]):
-                legal_qtc = np.append(legal_qtc, [insert], axis=0)
-
-            legal_qtc = np.append(legal_qtc, [qtc[i,:]], axis=0)
-
-        return legal_qtc
+            for j1 in xrange(0, insert.shape[1]-1):
+                for j2 in xrange(j1+1, insert.shape[1]):
+                    p, i = prev[:, [j1, j2]], insert[:, [j1, j2]]
+                    invalid = (np.sum(np.abs(p), axis=1) == 1) & (np.sum(np.abs(i), axis=1) == 1) \
+                        & (np.max(np.abs(p - i), axis=1) > 0) & (np.sum(p - i, axis=1) != 1)
+                    insert[invalid, j1] = 0
+                    insert[invalid, j2] = 0
+                    zeroed[invalid, j1] = True
+                    zeroed[invalid, j2] = True
+        return zeroed
+
+    def _get_cnd_table(self):
+        """Return the legal transitions table of the states of this QTC variant, computing it on first use.
+
+        :return: The states, one per row, and for every pair of them the values of the second state that have to be
+        zeroed in the intermediate state, shape (states, states, state length).
+        :rtype: (numpy.array, numpy.array)
+        """
+        try:
+            return self.__class__._cnd_tables[self.qtc_type]
+        except KeyError:
+            states = np.array(self.return_all_possible_state_combinations()[1], dtype=float)
+            if self.qtc_type == "b":
+                states = states[:, 0:2]
+            n = len(states)
+            zeroed = self._get_cnd_zeroed(np.repeat(states, n, axis=0), np.tile(states, (n, 1)))
+            self.__class__._cnd_tables[self.qtc_type] = (states, zeroed.reshape(n, n, -1))
+            return self.__class__._cnd_tables[self.qtc_type]
+
+    def _get_state_indices(self, qtc, states):
+        """Find the rows of `states` the QTCS states in `qtc` are equal to, NaN being equal to NaN.
+
+        :param qtc: QTCS states, one per row.
+        :type qtc: numpy.array
+        :param states: The states of the legal transitions table.
+        :type states: numpy.array
+        :return: The index of each state of `qtc` in `states`, -1 for states that are not in it.
+        :rtype: numpy.array
+        """
+        # -1, 0, 1 and NaN are the digits 0, 1, 2 and 3 of a base 4 code of the state
+        def encode(a):
+            with np.errstate(invalid="ignore"):
+                digits = np.where(np.isnan(a), 3, a + 1)
+                valid = np.all(np.isnan(a) | (a == -1) | (a == 0) | (a == 1), axis=1)
+            return np.where(valid, np.dot(np.where(valid[:, None], digits, 0), 4**np.arange(a.shape[1])), -1)
+
+        lookup = np.full(4**states.shape[1], -1, dtype=int)
+        lookup[encode(states).astype(int)] = np.arange(len(states))
+        codes = encode(np.asarray(qtc, dtype=float)).astype(int)
+        return np.where(codes >= 0, lookup[np.maximum(codes, 0)], -1)
 
     def _collapse_similar_states(self, qtc):
         """Collapse similar adjacent QTCS states.
@@ -261,6 +328,120 @@ class QSR_QTC_Simplified_Abstractclass(QSR_Dyadic_Abstractclass):
 
         return np.array([k[0],l[0],k[1],l[1]])
 
+    def _create_qtc_representations(self, k_prev, k_now, l_prev, l_now, quantisation_factor=0, integer=None):
+        """Vectorized :meth:`_create_qtc_representation` for many (previous, current) positions at once.
+
+        The double cross is built in closed form for all rows together and the constraints are tested as in
+        :meth:`_test_constraint`, with the same arithmetic, so the results are the same as calling
+        :meth:`_create_qtc_representation` row by row.
+
+        :param k_prev: Previous positions of agent k, shape (N, 2).
+        :type k_prev: numpy.array
+        :param k_now: Current positions of agent k, shape (N, 2).
+        :type k_now: numpy.array
+        :param l_prev: Previous positions of agent l, shape (N, 2).
+        :type l_prev: numpy.array
+        :param l_now: Current positions of agent l, shape (N, 2).
+        :type l_now: numpy.array
+        :param quantisation_factor: The minimum distance the points have to diverge from either line to be regarded a non-0-state.
+        :type quantisation_factor: float
+        :param integer: Rows whose positions were all given as integers, shape (N,). For these the halving of the
+        double cross is an integer division, as it is when :meth:`_create_qtc_representation` gets integers.
+        :type integer: numpy.array of bool
+        :return: QTCCS 4-tuples (q1,q2,q4,q5) [k[0],l[0],k[1],l[1]], one per row, shape (N, 4).
+        :rtype: numpy.array
+        """
+        k_prev, k_now, l_prev, l_now = [np.asarray(p, dtype=float).reshape(-1, 2) for p in (k_prev, k_now, l_prev, l_now)]
+        integer = np.zeros(len(k_prev), dtype=bool) if integer is None else np.asarray(integer, dtype=bool)
+        integer = integer[:, None]
+
+        def half(v):
+            return np.where(integer, np.floor_divide(v, 2), v/2.)
+
+        # Creating double cross, RL_ext being the connecting line, trans_RL_k
+        # and l being the orthogonal lines going through k and l respectively.
+        RL_ext_0 = k_prev + half(k_prev - l_prev)
+        RL_ext_1 = l_prev + half(l_prev - k_prev)
+        d_kl = l_prev - k_prev
+        rot_RL_0 = k_prev
+        rot_RL_1 = np.column_stack((k_prev[:, 0] + -1*d_kl[:, 1], k_prev[:, 1] + d_kl[:, 0]))
+        shift = half(rot_RL_0 - rot_RL_1)
+        trans_RL_k_0 = rot_RL_0 + shift
+        trans_RL_k_1 = rot_RL_1 + shift
+        trans_RL_l_0 = trans_RL_k_0 + d_kl
+        trans_RL_l_1 = trans_RL_k_1 + d_kl
+
+        return np.column_stack((
+            self._test_constraints(k_now, trans_RL_k_0, trans_RL_k_1, quantisation_factor),
+            # Needs to be turned around to determine correct side
+            self._test_constraints(l_now, trans_RL_l_1, trans_RL_l_0, quantisation_factor),
+            self._test_constraints(k_now, RL_ext_0, RL_ext_1, quantisation_factor, constraint="side"),
+            self._test_constraints(l_now, RL_ext_1, RL_ext_0, quantisation_factor, constraint="side")
+        ))
+
+    def _test_constraints(self, pos, line_0, line_1, quantisation_factor=0, constraint=""):
+        """Vectorized :meth:`_test_constraint` for positions of shape (N, 2) against lines given by their two points.
+
+        :param pos: Positions of the agent, shape (N, 2).
+        :type pos: numpy.array
+        :param line_0: First points of the lines, shape (N, 2).
+        :type line_0: numpy.array
+        :param line_1: Second points of the lines, shape (N, 2).
+        :type line_1: numpy.array
+        :param quantisation_factor: Minimum distance a point has to move to be considered a non-0-state.
+        :type quantisation_factor: float
+        :param constraint: Set to "side" if checking for the side constraint. The result for the side has to be inverted.
+        :type constraint: str
+        :return: QTCS symbols, shape (N,).
+        :rtype: numpy.array
+        """
+        x0, y0 = pos[:, 0], pos[:, 1]
+        x1, y1 = line_0[:, 0], line_0[:, 1]
+        x2, y2 = line_1[:, 0], line_1[:, 1]
+        test = (x0 - x1) * (y2 - y1) - (x2 - x1) * (y0 - y1)
+
+        line = line_1 - line_0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # same determinant and norm routines as _test_constraint for identical rounding
+            d = np.abs(np.linalg.det(np.stack((line, pos - line_0), axis=1))) / \
+                np.sqrt(line[:, 0]*line[:, 0] + line[:, 1]*line[:, 1])
+            moved = np.abs(d) > quantisation_factor
+            res = np.where((test > 0) & moved, -1, np.where((test < 0) & moved, 1, 0))
+
+        # Side constraints need to be inverted to give the correct qtc state
+        return res*-1 if constraint == "side" else res
+
+    def _get_positions_of_qtc_steps(self, steps):
+        """Gather the positions of a list of QTC steps.
+
+        :param steps: List of (k previous, k current, l previous, l current) object states.
+        :type steps: list
+        :return: Positions of shape (N, 8) ordered as the object states, and whether all the positions of each step are integers.
+        :rtype: (numpy.array, numpy.array)
+        """
+        positions = np.empty((len(steps), 8))
+        integer = np.empty(len(steps), dtype=bool)
+        for i, step in enumerate(steps):
+            values = [v for o in step for v in (o.x, o.y)]
+            positions[i] = values
+            integer[i] = all(isinstance(v, (int, long, np.integer)) for v in values)
+        return positions, integer
+
+    def _split_qtc_by_between(self, betweens, qtc):
+        """Split the rows of the QTC states of all steps into per pair sequences.
+
+        :param betweens: The pair of each row, in time order.
+        :type betweens: list of str
+        :param qtc: QTC states, one row per step.
+        :type qtc: numpy.array
+        :return: The sequence of each pair; sequences of one state are 1D.
+        :rtype: dict
+        """
+        rows = {}
+        for i, between in enumerate(betweens):
+            rows.setdefault(between, []).append(i)
+        return {between: qtc[idx] if len(idx) > 1 else qtc[idx[0]] for between, idx in rows.items()}
+
     def _translate(self, point, trans_vec):
         """Translate points by trans_vec.
 
@@ -434,36 +615,7 @@ class QSR_QTC_Simplified_Abstractclass(QSR_Dyadic_Abstractclass):
         :rtype: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
         """
         ret = World_QSR_Trace(qsr_type=self._unique_id)
-        qtc_sequence = {}
-        for t, tp in zip(timestamps[1:], timestamps):
-            world_state_now = world_trace.trace[t]
-            world_state_previous = world_trace.trace[tp]
-            qsrs_for = self._process_qsrs_for([world_state_previous.objects.keys(), world_state_now.objects.keys()],
-                                              req_params["dynamic_args"])
-            for o1_name, o2_name in qsrs_for:
-                between = str(o1_name) + "," + str(o2_name)
-                qtc = np.array([], dtype=int)
-                k = [world_state_previous.objects[o1_name].x,
-                     world_state_previous.objects[o1_name].y,
-                     world_state_now.objects[o1_name].x,
-                     world_state_now.objects[o1_name].y]
-                l = [world_state_previous.objects[o2_name].x,
-                     world_state_previous.objects[o2_name].y,
-                     world_state_now.objects[o2_name].x,
-                     world_state_now.objects[o2_name].y]
-                qtc = self._create_qtc_representation(
-                    k,
-                    l,
-                    qsr_params["quantisation_factor"]
-                )
-
-                try:
-                    qtc_sequence[between] = np.append(
-                        qtc_sequence[between],
-                        qtc
-                    ).reshape(-1,4)
-                except KeyError:
-                    qtc_sequence[between] = qtc
+        qtc_sequence = self._make_qtc_sequences(world_trace, timestamps, qsr_params, req_params, ret)
 
         for between, qtc in qtc_sequence.items():
             if not qsr_params["no_collapse"]:
@@ -481,6 +633,41 @@ class QSR_QTC_Simplified_Abstractclass(QSR_Dyadic_Abstractclass):
 
         return ret
 
+    def _make_qtc_sequences(self, world_trace, timestamps, qsr_params, req_params, world_qsr_trace):
+        """Compute the QTC states of each pair of objects between consecutive timestamps, before they are collapsed
+        and validated.
+
+        :param world_trace: Input data.
+        :type world_trace: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
+        :param timestamps: List of sorted timestamps of `world_trace`.
+        :type timestamps: list
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :param req_params: Request parameters.
+        :type req_params: dict
+        :param world_qsr_trace: The world QSR trace being computed, for the variants that mark timestamps in it.
+        :type world_qsr_trace: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        :return: The QTCCS states of each pair, one per row; sequences of one state are 1D.
+        :rtype: dict
+        """
+        betweens, steps = [], []
+        for t, tp in zip(timestamps[1:], timestamps):
+            world_state_now = world_trace.trace[t]
+            world_state_previous = world_trace.trace[tp]
+            qsrs_for = self._process_qsrs_for([world_state_previous.objects.keys(), world_state_now.objects.keys()],
+                                              req_params["dynamic_args"])
+            for o1_name, o2_name in qsrs_for:
+                betweens.append(str(o1_name) + "," + str(o2_name))
+                steps.append((world_state_previous.objects[o1_name], world_state_now.objects[o1_name],
+                              world_state_previous.objects[o2_name], world_state_now.objects[o2_name]))
+
+        # all the steps of all the pairs in one go
+        positions, integer = self._get_positions_of_qtc_steps(steps)
+        qtc = self._create_qtc_representations(positions[:, 0:2], positions[:, 2:4],
+                                               positions[:, 4:6], positions[:, 6:8],
+                                               qsr_params["quantisation_factor"], integer)
+        return self._split_qtc_by_between(betweens, qtc)
+
     def _postprocess_world_qsr_trace(self, world_qsr_trace, world_trace, world_trace_timestamps, qsr_params, req_params, **kwargs):
         if qsr_params["no_collapse"] and not qsr_params["validate"]:
             return World_QSR_Trace(
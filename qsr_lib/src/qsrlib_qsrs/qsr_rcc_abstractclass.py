@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 from abc import abstractmethod, ABCMeta
+import numpy as np
 from qsrlib_qsrs.qsr_dyadic_abstractclass import QSR_Dyadic_1t_Abstractclass
+from qsrlib_io.world_qsr_trace import World_QSR_Trace, QSR
+from qsrlib_io.world_trace_columnar import World_Trace_Columnar
 
 
 class QSR_RCC_Abstractclass(QSR_Dyadic_1t_Abstractclass):
@@ -20,6 +23,9 @@ class QSR_RCC_Abstractclass(QSR_Dyadic_1t_Abstractclass):
     _dtype = "bounding_boxes_2d"
     """str: On what kind of data the QSR works with."""
 
+    _rcc8_relations = ("dc", "ec", "po", "eq", "tpp", "ntpp", "tppi", "ntppi")
+    """tuple: RCC8 relations in the order of the codes returned by :meth:`_compute_qsr_codes`."""
+
     def __init__(self):
         """Constructor."""
         super(QSR_RCC_Abstractclass, self).__init__()
@@ -27,6 +33,10 @@ class QSR_RCC_Abstractclass(QSR_Dyadic_1t_Abstractclass):
         self.__qsr_params_defaults = {"quantisation_factor": 0.0}
         """float: ?"""
 
+        self.__rcc8_codes_lookup_table = np.array([self._convert_to_requested_rcc_type(r)
+                                                   for r in self._rcc8_relations], dtype=object)
+        """numpy.ndarray: Values of the RCC variant indexed by the RCC8 codes."""
+
     def _process_qsr_parameters_from_request_parameters(self, req_params, **kwargs):
         qsr_params = self.__qsr_params_defaults.copy()
         try:
@@ -117,6 +127,156 @@ class QSR_RCC_Abstractclass(QSR_Dyadic_1t_Abstractclass):
         # If none of the other conditions are met, the objects must be parially overlapping
         return self._convert_to_requested_rcc_type("po")
 
+    @staticmethod
+    def _compute_qsr_codes(bb1, bb2, q):
+        """Batch version of :meth:`_compute_qsr` that returns RCC8 codes instead of strings.
+
+        The conditions are the same as in :meth:`_compute_qsr` and are evaluated in the same order, so the results
+        are identical to calling it for each pair of bounding boxes.
+
+        :param bb1: First bounding boxes (x1, y1, x2, y2), e.g. of shape (T, P, 4) for P pairs over T timestamps.
+        :type bb1: numpy.ndarray
+        :param bb2: Second bounding boxes, of the same shape as `bb1`.
+        :type bb2: numpy.ndarray
+        :param q: Quantisation factor.
+        :type q: float
+        :return: Indices in `_rcc8_relations` of the RCC8 relations, of shape `bb1.shape[:-1]`.
+        :rtype: numpy.ndarray of int
+        """
+        bb1 = np.asarray(bb1, dtype=float)
+        bb2 = np.asarray(bb2, dtype=float)
+        ax, ay, bx, by = bb1[..., 0], bb1[..., 1], bb1[..., 2], bb1[..., 3]
+        cx, cy, dx, dy = bb2[..., 0], bb2[..., 1], bb2[..., 2], bb2[..., 3]
+
+        with np.errstate(invalid="ignore"):  # NaN comparisons are False, as in _compute_qsr
+            eq = np.all(bb1 == bb2, axis=-1)
+            dc = (ax-q > dx+q) | (bx+q < cx-q) | (ay-q > dy+q) | (by+q < cy-q)
+            BinsideA = (ax <= cx) & (ay <= cy) & (bx >= dx) & (by >= dy)
+            AinsideB = (ax >= cx) & (ay >= cy) & (bx <= dx) & (by <= dy)
+            sameX = (np.abs(ax - cx) <= q) | (np.abs(ax - dx) <= q) | (np.abs(bx - cx) <= q) | (np.abs(bx - dx) <= q)
+            sameY = (np.abs(ay - cy) <= q) | (np.abs(ay - dy) <= q) | (np.abs(by - cy) <= q) | (np.abs(by - dy) <= q)
+            ec = (((cx-q) <= (bx+q)) & ((cx-q) >= bx)) | \
+                 (((dx+q) >= (ax-q)) & ((dx+q) <= ax)) | \
+                 (((cy-q) <= (by+q)) & ((cy-q) >= by)) | \
+                 (((dy+q) >= (ay-q)) & ((dy+q) <= ay))
+
+        # first matching condition wins, as with the early returns of _compute_qsr
+        return np.select([eq, dc, AinsideB & (sameX | sameY), BinsideA & (sameX | sameY), AinsideB, BinsideA, ec],
+                         [3, 0, 4, 6, 5, 7, 1], default=2)
+
+    def _convert_codes_to_requested_rcc_type(self, codes):
+        """Convert RCC8 codes to the values of the RCC variant via a lookup table built from
+        :meth:`_convert_to_requested_rcc_type`.
+
+        :param codes: RCC8 codes as returned by :meth:`_compute_qsr_codes`.
+        :type codes: numpy.ndarray of int
+        :return: The values of the RCC variant.
+        :rtype: numpy.ndarray of str
+        """
+        return self.__rcc8_codes_lookup_table[codes]
+
+    def make_world_qsr_trace(self, world_trace, timestamps, qsr_params, req_params, **kwargs):
+        """Compute the world QSR trace from the arguments.
+
+        The bounding boxes of all the pairs at all the timestamps are gathered first and the relations are then
+        computed in one pass by :meth:`_compute_qsr_codes`. For a
+        :class:`World_Trace_Columnar <qsrlib_io.world_trace_columnar.World_Trace_Columnar>` the bounding boxes are
+        read from its columns.
+
+        :param world_trace: Input data.
+        :type world_trace: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
+        :param timestamps: List of sorted timestamps of `world_trace`.
+        :type timestamps: list
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :param req_params: Request parameters.
+        :type req_params: dict
+        :param kwargs: kwargs arguments.
+        :return: Computed world QSR trace.
+        :rtype: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+        """
+        if self._dtype not in self._dtype_map:
+            raise KeyError("%s is not a valid value, should be one of %s" % (self._dtype, self._dtype_map.keys()))
+        ret = World_QSR_Trace(qsr_type=self._unique_id)
+        default_relation = self._get_spatial_index_default_relation(qsr_params)
+        use_spatial_index = self._is_spatial_index_requested(req_params)
+        entries = []
+        for t in timestamps:
+            world_state = world_trace.trace[t]
+            qsrs_for = self._process_qsrs_for(world_state.objects.keys(), req_params["dynamic_args"])
+            if use_spatial_index:
+                candidates = self._get_spatial_index_candidates(world_state, qsrs_for, qsr_params)
+                for p in qsrs_for:
+                    if tuple(p) in candidates:
+                        entries.append((t, p))
+                    else:
+                        ret.add_qsr(QSR(timestamp=t, between=",".join(p), qsr=self._format_qsr(default_relation)), t)
+            else:
+                entries.extend((t, p) for p in qsrs_for)
+        bb1, bb2 = self._get_bounding_boxes_of_pairs(world_trace, entries)
+        values = self._convert_codes_to_requested_rcc_type(
+            self._compute_qsr_codes(bb1, bb2, qsr_params["quantisation_factor"]))
+        for (t, p), v in zip(entries, values):
+            ret.add_qsr(QSR(timestamp=t, between=",".join(p), qsr=self._format_qsr(v)), t)
+        return ret
+
+    def _get_spatial_index_default_relation(self, qsr_params):
+        """Pairs far apart are disconnected.
+
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :return: "dc" in the RCC variant.
+        :rtype: str
+        """
+        return self._convert_to_requested_rcc_type("dc")
+
+    def _get_spatial_index_extent(self, object_state, qsr_params):
+        """The bounding box grown by the quantisation factor, so that non-intersecting extents are exactly the "dc"
+        condition of :meth:`_compute_qsr`.
+
+        :param object_state: The object data.
+        :type object_state: :class:`Object_State <qsrlib_io.world_trace.Object_State>`
+        :param qsr_params: QSR specific parameters passed in `dynamic_args`.
+        :type qsr_params: dict
+        :return: The extent (x1, y1, x2, y2).
+        :rtype: tuple
+        """
+        q = qsr_params["quantisation_factor"]
+        x1, y1, x2, y2 = object_state.return_bounding_box_2d()
+        return x1-q, y1-q, x2+q, y2+q
+
+    def _get_bounding_boxes_of_pairs(self, world_trace, entries):
+        """Gather the bounding boxes of the objects of a list of (timestamp, pair) entries.
+
+        :param world_trace: Input data.
+        :type world_trace: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
+        :param entries: List of (timestamp, (object name, object name)) tuples.
+        :type entries: list
+        :return: Two arrays of shape (len(entries), 4) with the bounding boxes of the first and second objects.
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        bb1, bb2 = np.empty((len(entries), 4)), np.empty((len(entries), 4))
+        if isinstance(world_trace, World_Trace_Columnar):
+            rows = np.searchsorted(world_trace.timestamps, [t for t, _ in entries])
+            boxes = {}
+            for i, bb in ((0, bb1), (1, bb2)):
+                names = np.array([p[i] for _, p in entries], dtype=object)
+                for name in set(names):
+                    if name not in boxes:
+                        boxes[name] = world_trace.get_object_bounding_boxes_2d(name)
+                    mask = names == name
+                    bb[mask] = boxes[name][rows[mask]]
+        else:
+            boxes, boxes_t = {}, None
+            for k, (t, p) in enumerate(entries):
+                if t != boxes_t:
+                    boxes, boxes_t = {}, t
+                for o, bb in zip(p, (bb1, bb2)):
+                    if o not in boxes:
+                        boxes[o] = world_trace.trace[t].objects[o].return_bounding_box_2d()
+                    bb[k] = boxes[o]
+        return bb1, bb2
+
     @abstractmethod
     def _convert_to_requested_rcc_type(self, qsr):
         """Overwrite this function to filter and return only the relations corresponding to the particular RCC version.
@@ -71,6 +71,9 @@ class QSR_Triadic_1t_Abstractclass(QSR_Triadic_Abstractclass):
 
     __metaclass__ = ABCMeta
 
+    _time_shard_overlap = 0
+    """int: Each timestamp is computed on its own."""
+
     def __init__(self):
         """Constructor."""
         super(QSR_Triadic_1t_Abstractclass, self).__init__()
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Persistent store of a global graphlet code book and of the graphlet histograms of many observations
+"""
+from __future__ import print_function
+import os
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import numpy as np
+
+
+class Graphlet_Codebook_Store(object):
+    """
+    Graphlet Codebook Store class:
+    A global code book of graphlet hashes and the graphlet histograms of many observations (clips), kept in a
+    directory on disk.
+
+    The store is made of append-only segments: each :meth:`flush` writes one new segment file with the hashes and
+    clips added since the previous one, and the existing segments are never modified. A hash keeps the index it was
+    given when it was first added, so the indices in older segments stay valid, and the hash to index map is rebuilt
+    in memory when the store is opened. The graphlet iGraph objects are kept in a separate file next to each segment
+    and only loaded when asked for.
+
+    Stores written by parallel workers, one store each, are combined with :meth:`merge`, which only compares the
+    stored hashes, so graphlets that are already in the store are neither re-hashed nor copied. The hashes need to
+    be the same in every process, e.g. the Weisfeiler-Lehman hashes selected with the "graph_hash": "wl" parameter
+    of the QSTAG.
+
+    A store must only be written by one process at a time.
+    """
+
+    def __init__(self, path):
+        """Constructor. Opens the store in the directory `path`, which is created if it does not exist.
+
+        :param path: directory of the store
+        :type path: str
+        """
+        self.path = path
+        """str: The directory of the store."""
+        self.code_book = []
+        """list: The list of graphlet hashes, in the order they were first added."""
+        self.clips = []
+        """list: The list of the clip names, in the order they were added."""
+        self.__index = {}
+        """dict: dictionary of the graphlet hash as key, and its index in the code book as value."""
+        self.__clip_index = {}
+        """dict: dictionary of the clip name as key, and its row in the histograms as value."""
+        self.__rows = []
+        """list: The histogram of each clip, as a tuple of an array of code book indices and an array of counts."""
+        self.__segments = []
+        """list: The name of each segment and the index of the first hash it added to the code book."""
+        self.__graphlets = {}
+        """dict: The graphlets that are not flushed yet, or were loaded, with the graphlet hash as key."""
+        self.__flushed = (0, 0)
+        """tuple: The number of hashes and clips that are written to the segments."""
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name in sorted(f for f in os.listdir(path) if f.endswith(".segment")):
+            with open(os.path.join(path, name), "rb") as f:
+                segment = pickle.load(f)
+            self.__segments.append((name[:-len(".segment")], len(self.code_book)))
+            for h in segment["hashes"]:
+                self.__index[h] = len(self.code_book)
+                self.code_book.append(h)
+            for clip, ids, counts in segment["clips"]:
+                self.__clip_index[clip] = len(self.clips)
+                self.clips.append(clip)
+                self.__rows.append((ids, counts))
+        self.__flushed = (len(self.code_book), len(self.clips))
+
+    def __len__(self):
+        return len(self.code_book)
+
+    def __contains__(self, h):
+        return h in self.__index
+
+    def index(self, h):
+        """Returns the index of a graphlet hash in the code book.
+
+        :param h: graphlet hash
+        :type h: str
+        :return: index of the hash in `self.code_book`
+        :rtype: int
+        :raises KeyError: if the hash is not in the code book
+        """
+        return self.__index[h]
+
+    def add_clip(self, clip, graphlets):
+        """Adds the graphlets of the Activity Graph of a clip. Hashes that are not in the code book yet are added to
+        it, together with their graphlet. Nothing is written to disk until :meth:`flush` is called.
+
+        :param clip: unique name of the clip
+        :type clip: str
+        :param graphlets: the Graphlets of the Activity Graph of the clip, i.e. `Activity_Graph.graphlets`
+        :type graphlets: :class:`Graphlets <qsrlib_qstag.qstag.Graphlets>`
+        :raises ValueError: if the clip is already in the store
+        """
+        self.__add_clip(clip, graphlets.code_book, graphlets.histogram, graphlets.graphlets.get)
+
+    def merge(self, other):
+        """Adds the clips of another store, e.g. one written by a parallel worker, that are not in this store yet.
+        The hashes of the other store are mapped to the indices of this code book, and only the graphlets of hashes
+        that are new to this store are loaded from the other one. Nothing is written to disk until :meth:`flush` is
+        called.
+
+        :param other: the other store, or its directory
+        :type other: :class:`Graphlet_Codebook_Store` or str
+        :return: the number of clips that were added
+        :rtype: int
+        """
+        if not isinstance(other, Graphlet_Codebook_Store):
+            other = Graphlet_Codebook_Store(other)
+        added = 0
+        for clip, (ids, counts) in zip(other.clips, other.__rows):
+            if clip in self.__clip_index:
+                continue
+            self.__add_clip(clip, [other.code_book[i] for i in ids], counts, other.get_graphlet)
+            added += 1
+        return added
+
+    def flush(self):
+        """Writes the hashes and clips added since the last flush to a new segment.
+
+        :return: the name of the new segment, or None if there was nothing to write
+        :rtype: str or None
+        """
+        num_of_hashes, num_of_clips = self.__flushed
+        if num_of_hashes == len(self.code_book) and num_of_clips == len(self.clips):
+            return None
+        name = "%08d" % len(self.__segments)
+        hashes = self.code_book[num_of_hashes:]
+        segment = {"hashes": hashes,
+                   "clips": [(clip, ids, counts) for clip, (ids, counts)
+                             in zip(self.clips[num_of_clips:], self.__rows[num_of_clips:])]}
+        self.__write(name + ".graphlets", dict((h, self.__graphlets[h]) for h in hashes if h in self.__graphlets))
+        # the segment is written last, as the store only reads the graphlets of the segments it knows about
+        self.__write(name + ".segment", segment)
+        self.__segments.append((name, num_of_hashes))
+        self.__flushed = (len(self.code_book), len(self.clips))
+        return name
+
+    def get_graphlet(self, h):
+        """Returns the graphlet of a hash, loading it from its segment if needed.
+
+        :param h: graphlet hash
+        :type h: str
+        :return: the graphlet, or None if it is not in the store
+        :rtype: igraph.Graph
+        """
+        try:
+            return self.__graphlets[h]
+        except KeyError:
+            pass
+        try:
+            ind = self.__index[h]
+        except KeyError:
+            return None
+        for name, first in reversed(self.__segments):
+            if first <= ind:
+                break
+        else:
+            return None
+        with open(os.path.join(self.path, name + ".graphlets"), "rb") as f:
+            self.__graphlets.update(pickle.load(f))
+        return self.__graphlets.get(h)
+
+    def get_histogram(self, clip):
+        """Returns the histogram of a clip as a dense vector aligned with the code book.
+
+        :param clip: name of the clip
+        :type clip: str
+        :return: vector of the length of the code book with the count of each of its graphlets
+        :rtype: numpy.ndarray
+        """
+        ids, counts = self.__rows[self.__clip_index[clip]]
+        ret = np.zeros(len(self.code_book), dtype=int)
+        ret[ids] = counts
+        return ret
+
+    def get_coo(self, clips=None):
+        """Returns the histograms of the clips as a sparse matrix in coordinate format, with a row for each clip and a
+        column for each graphlet of the code book.
+
+        :param clips: names of the clips of the rows, all the clips of the store in their order if None
+        :type clips: list
+        :return: the counts, their rows, their columns, and the shape of the matrix
+        :rtype: tuple
+        """
+        rows = [self.__rows[self.__clip_index[clip]] for clip in clips] if clips is not None else self.__rows
+        lengths = [len(ids) for ids, _ in rows]
+        row = np.repeat(np.arange(len(rows), dtype=int), lengths)
+        if rows:
+            col = np.concatenate([ids for ids, _ in rows]).astype(int)
+            data = np.concatenate([counts for _, counts in rows]).astype(int)
+        else:
+            col, data = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        return data, row, col, (len(rows), len(self.code_book))
+
+    def get_csr_matrix(self, clips=None):
+        """Returns the histograms of the clips as a `scipy.sparse.csr_matrix`, with a row for each clip and a column
+        for each graphlet of the code book. Requires scipy.
+
+        :param clips: names of the clips of the rows, all the clips of the store in their order if None
+        :type clips: list
+        :return: the clips x graphlets matrix of counts
+        :rtype: scipy.sparse.csr_matrix
+        """
+        try:
+            from scipy.sparse import csr_matrix
+        except ImportError:
+            raise ImportError("scipy is needed for sparse matrices, use get_coo() otherwise")
+        data, row, col, shape = self.get_coo(clips)
+        return csr_matrix((data, (row, col)), shape=shape)
+
+    def __add_clip(self, clip, hashes, counts, get_graphlet):
+        """Adds the histogram of a clip, given as hashes and their counts.
+
+        :param clip: unique name of the clip
+        :type clip: str
+        :param hashes: graphlet hashes of the clip
+        :type hashes: list
+        :param counts: count of each hash
+        :type counts: list
+        :param get_graphlet: returns the graphlet of a hash, only called for the hashes that are new to the code book
+        :type get_graphlet: function
+        :raises ValueError: if the clip is already in the store
+        """
+        if clip in self.__clip_index:
+            raise ValueError("clip %s is already in the store" % str(clip))
+        ids = []
+        for h in hashes:
+            try:
+                ids.append(self.__index[h])
+            except KeyError:
+                self.__index[h] = len(self.code_book)
+                ids.append(len(self.code_book))
+                self.code_book.append(h)
+                graphlet = get_graphlet(h)
+                if graphlet is not None:
+                    self.__graphlets[h] = graphlet
+        self.__clip_index[clip] = len(self.clips)
+        self.clips.append(clip)
+        self.__rows.append((np.array(ids, dtype=int), np.array(counts, dtype=int)))
+
+    def __write(self, name, obj):
+        """Writes an object to a new file of the store, through a temporary file so that it is never read half
+        written.
+
+        :param name: name of the file in the store directory
+        :type name: str
+        :param obj: the object to pickle
+        :type obj: object
+        """
+        path = os.path.join(self.path, name)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(path + ".tmp", path)
@@ -0,0 +1,746 @@
+# -*- coding: utf-8 -*-
+"""Incremental Qualitative Spatio-Temporal Activity Graph module
+"""
+from __future__ import print_function
+import sys
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import combinations, chain
+from operator import attrgetter
+from igraph import Graph as iGraph
+import qsrlib_qstag.utils as utils
+from qsrlib_qstag.qstag import Activity_Graph, Graphlets, get_graphlet, temporal_map, spatial_nodes_edges
+
+
+class _Series(object):
+    """The episodes of some objects and a QSR (or all of them if the QSRs are not split), as they are streamed."""
+
+    def __init__(self, rank, objects, make_relation):
+        self.rank = rank
+        """tuple: The index of the QSR, then the timestamp and position where the objects are first found."""
+        self.objects = objects
+        """list: The objects of the episodes."""
+        self.make_relation = make_relation
+        """function: Makes the relation dictionary of an episode from a value."""
+        self.value = None
+        """The value of the last frame, None before the first one."""
+        self.chunk = (0, 0)
+        """tuple: The number of frames of the last episode, and its maximum number of frames."""
+        self.current = None
+        """_Episode: The last episode, None if it is ignored."""
+        self.episodes = []
+        """list: The episodes, in time order, without the ignored ones."""
+        self.ends = []
+        """list: The end frame of each episode."""
+
+
+class _Episode(object):
+    """A QSR episode of the incremental Activity Graph."""
+
+    def __init__(self, uid, series, relation, start):
+        self.uid = uid
+        """int: Unique id, in the order the episodes are found."""
+        self.series = series
+        """_Series: The series of the episode."""
+        self.objects = series.objects
+        """list: The objects of the episode."""
+        self.relation = relation
+        """dict: The spatial relations of the episode."""
+        self.start = start
+        """The start frame."""
+        self.end = start
+        """The end frame."""
+        self.key = (series.rank, start)
+        """tuple: The sort key of the episode, in the order of `utils.compute_episodes`."""
+        self.vertex = None
+        """int: The spatial node of the episode."""
+        self.obj_edges = []
+        """list: The edges between the spatial node and the object nodes."""
+
+    @property
+    def row(self):
+        return tuple(self.objects)
+
+    def to_tuple(self):
+        return (self.objects, self.relation, (self.start, self.end))
+
+
+class Incremental_Activity_Graph(Activity_Graph):
+    """
+    Incremental Activity Graph class:
+    An Activity Graph of a growing observation, which is updated with the new QSR frames instead of being
+    rebuilt from the whole observation.
+
+    Each update extends the open episodes, or closes them and opens new ones, then adds the object, spatial and
+    temporal nodes of the new episodes to the graph, and renames the temporal nodes whose Allen relation changed
+    because an episode was extended (or, with a "temporal_horizon", adds those of the episodes it brought within
+    the horizon). The graphlets are only searched again in the windows of temporal chords that
+    changed, or that hold an episode which joined or left the set of episodes at the start or end of the
+    observation, and the graphlets of the selections which hold an extended episode are updated. The cost of an
+    update therefore depends on what it changes, not on how long the observation is.
+
+    After each update the Activity Graph is equal to the :class:`Activity_Graph <qsrlib_qstag.qstag.Activity_Graph>`
+    of all the frames so far: the episodes are the same and in the same order, the graph is the same up to the
+    numbering of its vertices, and the graphlets have the same hashes and counts. The code book is in the order the
+    hashes were found by the updates, and the timepoints of each graphlet are sorted.
+
+    The "max_row_combinations" and "max_graphlets" parameters draw random samples, which cannot be updated, so they
+    are not supported.
+
+    Example::
+
+        activity_graph = Incremental_Activity_Graph(params={"min_rows": 1, "max_rows": 1, "max_eps": 3})
+        for world, world_qsr in feed:
+            activity_graph.update(world, world_qsr)
+            histogram = activity_graph.graphlets.histogram
+    """
+    def __init__(self, world=None, world_qsr=None, object_types={}, params={}, vis=False):
+        """Constructor.
+
+        :param world: The World Trace object of the first frames, if any
+        :type world: :class:`World_Trace <qsrlib_io.world_trace>`
+        :param world_qsr: The QSR_World_Trace object of the first frames, if any
+        :type world_qsr: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace>`
+        :param object_types: dictionary of object name to a generic object type
+        :type object_types: dict
+        :param params: dictionary of parameters, as for the Activity_Graph
+        :type params: dict
+        :raises ValueError: if a parameter cannot be used incrementally
+        """
+        try:
+            if not isinstance(params["max_eps"], int):
+                raise RuntimeError("params needs to contain a dictionary of Graphlet parameters. i.e. max_eps, and min/max_rows.")
+        except KeyError:
+            print("dynamic args needs something like this:  {qstag {params: {min_rows:1, max_rows:1, max_eps:3}}" )
+            sys.exit(1)
+        for param in ("max_row_combinations", "max_graphlets"):
+            if params.get(param) is not None:
+                raise ValueError("%s samples the graphlets at random and cannot be updated incrementally" % param)
+        try:
+            self.__graph_hash = utils.graph_hash_functions[params.get("graph_hash", "shortest_paths")]
+        except KeyError:
+            raise ValueError("graph_hash must be one of: %s" % ", ".join(sorted(utils.graph_hash_functions)))
+
+        self.__params = params
+        """dict: The Activity Graph and Graphlet parameters."""
+        self.__vis = vis
+        self.__object_types = dict(object_types)
+        """dict: A dictionary of object names and types."""
+
+        self.graph = iGraph(directed=True)
+        """igraph.Graph: An igraph graph object containing all the object, spatial and temporal nodes."""
+
+        self.__qsr_type = None
+        """str: The QSR type of the QSR_World_Traces."""
+        self.__last_frame = None
+        """The timestamp of the last QSR frame."""
+        self.__last_world_frame = None
+        """The timestamp of the last world state whose object types were read."""
+        self.__series = {}
+        """dict: The series of episodes, with the QSR and objects as key."""
+        self.__rows = OrderedDict()
+        """dict: The series of each objects, i.e. of each row of the temporal chords."""
+        self.__episodes = {}
+        """dict: The episodes that are not ignored, with their uid as key."""
+        self.__num_of_episodes = 0
+        """int: The number of episodes found, including the ignored ones."""
+        self.__first_new_uid = 1
+        """int: The uid of the first episode found by the current update."""
+        self.__object_vertices = {}
+        """dict: The object node of each object."""
+        self.__temporal_vertices = {}
+        """dict: The temporal node and Allen relation of each pair of episodes, with their uids in episode order."""
+        self.__starts, self.__ends = {}, {}
+        """dict: The uids of the episodes which start, or end, at each frame."""
+        self.__observation = (10000, 0)
+        """tuple: The start and end of the observation, as computed by `qstag.get_graphlet_selections`."""
+        self.__start_set, self.__end_set = set([]), set([])
+        """set: The uids of the episodes at the start, or end, of the observation."""
+        self.__combinations = {}
+        """dict: The temporal chords of each combination of rows, their start and end frames, and the selections
+        of episodes found in the windows starting at each chord."""
+        self.__selections = {}
+        """dict: The graphlet hash and timepoint of each selection, with its combination of rows and uids as key."""
+        self.__selections_of = {}
+        """dict: The keys of the selections of each episode uid."""
+        self.__graphs = {}
+        """dict: The graphlet and hash of each selection signature, see `qstag.get_graphlet`."""
+        self.__histogram = OrderedDict()
+        """dict: The count of each graphlet hash, in the order they were found."""
+        self.__graphlets = {}
+        """dict: dictionary of the graphlet hash as key, and the iGraph object as value."""
+        self.__timepoints = {}
+        """dict: The counts of the (start, end) timepoints of each graphlet hash."""
+        self.__cache = {}
+        """dict: The episodes list and Graphlets object, until the next update."""
+
+        if world_qsr is not None:
+            self.update(world, world_qsr)
+
+    @property
+    def episodes(self):
+        """Getter.
+
+        :return: the list of QSR Episodes, in the order of `utils.compute_episodes`
+        :rtype: list
+        """
+        try:
+            return self.__cache["episodes"]
+        except KeyError:
+            ret = self.__cache["episodes"] = [ep.to_tuple() for ep in self.__get_sorted_episodes()]
+            return ret
+
+    @property
+    def spatial_obj_edges(self):
+        """Getter.
+
+        :return: the edges connecting the spatial nodes to the object nodes, in episode order
+        :rtype: list
+        """
+        return list(chain.from_iterable(ep.obj_edges for ep in self.__get_sorted_episodes()))
+
+    @property
+    def temp_spatial_edges(self):
+        """Getter.
+
+        :return: the edges connecting the spatial nodes to the temporal nodes, in order of the pairs of episodes
+        :rtype: list
+        """
+        ret = []
+        episodes = self.__episodes
+        for (u1, u2), (vertex, rel) in sorted(self.__temporal_vertices.items(),
+                                              key=lambda x: (episodes[x[0][0]].key, episodes[x[0][1]].key)):
+            v1, v2 = episodes[u1].vertex, episodes[u2].vertex
+            if rel in temporal_map:
+                ret.extend([(vertex, v1), (v2, vertex)])
+            else:
+                ret.extend([(v1, vertex), (vertex, v2)])
+        return ret
+
+    @property
+    def graphlets(self):
+        """Getter.
+
+        :return: the Graphlets of the Activity Graph
+        :rtype: :class:`Graphlets <qsrlib_qstag.qstag.Graphlets>`
+        """
+        try:
+            return self.__cache["graphlets"]
+        except KeyError:
+            pass
+        hashes = list(chain.from_iterable([h]*count for h, count in self.__histogram.items()))
+        timepoints = dict((h, sorted(chain.from_iterable([tp]*count for tp, count in tps.items())))
+                          for h, tps in self.__timepoints.items())
+        ret = self.__cache["graphlets"] = Graphlets(self.episodes, self.__params, self.__object_types, vis=self.__vis,
+                                                    selections=(map(self.__graphlets.get, hashes), hashes, timepoints))
+        return ret
+
+    @property
+    def object_types(self):
+        """Getter.
+
+        :return: A dictionary of object names and types.
+        :rtype: dict
+        """
+        return self.__object_types
+
+    def update(self, world, world_qsr):
+        """Adds the new frames of a QSR_World_Trace, i.e. those after the last frame of the previous updates.
+        The trace can hold the whole observation so far, or only its new frames.
+
+        :param world: The World Trace object, used for the types of the new objects
+        :type world: :class:`World_Trace <qsrlib_io.world_trace>`
+        :param world_qsr: The QSR_World_Trace object
+        :type world_qsr: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace>`
+        :raises ValueError: if the QSR type is not the one of the previous updates
+        """
+        if self.__qsr_type is None:
+            self.__qsr_type = world_qsr.qsr_type
+        elif world_qsr.qsr_type != self.__qsr_type:
+            raise ValueError("the QSR type %s is not the one of the previous updates, %s" %
+                             (world_qsr.qsr_type, self.__qsr_type))
+
+        if world is not None:
+            timestamps = world.get_sorted_timestamps()
+            if self.__last_world_frame is not None:
+                timestamps = timestamps[bisect_right(timestamps, self.__last_world_frame):]
+            if timestamps:
+                self.get_objects_types(self.__object_types, world, timestamps)
+                self.__last_world_frame = timestamps[-1]
+
+        frames = world_qsr.get_sorted_timestamps()
+        if self.__last_frame is not None:
+            frames = frames[bisect_right(frames, self.__last_frame):]
+        elif frames and "qtcbs" in self.__qsr_type and len(self.__qsr_type.split(",")) > 1:
+            # the first frame cannot contain a qtcb relation, see utils.compute_episodes
+            self.__last_frame = frames.pop(0)
+        if not frames:
+            return
+        self.__last_frame = frames[-1]
+
+        new, extended = self.__update_episodes(world_qsr, frames)
+        if not new and not extended:
+            return
+        self.__cache = {}
+        self.__update_graph(new, extended)
+        self.__update_graphlets(new, extended)
+
+    def __get_sorted_episodes(self):
+        """Returns the episodes that are not ignored, in the order of `utils.compute_episodes`.
+
+        :rtype: list
+        """
+        return sorted(self.__episodes.values(), key=attrgetter("key"))
+
+    def __update_episodes(self, world_qsr, frames):
+        """Adds the QSRs of the new frames to their series of episodes, see `utils.compute_episodes`.
+
+        :param world_qsr: The QSR_World_Trace object
+        :type world_qsr: :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace>`
+        :param frames: the new timestamps
+        :type frames: list
+        :return: the new episodes, and the old end frame of each extended episode with its uid as key
+        :rtype: tuple
+        """
+        try:
+            split_qsrs = self.__params["split_qsrs"]
+        except KeyError:
+            split_qsrs = False
+        qsr_types = self.__qsr_type.split(",")
+        series_qsrs = utils.get_series_qsrs(self.__qsr_type, split_qsrs)
+        exclude = "tpcc" if "tpcc" in qsr_types else None
+
+        new, extended = [], {}
+        self.__first_new_uid = self.__num_of_episodes + 1
+        for t in frames:
+            for pos, (between, qsr) in enumerate(world_qsr.trace[t].qsrs.items()):
+                relations = qsr.qsr
+                if exclude is not None:
+                    self.__push(new, extended, ("tpcc", between), relations.get("tpcc"), t,
+                                (series_qsrs.index("tpcc"), t, pos), "tpcc")
+                if split_qsrs:
+                    for q in qsr_types:
+                        if q == "tpcc": continue
+                        self.__push(new, extended, (q, between), relations.get(q), t,
+                                    (series_qsrs.index(q), t, pos), q)
+                else:
+                    value = frozenset([(k, v) for k, v in relations.items() if k != exclude]) or None
+                    self.__push(new, extended, (self.__qsr_type, between), value, t, (0, t, pos), None)
+
+        for uid, old_end in extended.items():
+            ep = self.__episodes[uid]
+            self.__ends[old_end].discard(uid)
+            self.__ends.setdefault(ep.end, set()).add(uid)
+        for ep in new:
+            self.__starts.setdefault(ep.start, set()).add(ep.uid)
+            self.__ends.setdefault(ep.end, set()).add(ep.uid)
+        return new, extended
+
+    def __push(self, new, extended, key, value, t, rank, q):
+        """Adds the value of a frame to a series, extending its last episode or starting a new one.
+
+        :param new: the new episodes of the update, which is updated
+        :type new: list
+        :param extended: the old end of the episodes extended by the update, which is updated
+        :type extended: dict
+        :param key: the QSR and objects of the series
+        :type key: tuple
+        :param value: the value, None if the series has no QSR at this frame
+        :param t: the timestamp of the frame
+        :param rank: the rank of the series if it is new
+        :type rank: tuple
+        :param q: "tpcc" for the tpcc series, the QSR of a split series, or None
+        :type q: str
+        """
+        if value is None:
+            return
+        try:
+            series = self.__series[key]
+        except KeyError:
+            between = key[1]
+            if q == "tpcc":
+                objects = ("%s-%s,%s" % tuple(between.split(","))).split(",")
+                make_relation = lambda v: {"tpcc": v}
+            elif q is not None:
+                objects = between.split(",")
+                make_relation = lambda v: {q: v}
+            else:
+                objects = between.split(",")
+                make_relation = dict
+            series = self.__series[key] = _Series(rank, objects, make_relation)
+            self.__rows.setdefault(tuple(objects), []).append(series)
+
+        try:
+            episode_length_threshold = self.__params["frames_per_ep"]
+        except KeyError:
+            episode_length_threshold = 0
+        length, max_length = series.chunk
+        if series.value is not None and value == series.value and \
+                (episode_length_threshold == 0 or length < max_length):
+            series.chunk = (length+1, max_length)
+            ep = series.current
+            if ep is not None:
+                if ep.uid < self.__first_new_uid:
+                    extended.setdefault(ep.uid, ep.end)
+                ep.end = t
+                series.ends[-1] = t
+            return
+
+        # A new episode: the first one of the series has at most episode_length_threshold+1 frames,
+        # the others episode_length_threshold+2 frames, see utils.get_episodes_from_codes
+        series.chunk = (1, episode_length_threshold + (1 if series.value is None else 2))
+        series.value = value
+        relation = series.make_relation(value)
+        self.__num_of_episodes += 1
+        if "Ignore" in relation.values():
+            series.current = None
+            return
+        ep = series.current = _Episode(self.__num_of_episodes, series, relation, t)
+        self.__episodes[ep.uid] = ep
+        series.episodes.append(ep)
+        series.ends.append(t)
+        new.append(ep)
+
+    def __update_graph(self, new, extended):
+        """Adds the object, spatial and temporal nodes of the new episodes to the graph, and updates the temporal
+        nodes of the extended episodes whose Allen relation changed, see `qstag.get_graph`.
+
+        :param new: the new episodes
+        :type new: list
+        :param extended: the old end frame of each extended episode, with its uid as key
+        :type extended: dict
+        """
+        graph = self.graph
+        episodes = self.__episodes
+        first_vertex = graph.vcount()
+        names, node_types, obj_types = [], [], {}
+        edges, deleted_edges = [], []
+
+        def add_vertex(name, node_type):
+            names.append(name)
+            node_types.append(node_type)
+            return first_vertex + len(names) - 1
+
+        for ep in new:
+            number_of_edges = set([spatial_nodes_edges[rel] for rel in ep.relation.keys()])
+            if len(number_of_edges) != 1:
+                raise ValueError("QSRs with different spatial node edges selected.")
+            for o in ep.objects:
+                if o in self.__object_vertices: continue
+                vertex = self.__object_vertices[o] = add_vertex(o, 'object')
+                if o in self.__object_types:
+                    obj_types[vertex] = self.__object_types[o]
+            ep.vertex = add_vertex(ep.relation, 'spatial_relation')
+            ep.obj_edges = [(self.__object_vertices[ep.objects[0]], ep.vertex)]
+            if number_of_edges.pop() == 2:
+                ep.obj_edges.append((ep.vertex, self.__object_vertices[ep.objects[1]]))
+            edges.extend(ep.obj_edges)
+
+        def add_temporal_vertex(ep1, ep2):
+            if temporal_horizon is not None and \
+                    utils.get_temporal_gap((ep1.start, ep1.end), (ep2.start, ep2.end)) > temporal_horizon:
+                return
+            rel = utils.get_allen_relation((ep1.start, ep1.end), (ep2.start, ep2.end))
+            vertex = add_vertex(temporal_map.get(rel, rel), 'temporal_relation')
+            self.__temporal_vertices[(ep1.uid, ep2.uid)] = (vertex, rel)
+            edges.extend(_get_temporal_edges(ep1, ep2, vertex, rel))
+
+        # The temporal nodes between each new episode and all the others
+        temporal_horizon = self.__params.get("temporal_horizon")
+        for ep in new:
+            for other in episodes.values():
+                if other.uid >= self.__first_new_uid and other.uid <= ep.uid: continue
+                ep1, ep2 = (ep, other) if ep.key < other.key else (other, ep)
+                add_temporal_vertex(ep1, ep2)
+
+        # The Allen relation between an extended episode and another one can only change, and with a
+        # temporal horizon they can only get within it, if the other one ends after the old end of the extended one
+        checked = set([])
+        for uid, old_end in extended.items():
+            ep = episodes[uid]
+            for other in self.__get_episodes_ending_from(old_end - 1):
+                if other.uid == uid or other.uid >= self.__first_new_uid: continue
+                ep1, ep2 = (ep, other) if ep.key < other.key else (other, ep)
+                pair = (ep1.uid, ep2.uid)
+                if pair in checked: continue
+                checked.add(pair)
+                try:
+                    vertex, old_rel = self.__temporal_vertices[pair]
+                except KeyError:
+                    add_temporal_vertex(ep1, ep2)
+                    continue
+                rel = utils.get_allen_relation((ep1.start, ep1.end), (ep2.start, ep2.end))
+                if rel == old_rel: continue
+                self.__temporal_vertices[pair] = (vertex, rel)
+                graph.vs[vertex]['name'] = temporal_map.get(rel, rel)
+                if (rel in temporal_map) != (old_rel in temporal_map):
+                    deleted_edges.extend(_get_temporal_edges(ep1, ep2, vertex, old_rel))
+                    edges.extend(_get_temporal_edges(ep1, ep2, vertex, rel))
+
+        if deleted_edges:
+            graph.delete_edges(graph.get_eids(pairs=deleted_edges))
+        if names:
+            graph.add_vertices(len(names))
+            vertices = graph.vs.select(xrange(first_vertex, first_vertex + len(names)))
+            vertices['name'] = names
+            vertices['node_type'] = node_types
+            for vertex, obj_type in obj_types.items():
+                graph.vs[vertex]['obj_type'] = obj_type
+        if edges:
+            graph.add_edges(edges)
+
+    def __get_episodes_ending_from(self, frame):
+        """Returns the episodes which end at or after a frame.
+
+        :param frame: the frame
+        :return: the episodes
+        :rtype: list
+        """
+        ret = []
+        for series in self.__series.values():
+            ret.extend(series.episodes[bisect_left(series.ends, frame):])
+        return ret
+
+    def __update_graphlets(self, new, extended):
+        """Updates the graphlet selections of the combinations of rows whose temporal chords changed, or which hold
+        an episode that joined or left the start or end set of the observation, see
+        `qstag.get_graphlet_selections`.
+
+        :param new: the new episodes
+        :type new: list
+        :param extended: the old end frame of each extended episode, with its uid as key
+        :type extended: dict
+        """
+        params = self.__params
+        first_new_uid = self.__first_new_uid
+        episodes = self.__episodes
+
+        # The episodes which occur at the start or end of the observation, before and after the update
+        old_start, old_end = self.__observation
+        observation_start = min([old_start] + [ep.start for ep in new])
+        observation_end = max([old_end] + [ep.end for ep in new] + [episodes[uid].end for uid in extended])
+        old_start_set = set([uid for uid in self.__starts.get(old_start, ()) if uid < first_new_uid])
+        old_end_set = set([uid for uid in self.__ends.get(old_end, ()) if uid < first_new_uid and uid not in extended] +
+                          [uid for uid, end in extended.items() if end == old_end])
+        self.__observation = (observation_start, observation_end)
+        self.__start_set = set(self.__starts.get(observation_start, ()))
+        self.__end_set = set(self.__ends.get(observation_end, ()))
+        members = (old_start_set ^ self.__start_set) | (old_end_set ^ self.__end_set)
+
+        # The first frame of each row from which its temporal chords changed, and the episodes of each row
+        # whose membership of the start or end set changed
+        changes = {}
+        for ep in new:
+            changes[ep.row] = min(changes.get(ep.row, int(ep.start)), int(ep.start))
+        for uid, old_end in extended.items():
+            row = episodes[uid].row
+            changes[row] = min(changes.get(row, int(old_end + 1)), int(old_end + 1))
+        member_rows = {}
+        for uid in members:
+            if uid >= first_new_uid: continue
+            member_rows.setdefault(episodes[uid].row, []).append(episodes[uid])
+
+        rows = [row for row, series in self.__rows.items() if any(s.episodes for s in series)]
+        obj_pair_combs = set([])
+        for r in range(params["min_rows"], params["max_rows"]+1):
+            for row in set(changes) | set(member_rows):
+                others = [other for other in rows if other != row]
+                for comb in combinations(others, r-1):
+                    obj_pair_combs.add(tuple(sorted((row,) + comb)))
+
+        updated = set([])
+        for obj_pair_comb in sorted(obj_pair_combs):
+            self.__update_combination(obj_pair_comb, changes, member_rows, updated)
+
+        # The selections of the extended episodes whose graphlet or timepoint changed
+        for uid in extended:
+            for key in list(self.__selections_of.get(uid, ())):
+                if key in updated: continue
+                updated.add(key)
+                graph, h, timepoint = self.__get_graphlet(key[1])
+                old_h, old_timepoint = self.__selections[key]
+                if (h, timepoint) == (old_h, old_timepoint): continue
+                self.__selections[key] = (h, timepoint)
+                self.__count(old_h, None, old_timepoint, -1)
+                self.__count(h, graph, timepoint, 1)
+
+    def __update_combination(self, obj_pair_comb, changes, member_rows, updated):
+        """Updates the temporal chords of a combination of rows, and the selections of the windows of chords that
+        changed.
+
+        :param obj_pair_comb: the combination of rows
+        :type obj_pair_comb: tuple
+        :param changes: the first frame of each row from which its temporal chords changed
+        :type changes: dict
+        :param member_rows: the episodes of each row whose membership of the start or end set changed
+        :type member_rows: dict
+        :param updated: the keys of the selections which were added, which is updated
+        :type updated: set
+        """
+        max_eps = self.__params["max_eps"]
+        try:
+            chords, chord_starts, chord_ends, results, counts = self.__combinations[obj_pair_comb]
+            first_change = min([changes[row] for row in obj_pair_comb if row in changes] or [None])
+        except KeyError:
+            chords, chord_starts, chord_ends, results, counts = [], [], [], [], {}
+            first_change = -sys.maxint
+
+        if first_change is None:
+            new_chords, new_starts, new_ends = chords, chord_starts, chord_ends
+            bound = len(chords)
+        else:
+            # The chords which end before the frame preceding the first change are kept, and the others are
+            # computed again from the start of the first chord that is not kept
+            keep = bisect_left(chord_ends, first_change - 1)
+            restart = min(chords[keep][0], first_change) if keep < len(chords) else first_change
+            eps = []
+            for row in obj_pair_comb:
+                for series in self.__rows[row]:
+                    for ep in series.episodes[bisect_left(series.ends, restart - 1):]:
+                        if int(ep.end + 1) > restart:
+                            eps.append((max(ep.start, restart), ep.end, ep.uid))
+            tail = utils.get_temporal_chords_from_episodes(eps)
+            new_chords = chords[:keep] + tail
+            new_starts = chord_starts[:keep] + [chord[0] for chord in tail]
+            new_ends = chord_ends[:keep] + [chord[1] for chord in tail]
+            same = keep
+            while same < min(len(chords), len(new_chords)) and chords[same] == new_chords[same]:
+                same += 1
+            # The windows which start from here hold a chord that changed
+            bound = max(0, same - max_eps + 1)
+
+        positions = set(xrange(bound, len(new_chords)))
+        for row in obj_pair_comb:
+            for ep in member_rows.get(row, ()):
+                first = bisect_left(new_ends, int(ep.start))
+                last = bisect_right(new_starts, int(ep.end + 1) - 1)
+                positions.update(xrange(max(0, first - max_eps + 1), min(last, bound)))
+
+        delta = {}
+        for pos in chain([p for p in positions if p < bound], xrange(bound, len(results))):
+            for ids in results[pos]:
+                delta[ids] = delta.get(ids, 0) - 1
+        del results[bound:]
+        results.extend([None] * (len(new_chords) - bound))
+        for pos in positions:
+            results[pos] = self.__get_window_selections(new_chords, pos)
+            for ids in results[pos]:
+                delta[ids] = delta.get(ids, 0) + 1
+        self.__combinations[obj_pair_comb] = (new_chords, new_starts, new_ends, results, counts)
+
+        # Each set of episodes is selected once for the combination of rows, however many windows hold it
+        for ids, d in delta.items():
+            if d == 0: continue
+            count = counts.get(ids, 0)
+            if count + d:
+                counts[ids] = count + d
+            else:
+                del counts[ids]
+            key = (obj_pair_comb, ids)
+            if count == 0:
+                self.__add_selection(key)
+                updated.add(key)
+            elif count + d == 0:
+                self.__remove_selection(key)
+
+    def __get_window_selections(self, chords, pos):
+        """Returns the sets of episodes selected by the windows of consecutive chords which start at a position,
+        see `qstag.get_graphlet_selections`.
+
+        :param chords: the temporal chords
+        :type chords: list
+        :param pos: the position of the first chord of the windows
+        :type pos: int
+        :return: the sets of uids of the episodes
+        :rtype: list
+        """
+        max_eps = self.__params["max_eps"]
+        ret = []
+        selected_ids_set = set([])
+        for epi in chords[pos:pos+max_eps]:
+            selected_ids_set.update(epi[2])
+            if len(selected_ids_set) > max_eps:
+                break
+            if len(selected_ids_set & self.__start_set) > 1 or len(selected_ids_set & self.__end_set) > 1:
+                break
+            ids = frozenset(selected_ids_set)
+            if ids not in ret:
+                ret.append(ids)
+        return ret
+
+    def __get_graphlet(self, ids):
+        """Returns the graphlet of a set of episodes, its hash and its timepoint, see `qstag.get_graphlet`.
+
+        :param ids: the uids of the episodes
+        :type ids: frozenset
+        :rtype: tuple
+        """
+        eps = sorted([self.__episodes[uid] for uid in ids], key=attrgetter("key"))
+        return get_graphlet([ep.to_tuple() for ep in eps], self.__object_types, self.__graphs, self.__graph_hash,
+                            vis=self.__vis)
+
+    def __add_selection(self, key):
+        """Adds the graphlet of a selection to the histogram.
+
+        :param key: the combination of rows and the uids of the episodes of the selection
+        :type key: tuple
+        """
+        graph, h, timepoint = self.__get_graphlet(key[1])
+        self.__selections[key] = (h, timepoint)
+        for uid in key[1]:
+            self.__selections_of.setdefault(uid, set([])).add(key)
+        self.__count(h, graph, timepoint, 1)
+
+    def __remove_selection(self, key):
+        """Removes the graphlet of a selection from the histogram.
+
+        :param key: the combination of rows and the uids of the episodes of the selection
+        :type key: tuple
+        """
+        h, timepoint = self.__selections.pop(key)
+        for uid in key[1]:
+            self.__selections_of[uid].discard(key)
+        self.__count(h, None, timepoint, -1)
+
+    def __count(self, h, graph, timepoint, n):
+        """Adds to the count of a graphlet hash and of one of its timepoints.
+
+        :param h: the graphlet hash
+        :type h: str
+        :param graph: the graphlet, if it is added
+        :type graph: igraph.Graph
+        :param timepoint: the (start, end) frames of the selection
+        :type timepoint: tuple
+        :param n: the number added, or removed if negative
+        :type n: int
+        """
+        timepoints = self.__timepoints.setdefault(h, {})
+        if timepoints.get(timepoint, 0) + n:
+            timepoints[timepoint] = timepoints.get(timepoint, 0) + n
+        else:
+            del timepoints[timepoint]
+        if self.__histogram.get(h, 0) + n:
+            self.__histogram[h] = self.__histogram.get(h, 0) + n
+            self.__graphlets.setdefault(h, graph)
+        else:
+            del self.__histogram[h], self.__graphlets[h], self.__timepoints[h]
+
+
+def _get_temporal_edges(ep1, ep2, vertex, rel):
+    """Returns the edges between the spatial nodes of two episodes and their temporal node, see `qstag.get_graph`.
+
+    :param ep1: the first episode, in episode order
+    :type ep1: _Episode
+    :param ep2: the second episode
+    :type ep2: _Episode
+    :param vertex: the temporal node
+    :type vertex: int
+    :param rel: the Allen relation between the episodes
+    :type rel: str
+    :return: the two edges
+    :rtype: list
+    """
+    if rel in temporal_map:
+        # If an inverse temporal relation has been used, switch the edges around
+        return [(vertex, ep1.vertex), (ep2.vertex, vertex)]
+    return [(ep1.vertex, vertex), (vertex, ep2.vertex)]
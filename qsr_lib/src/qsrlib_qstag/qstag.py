@@ -5,11 +5,32 @@
 """
 from __future__ import print_function
 import sys
+import random
+import multiprocessing
+from collections import OrderedDict
 from igraph import Graph as iGraph
 from itertools import combinations, chain
+import numpy as np
 import qsrlib_qstag.utils as utils
 import pdb;
 
+temporal_map = {'>': '<',
+                'mi' : 'm',
+                'oi': 'o',
+                'si': 's',
+                'di':'d',
+                'fi': 'f'
+                }
+"""dict: The inverse Allen relations, which are replaced by their relation with the edges reversed."""
+
+spatial_nodes_edges = {"rcc2": 2, "rcc3": 2, "rcc8": 2, "cardir": 2,
+            "qtcbs": 2, "qtccs": 2, "qtcbcs": 2, "argd": 2, "argprobd": 2, "mos": 1,
+            "tpcc": 2, "rcc4": 2, "rcc5": 2}
+"""dict: The number of object edges of the spatial nodes of each QSR."""
+
+_graphlets_worker_state = {}
+"""dict: The episodes, parameters and caches of a graphlets worker process, set once when the worker starts."""
+
 class Activity_Graph:
     """
     Activity Graph class:
@@ -35,7 +56,8 @@ class Activity_Graph:
         self.__object_types = self.get_objects_types(object_types, world)
         """dict: A dictionary of object names and types."""
 
-        self.graph, self.__spatial_obj_edges, self.__temp_spatial_edges = get_graph(self.__episodes, self.__object_types, vis=vis)
+        self.graph, self.__spatial_obj_edges, self.__temp_spatial_edges = get_graph(self.__episodes, self.__object_types, vis=vis,
+                                                                                    temporal_horizon=params.get("temporal_horizon"))
         """igraph.Graph: An igraph graph object containing all the object, spatial and temporal nodes.
         list: A list of edges connecting the spatial nodes to the object nodes.
         list: A list of edges connecting the spatial nodes to the temporal nodes."""
@@ -167,21 +189,40 @@ class Activity_Graph:
         return abstract_graph
 
 
+    def get_temporal_relation(self, ep1, ep2):
+        """Returns the Allen relation between two episodes, whether or not the graph has a temporal node for them,
+        i.e. also for the episodes which are further apart than the "temporal_horizon" parameter.
+
+        :param ep1: index of the first episode in `self.episodes`
+        :type ep1: int
+        :param ep2: index of the second episode in `self.episodes`
+        :type ep2: int
+        :return: the Allen relation, from the first episode to the second one
+        :rtype: str
+        """
+        episodes = self.episodes
+        return utils.get_allen_relation(episodes[ep1][2], episodes[ep2][2])
+
     @staticmethod
-    def get_objects_types(objects_types, world):
+    def get_objects_types(objects_types, world, timestamps=None):
         """Generates a dictionary of object name and object type pairs
         Using both the dynamic_args dictionary where key = `objects_types`, and the
         **kwargs value [object_type] in the World Trace object
 
         :param objects_types: Uses the dynamic_args dictionary  where key = `objects_types` if provided
         :type objects_types: dictionary
-        :param world: Otherwise, looks at the **kwargs value [object_type] in the World Trace object
+        :param world: Otherwise, looks at the **kwargs value [object_type] in the World Trace object,
+            in the first world state where the object is found
         :type world: :class:`World_Trace <qsrlib_io.world_trace>`
+        :param timestamps: the timestamps of the world states to look at, in increasing order, all of them if None
+        :type timestamps: list
         :return: A dictionary with the object name as keys and the generic object type as value.
         :rtype: dict
         """
-        for t, state in world.trace.items():
-            for oname, odata in state.objects.items():
+        if timestamps is None:
+            timestamps = world.get_sorted_timestamps()
+        for t in timestamps:
+            for oname, odata in world.trace[t].objects.items():
                 if oname not in objects_types:
                     try:
                         objects_types[oname] = odata.kwargs["object_type"]
@@ -195,7 +236,7 @@ class Graphlets:
     Minimal subgraphs of the same structure as the Activity Graph.
     '''
 
-    def __init__(self, episodes, params, object_types, vis=False):
+    def __init__(self, episodes, params, object_types, vis=False, selections=None):
         """Constructor.
 
         :param episodes: list of QSR episodes, each a tuple of the form: ([objects], {epi_rel}, (epi_start, epi_end))
@@ -204,13 +245,18 @@ class Graphlets:
         :type params: dict
         :param object_types: dictionary of object name to a generic object type. Default is set to "unknown" type
         :type object_types: dict
+        :param selections: the graphlets, hashes and graphlet timepoints of the episodes, as returned by
+            get_graphlet_selections, if they are already known
+        :type selections: tuple
         """
         try:
             max_eps = params["max_eps"]
         except KeyError:
             params = {"min_rows":1, "max_rows":1, "max_eps":3}
 
-        all_graphlets, hashes, graphlet_timepoints = get_graphlet_selections(episodes, params, object_types, vis=vis)
+        if selections is None:
+            selections = get_graphlet_selections(episodes, params, object_types, vis=vis)
+        all_graphlets, hashes, graphlet_timepoints = selections
         """lists: Two lists of all graphlets and hashes in Activity_Graph."""
 
         self.histogram = []
@@ -221,24 +267,163 @@ class Graphlets:
         """dict: dictionary of the graphlet hash as key, and the iGraph object as value."""
         self.graphlet_timepoints = graphlet_timepoints
 
+        index = {}
         for h, g in zip(hashes, all_graphlets):
-
-            if h not in self.code_book:
+            try:
+                self.histogram[index[h]] += 1
+            except KeyError:
+                index[h] = len(self.code_book)
                 self.code_book.append(h)
                 self.histogram.append(1)
                 self.graphlets[h] = g
-            else:
-                ind = self.code_book.index(h)
-                self.histogram[ind] += 1
+
+    def get_histogram(self, code_book=None):
+        """Returns the histogram as a dense vector.
+
+        :param code_book: a global code book to align the histogram with, instead of `self.code_book`
+        :type code_book: Graphlet_Codebook
+        :return: the count of each graphlet of the code book
+        :rtype: numpy.ndarray
+        """
+        if code_book is not None:
+            return code_book.get_histogram(self)
+        return np.array(self.histogram, dtype=int)
+
+
+class Graphlet_Codebook:
+    """
+    Graphlet Codebook class:
+    A code book of graphlet hashes shared by many Activity Graphs, e.g. to build bag of graphlets features
+    of many observations. Hashes are given an index in the order they are first seen, and are found in constant time.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self.code_book = []
+        """list: The list of graphlet hashes, in the order they were first added."""
+        self.graphlets = {}
+        """dict: dictionary of the graphlet hash as key, and the iGraph object as value."""
+        self.__index = {}
+        """dict: dictionary of the graphlet hash as key, and its index in the code book as value."""
+        self.__counts = []
+        """list: The total count of each graphlet of the code book over all the added Graphlets."""
+
+    def __len__(self):
+        return len(self.code_book)
+
+    def __contains__(self, h):
+        return h in self.__index
+
+    @property
+    def histogram(self):
+        """Getter.
+
+        :return: the total count of each graphlet of the code book over all the added Graphlets
+        :rtype: numpy.ndarray
+        """
+        return np.array(self.__counts, dtype=int)
+
+    def index(self, h):
+        """Returns the index of a graphlet hash in the code book.
+
+        :param h: graphlet hash
+        :type h: str
+        :return: index of the hash in `self.code_book`
+        :rtype: int
+        :raises KeyError: if the hash is not in the code book
+        """
+        return self.__index[h]
+
+    def add(self, h, graphlet=None):
+        """Adds a graphlet hash to the code book, if it is not in it already.
+
+        :param h: graphlet hash
+        :type h: str
+        :param graphlet: the graphlet of the hash
+        :type graphlet: igraph.Graph
+        :return: index of the hash in `self.code_book`
+        :rtype: int
+        """
+        try:
+            return self.__index[h]
+        except KeyError:
+            ind = self.__index[h] = len(self.code_book)
+            self.code_book.append(h)
+            self.__counts.append(0)
+            if graphlet is not None:
+                self.graphlets[h] = graphlet
+            return ind
+
+    def add_graphlets(self, graphlets):
+        """Adds the graphlets of an Activity Graph to the code book, and their counts to its histogram.
+
+        :param graphlets: the Graphlets of an Activity Graph, i.e. `Activity_Graph.graphlets`
+        :type graphlets: Graphlets
+        :return: the histogram of the graphlets, aligned with the code book
+        :rtype: numpy.ndarray
+        """
+        for h, count in zip(graphlets.code_book, graphlets.histogram):
+            self.__counts[self.add(h, graphlets.graphlets.get(h))] += count
+        return self.get_histogram(graphlets)
+
+    def get_histogram(self, graphlets):
+        """Returns the histogram of the graphlets of an Activity Graph, aligned with the code book.
+        Graphlets that are not in the code book are not counted.
+
+        :param graphlets: the Graphlets of an Activity Graph
+        :type graphlets: Graphlets
+        :return: vector of the length of the code book with the count of each of its graphlets
+        :rtype: numpy.ndarray
+        """
+        ret = np.zeros(len(self.code_book), dtype=int)
+        for h, count in zip(graphlets.code_book, graphlets.histogram):
+            try:
+                ret[self.__index[h]] += count
+            except KeyError:
+                pass
+        return ret
+
+    def get_histograms(self, list_of_graphlets):
+        """Returns the histograms of the graphlets of many Activity Graphs, aligned with the code book.
+
+        :param list_of_graphlets: the Graphlets of the Activity Graphs
+        :type list_of_graphlets: list
+        :return: array with a row for each Activity Graph, and a column for each graphlet of the code book
+        :rtype: numpy.ndarray
+        """
+        ret = np.zeros((len(list_of_graphlets), len(self.code_book)), dtype=int)
+        for row, graphlets in enumerate(list_of_graphlets):
+            for h, count in zip(graphlets.code_book, graphlets.histogram):
+                try:
+                    ret[row, self.__index[h]] += count
+                except KeyError:
+                    pass
+        return ret
 
 
 def get_graphlet_selections(episodes, params, object_types, vis=False):
     """ This function implements Sridar's validity criteria to select all valid
     graphlets from an activity graph: see Sridar_AAAI_2010 for more details.
 
+    The temporal chords of a combination of object rows are computed from those of the same combination
+    without its last row, each set of episodes is only selected once per combination of rows, and sets of
+    episodes with the same objects, spatial and temporal relations are only turned into a graph and hashed once.
+
+    The cost can be bounded with the optional parameters "max_row_combinations", the maximum number of
+    combinations of object rows searched for each number of rows, and "max_graphlets", the maximum number of
+    graphlets returned. When there are more, a uniform random sample is kept, drawn with the "seed" parameter
+    (default 0) so that it is the same in every run.
+
+    With the optional parameter "processes" greater than 1, the sets of episodes of the combinations of rows are
+    selected, and their graphlets built and hashed, by a pool of worker processes over chunks of the combinations
+    and of the selected sets. The results are merged in the order of the serial computation and the sample is drawn
+    in the parent process, so they do not depend on the number of processes.
+
     :param episodes: list of episodes, where one episode = [[obj_list], {QSR dict}, (start, end_tuple)]
     :type episodes: list
-    :param params: a dictionary containing parameters for the generation of the QSTAG. i.e.  "min_rows", "max_rows", "max_eps"
+    :param params: a dictionary containing parameters for the generation of the QSTAG. i.e.  "min_rows", "max_rows", "max_eps",
+        and optionally "graph_hash", the name of the graph hash function in `utils.graph_hash_functions` (default "shortest_paths"),
+        "max_row_combinations", "max_graphlets", "seed" and "processes" (default 1)
     :type params: dict
 
     :return list_of_graphlets: a list of iGraph graphlet objects
@@ -246,11 +431,19 @@ def get_graphlet_selections(episodes, params, object_types, vis=False):
     :return list_of_graphlet_hashes: a list of hashes, relating to the graphlets
     :rtype: list
     """
+    try:
+        graph_hash = utils.graph_hash_functions[params.get("graph_hash", "shortest_paths")]
+    except KeyError:
+        raise ValueError("graph_hash must be one of: %s" % ", ".join(sorted(utils.graph_hash_functions)))
+    max_row_combinations = params.get("max_row_combinations")
+    max_graphlets = params.get("max_graphlets")
+    rng = random.Random(params.get("seed", 0))
+
     # vis=True
     if vis: print("num of episodes:", len(episodes))
     if vis: print("all episodes: ", episodes)
     episode_ids = {}
-    intervals = {}
+    intervals = OrderedDict()
 
     # Gather the episodes and interval data
     # Use ID codes for the episodes throughout the function
@@ -284,152 +477,356 @@ def get_graphlet_selections(episodes, params, object_types, vis=False):
     episodes_which_start, episodes_which_end = set([]), set([])
     for obs, data in intervals.items():
         for (ep_start, ep_end, ep_id) in data:
-            if ep_start is observation_start:
+            if ep_start == observation_start:
                 episodes_which_start.add(ep_id)
-            if ep_end is observation_end:
+            if ep_end == observation_end:
                 episodes_which_end.add(ep_id)
     if vis: print("ep IDs which start: ", episodes_which_start)
     if vis: print("ep IDs which end: ", episodes_which_end)
 
-    hashed_IDs = {}
-    range_of_rows = range(params["min_rows"], params["max_rows"]+1)
-    for r in range_of_rows:
-        # Once we select the number of rows, find all combinations of rows of r.
-        for obj_pair_comb in combinations(intervals.keys(), r):
-            if vis: print("\nobject_rows: ", obj_pair_comb)
-
-            # Collect intervals from episodes of relevant rows
-            relevant_episodes=[]
-            for obj_pair in obj_pair_comb:
-                relevant_episodes.extend(intervals[obj_pair])
-
-            if vis: print("relevant_episodes", relevant_episodes)
-
-            if relevant_episodes != []:
-                interval_breaks = utils.get_temporal_chords_from_episodes(relevant_episodes)
+    processes = params.get("processes", 1)
+    if not isinstance(processes, int) or processes < 1:
+        raise ValueError("processes must be a positive integer")
+    pool = None
+    if processes > 1 and not vis:
+        pool = multiprocessing.Pool(processes, initializer=_init_graphlets_worker,
+                                    initargs=(episodes, intervals, episodes_which_start, episodes_which_end,
+                                              params, object_types, graph_hash))
+    try:
+        # Temporal chords of the combinations of rows, kept for the combinations that can be extended by another row.
+        chords = {}
+
+        # The selected sets of episode IDs, for each combination of rows, in the order they are found.
+        # Only a sample of them is kept if there are more than max_graphlets.
+        selections = []
+        num_of_selections = 0
+        range_of_rows = range(params["min_rows"], params["max_rows"]+1)
+        for r in range_of_rows:
+            # Once we select the number of rows, find all combinations of rows of r.
+            obj_pair_combs = _get_combinations(intervals.keys(), r, max_row_combinations, rng)
+            if pool is not None:
+                obj_pair_combs = list(obj_pair_combs)
+                selected_of_combs = chain.from_iterable(pool.map(_select_in_worker,
+                                                                 _get_chunks(obj_pair_combs, processes),
+                                                                 chunksize=1))
             else:
-                #Covers the case where no episodes are added. i.e. episodes that do not start at frame 1.
-                interval_breaks = []
-            if vis: print("interval_breaks: ", interval_breaks)
-
-            num_of_interval_breaks = len(interval_breaks)
-            if vis: print('num of intervals:', num_of_interval_breaks)
-
-            # Loop through this broken timeline and find all
-            # combinations (r is from 1 to num_of_intervals)
-            # of consecutive intervals (intervals in a stretch).
-
-            #compute combinations of the intervales, upto some length:
-            num_of_combinations = min(params["max_eps"], num_of_interval_breaks)
-            if vis: print("num of combinations: min(%s, %s): %s" % (params["max_eps"], num_of_interval_breaks, num_of_combinations) )
-
-            hashed_IDs[obj_pair_comb] = {}
-            # only search for combinations of length upto the parameter maximum.
-            for len_ in xrange(1, num_of_combinations+1):
-            # for len_ in xrange(3, num_of_combinations+1):              # Uncomment to only get larger subgraph words
-                if vis: print(" len_=",len_)
-
-                # for pos in xrange( (num_of_interval_breaks - len_)):     # Uncomment to only get larger subgraph words
-                for pos in xrange( (num_of_interval_breaks)):
-                    # Find the combined interval of this combination of intervals
-                    selected_intervals = interval_breaks[pos:pos+len_]
-                    # Get the relations active in this active interval
-                    selected_ids = [epi[2] for epi in selected_intervals]
-                    # Some episodes are repeated as they are active in two or more intervals. So remove the duplicates .
-                    selected_ids_set = set(chain.from_iterable(selected_ids))
-
-                    ##IF selected_ids_set IS TOO LARGE - DON'T BOTHER HASHING IT.
-                    #Only allow Graphlets of the specified number of Rows. Not all rows.
-                    if len(selected_ids_set) <= params["max_eps"]:
-                        # If theselection has more than 1 episode in the start or end set, then do not create a sub-graph from this.
-                        if len(selected_ids_set.intersection(episodes_which_start)) > 1 or len(selected_ids_set.intersection(episodes_which_end)) > 1:
-                            if vis: print(" ignore: %s" % selected_ids_set)
-                            continue
-                        else:
-                            selected_ids_set = tuple(selected_ids_set)
-                            if vis: print(" selected IDs:", selected_ids_set)
-                            if hash(selected_ids_set) not in hashed_IDs[obj_pair_comb]:
-                                hashed_IDs[obj_pair_comb][hash(selected_ids_set)] = selected_ids_set
-                    #print("pos=",pos)
-                    #print("selected_intervals", selected_intervals)
-                    #print("selected_ids", selected_ids)
-                    #print("eps:", selected_ids_set)
-    if vis: print("\nepisode keys:", hashed_IDs.keys())
-    if vis: print("\nepisode combinations:", hashed_IDs)
+                selected_of_combs = (_select_episodes(_get_chords(obj_pair_comb, intervals, chords, params["max_rows"]),
+                                                      params["max_eps"], episodes_which_start, episodes_which_end,
+                                                      vis=vis)
+                                     for obj_pair_comb in obj_pair_combs)
+
+            for selected in selected_of_combs:
+                for ids in selected:
+                    # Reservoir sampling of the selections, if they are capped.
+                    if max_graphlets is None or len(selections) < max_graphlets:
+                        selections.append((num_of_selections, ids))
+                    else:
+                        i = rng.randint(0, num_of_selections)
+                        if i < max_graphlets:
+                            selections[i] = (num_of_selections, ids)
+                    num_of_selections += 1
+        if vis: print("\nepisode combinations:", selections)
+
+        selections = [id_codes for _, id_codes in sorted(selections, key=lambda x: x[0])]
+        if pool is not None:
+            # The workers send each graph once per chunk, with the first selection of its hash; the first graph of
+            # each hash, in the order of the selections, is kept for all of them.
+            graphlets = chain.from_iterable(pool.map(_get_graphlets_in_worker, _get_chunks(selections, processes),
+                                                     chunksize=1))
+            pool.close()
+    except BaseException:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.join()
 
     # Replace the ID codes with the episodes
-    #episodes_selection = {}
     list_of_graphlets = []
     list_of_graphlet_hashes = []
     graphlet_timepoints = {}
+    graphs = {}
 
-    for cnt, (objs, IDs) in enumerate(hashed_IDs.items()):
-        #episodes_selection[objs] = []
-        st, end = 10000, 0
-
-        for hash_, id_codes in IDs.items():
-            eps = [episode_ids[epi_code] for epi_code in id_codes]
-
-            ## If Object Types exist for an object, use it in the graphlet.
-                #Replace the objects with object types - will remain the same if no types entered
-            eps = [ (tuple([object_types[ob] if object_types[ob] != "unknown" else ob for ob in e[0]]),
-                      e[1], e[2]) for e in eps ]
-
-            for e in eps:
-                if e[2][0] < st: st = e[2][0]
-                if e[2][1] > end: end = e[2][1]
-
-            # Remove graphlets that have only one spatial relation - i.e. no temporal relation
-            #if len(eps) <= 1: continue
-            if len(eps) <= params["max_eps"]:
-                #episodes_selection[objs].append(eps)
-                graph, spatial_obj_edges, temp_spatial_edges = get_graph(eps, vis=vis)
-                list_of_graphlets.append(graph)
-                h = utils.graph_hash(graph)
-                list_of_graphlet_hashes.append(h)
-                try:
-                    graphlet_timepoints[h].append( (st,end) )
-                except:
-                    graphlet_timepoints[h] = [(st,end) ]
+    if pool is None:
+        graphlets = (get_graphlet([episode_ids[epi_code] for epi_code in sorted(id_codes)], object_types, graphs,
+                                  graph_hash, vis=vis) for id_codes in selections)
+
+    first_graphs = {}
+    for graph, h, (st, end) in graphlets:
+        if pool is not None:
+            graph = first_graphs.setdefault(h, graph)
+
+        list_of_graphlets.append(graph)
+        list_of_graphlet_hashes.append(h)
+        try:
+            graphlet_timepoints[h].append( (st,end) )
+        except KeyError:
+            graphlet_timepoints[h] = [(st,end) ]
 
-                if vis:
-                    print("\nEPS= ", eps)
-                    print(graph)
-                    print("HASH:", h)
-                    print("start and end: ", st, end)
+        if vis:
+            print(graph)
+            print("HASH:", h)
+            print("start and end: ", st, end)
 
     if vis: print(graphlet_timepoints)
     return list_of_graphlets, list_of_graphlet_hashes, graphlet_timepoints
 
 
-def get_graph(episodes, object_types={}, vis=False):
+def get_graphlet(eps, object_types, graphs, graph_hash, vis=False):
+    """Returns the graphlet of a selection of episodes, its hash, and the interval of frames it spans.
+
+    The graph only depends on the objects and relations of the episodes and on their temporal relations,
+    so sets of episodes which share them are only turned into a graph and hashed once.
+
+    :param eps: the selected episodes, in the order of the Activity Graph episodes
+    :type eps: list
+    :param object_types: dictionary of object name to a generic object type
+    :type object_types: dict
+    :param graphs: cache of the graphs and hashes already computed, which is updated
+    :type graphs: dict
+    :param graph_hash: the graph hash function, one of `utils.graph_hash_functions`
+    :type graph_hash: function
+    :return: the iGraph graphlet, its hash and its (start, end) frames
+    :rtype: tuple
+    """
+    st = min(e[2][0] for e in eps)
+    end = max(e[2][1] for e in eps)
+
+    ## If Object Types exist for an object, use it in the graphlet.
+        #Replace the objects with object types - will remain the same if no types entered
+    eps = [ (tuple([object_types[ob] if object_types[ob] != "unknown" else ob for ob in e[0]]),
+              e[1], e[2]) for e in eps ]
+
+    key = (tuple([(e[0], tuple(sorted(e[1].items()))) for e in eps]),
+           tuple([utils.get_allen_relation(e1[2], e2[2]) for e1, e2 in combinations(eps, 2)]))
+    try:
+        graph, h = graphs[key]
+    except KeyError:
+        graph, spatial_obj_edges, temp_spatial_edges = get_graph(eps, vis=vis)
+        h = graph_hash(graph)
+        graphs[key] = (graph, h)
+    return graph, h, (st, end)
+
+
+def _get_combinations(items, r, max_combinations=None, rng=random):
+    """Returns the combinations of r items, or a uniform random sample of them.
+
+    :param items: the items
+    :type items: list
+    :param r: the number of items in a combination
+    :type r: int
+    :param max_combinations: the maximum number of combinations returned, all of them if None
+    :type max_combinations: int
+    :param rng: random number generator used to draw the sample
+    :type rng: random.Random
+    :return: the combinations, in the order of `itertools.combinations`
+    :rtype: list
+    """
+    n = len(items)
+    if r > n:
+        return []
+    total = 1
+    for i in xrange(r):
+        total = total * (n - i) // (i + 1)
+    if max_combinations is None or total <= max_combinations:
+        return combinations(items, r)
+    if 2 * max_combinations > total:
+        return [c for _, c in sorted(rng.sample(list(enumerate(combinations(items, r))), max_combinations))]
+    # Few combinations out of many: draw them directly
+    sample = set([])
+    while len(sample) < max_combinations:
+        sample.add(tuple(sorted(rng.sample(xrange(n), r))))
+    return [tuple(items[i] for i in c) for c in sorted(sample)]
+
+
+def _get_chords(obj_pair_comb, intervals, chords, max_rows):
+    """Returns the temporal chords of a combination of object rows, computed from those of the same combination
+    without its last row.
+
+    :param obj_pair_comb: the combination of object rows
+    :type obj_pair_comb: tuple
+    :param intervals: the [start, end, episode ID] of the episodes of each object row
+    :type intervals: dict
+    :param chords: cache of the chords of the combinations that can be extended by another row, which is updated
+    :type chords: dict
+    :param max_rows: the maximum number of rows of a combination
+    :type max_rows: int
+    :return: the temporal chords, as returned by `utils.get_temporal_chords_from_episodes`
+    :rtype: list
+    """
+    try:
+        return chords[obj_pair_comb]
+    except KeyError:
+        pass
+    if len(obj_pair_comb) == 1:
+        ret = utils.get_temporal_chords_from_episodes(intervals[obj_pair_comb[0]])
+    else:
+        ret = utils.overlay_temporal_chords(_get_chords(obj_pair_comb[:-1], intervals, chords, max_rows),
+                                           _get_chords(obj_pair_comb[-1:], intervals, chords, max_rows))
+    if len(obj_pair_comb) < max_rows:
+        chords[obj_pair_comb] = ret
+    return ret
+
+
+def _select_episodes(interval_breaks, max_eps, episodes_which_start, episodes_which_end, vis=False):
+    """Returns the valid sets of episode IDs of a combination of object rows, in the order they are found.
+
+    :param interval_breaks: the temporal chords of the combination of rows
+    :type interval_breaks: list
+    :param max_eps: the maximum number of episodes in a set
+    :type max_eps: int
+    :param episodes_which_start: IDs of the episodes which start with the observation
+    :type episodes_which_start: set
+    :param episodes_which_end: IDs of the episodes which end with the observation
+    :type episodes_which_end: set
+    :return: the sets of episode IDs, each selected once
+    :rtype: list of frozenset
+    """
+    if vis: print("interval_breaks: ", interval_breaks)
+    if vis: print('num of intervals:', len(interval_breaks))
+
+    # Loop through this broken timeline and find all
+    # combinations (r is from 1 to num_of_intervals)
+    # of consecutive intervals (intervals in a stretch).
+    # Only search for combinations of length upto the parameter maximum.
+    ret = []
+    selected = set([])
+    for pos in xrange(len(interval_breaks)):
+        selected_ids_set = set([])
+        for epi in interval_breaks[pos:pos+max_eps]:
+            # Some episodes are repeated as they are active in two or more intervals. So remove the duplicates .
+            selected_ids_set.update(epi[2])
+
+            ##IF selected_ids_set IS TOO LARGE - DON'T BOTHER HASHING IT.
+            # Longer stretches from the same position only contain more episodes, so stop there.
+            if len(selected_ids_set) > max_eps:
+                break
+            # If theselection has more than 1 episode in the start or end set, then do not create a sub-graph from this.
+            if len(selected_ids_set.intersection(episodes_which_start)) > 1 or len(selected_ids_set.intersection(episodes_which_end)) > 1:
+                if vis: print(" ignore: %s" % selected_ids_set)
+                break
+
+            ids = frozenset(selected_ids_set)
+            if ids in selected: continue
+            selected.add(ids)
+            ret.append(ids)
+            if vis: print(" selected IDs:", ids)
+    return ret
+
+
+def _get_chunks(items, processes):
+    """Splits a list in consecutive chunks, a few for each worker process so that their load is balanced.
+
+    :param items: the items
+    :type items: list
+    :param processes: the number of worker processes
+    :type processes: int
+    :return: the chunks, in order
+    :rtype: list of list
+    """
+    chunk_size = max(-(-len(items) // (4 * processes)), 1)
+    return [items[i:i+chunk_size] for i in xrange(0, len(items), chunk_size)]
+
+
+def _init_graphlets_worker(episodes, intervals, episodes_which_start, episodes_which_end, params, object_types,
+                           graph_hash):
+    """Keep the episodes and parameters shared by all the tasks of a graphlets worker process.
+
+    :param episodes: list of episodes
+    :type episodes: list
+    :param intervals: the [start, end, episode ID] of the episodes of each object row
+    :type intervals: dict
+    :param episodes_which_start: IDs of the episodes which start with the observation
+    :type episodes_which_start: set
+    :param episodes_which_end: IDs of the episodes which end with the observation
+    :type episodes_which_end: set
+    :param params: the QSTAG parameters
+    :type params: dict
+    :param object_types: dictionary of object name to a generic object type
+    :type object_types: dict
+    :param graph_hash: the graph hash function
+    :type graph_hash: function
+    """
+    _graphlets_worker_state["episodes"] = episodes
+    _graphlets_worker_state["intervals"] = intervals
+    _graphlets_worker_state["episodes_which_start"] = episodes_which_start
+    _graphlets_worker_state["episodes_which_end"] = episodes_which_end
+    _graphlets_worker_state["params"] = params
+    _graphlets_worker_state["object_types"] = object_types
+    _graphlets_worker_state["graph_hash"] = graph_hash
+    _graphlets_worker_state["chords"] = {}
+    _graphlets_worker_state["graphs"] = {}
+
+
+def _select_in_worker(obj_pair_combs):
+    """Selects the valid sets of episode IDs of a chunk of combinations of object rows, in a worker process.
+
+    :param obj_pair_combs: the combinations of object rows
+    :type obj_pair_combs: list
+    :return: the sets of episode IDs of each combination, as returned by `_select_episodes`
+    :rtype: list
+    """
+    state = _graphlets_worker_state
+    max_rows, max_eps = state["params"]["max_rows"], state["params"]["max_eps"]
+    return [_select_episodes(_get_chords(obj_pair_comb, state["intervals"], state["chords"], max_rows), max_eps,
+                             state["episodes_which_start"], state["episodes_which_end"])
+            for obj_pair_comb in obj_pair_combs]
+
+
+def _get_graphlets_in_worker(selections):
+    """Builds and hashes the graphlets of a chunk of sets of episode IDs, in a worker process.
+
+    Only the first graphlet of each hash in the chunk is sent back, the others are None.
+
+    :param selections: the sets of episode IDs
+    :type selections: list
+    :return: the graphlet, or None, the hash and the (start, end) frames of each set
+    :rtype: list of tuple
+    """
+    state = _graphlets_worker_state
+    episodes = state["episodes"]
+    ret = []
+    sent = set([])
+    for id_codes in selections:
+        graph, h, timepoints = get_graphlet([episodes[epi_code] for epi_code in sorted(id_codes)],
+                                            state["object_types"], state["graphs"], state["graph_hash"])
+        if h in sent:
+            graph = None
+        sent.add(h)
+        ret.append((graph, h, timepoints))
+    return ret
+
+
+def get_graph(episodes, object_types={}, vis=False, temporal_horizon=None):
     """Generates a graph from a set of input episode QSRs.
 
+    The vertices, their attributes and the edges are gathered in lists first, and the graph is built with a single
+    call to `add_vertices` and one to `add_edges`, as adding them one at a time copies the graph each time.
+    The vertices are numbered in the same order: the object and spatial nodes in the order of the episodes, then
+    the temporal nodes in the order of the pairs of episodes.
+
+    By default there is a temporal node for every pair of episodes, i.e. E*(E-1)/2 of them for E episodes.
+    With a temporal_horizon, there are only temporal nodes between the episodes which overlap, meet, or have at
+    most temporal_horizon frames between them. The episodes of a series (objects and QSR) do not overlap, so an
+    episode of L frames is then paired with at most L+2*temporal_horizon+2 episodes of each series, and the number of
+    temporal nodes grows linearly with the length of the observation instead of quadratically.
+
     :param episodes: list of episodes, where one episode = [[obj_list], {QSR dict}, (start, end_tuple)]
     :type episodes: list
     :param object_types: a dictionary of object ID and object type.
     :type object_types: dict
+    :param temporal_horizon: the maximum number of frames between two episodes with a temporal node, all the pairs
+        of episodes have one if None
+    :type temporal_horizon: int
 
     :return: igraph.Graph: An igraph graph object containing all the object, spatial and temporal nodes.
     :rtype: igraph.Graph
     """
-
-    temporal_map = {'>': '<',
-                    'mi' : 'm',
-                    'oi': 'o',
-                    'si': 's',
-                    'di':'d',
-                    'fi': 'f'
-                    }
-
-    spatial_nodes_edges = {"rcc2": 2, "rcc3": 2, "rcc8": 2, "cardir": 2,
-                "qtcbs": 2, "qtccs": 2, "qtcbcs": 2, "argd": 2, "argprobd": 2, "mos": 1,
-                "tpcc": 2, "rcc4": 2, "rcc5": 2}
-
     objects = {}
     spatial_data = []
     spatial_obj_edges, temp_spatial_edges = [], []
-    vertex_count = 0
+    names, node_types, obj_types = [], [], {}
     graph = iGraph(directed=True)
 
     if episodes == []:
@@ -453,96 +850,69 @@ def get_graph(episodes, object_types={}, vis=False):
         for o in objs:
             if o in objects: continue
 
-            graph.add_vertex(o)
-            objects[o] = vertex_count
-
+            objects[o] = len(names)
             if o in object_types:
-                graph.vs()[vertex_count]['obj_type'] = object_types[o]
+                obj_types[len(names)] = object_types[o]
+            names.append(o)
+            node_types.append('object')
 
-            graph.vs()[vertex_count]['node_type'] = 'object'
-            vertex_count += 1
-
-        object_ids = []
-        for o in objs:
-            object_ids.append(objects[o])
-        #print("   OBJECT IDS ", object_ids)
+        object_ids = [objects[o] for o in objs]
         #############################################
         #   Spatial Nodes:                          #
         #############################################
-        graph.add_vertex(relations)
-        graph.vs()[vertex_count]['node_type'] = 'spatial_relation'
+        vertex_count = len(names)
+        names.append(relations)
+        node_types.append('spatial_relation')
 
         # Add edges from spatial node to objects
-        edge_from_object = objects[objs[0]]
-
-        #print("adding edge: : ", edge_from_object, vertex_count)
-        graph.add_edge(edge_from_object, vertex_count)
-        spatial_obj_edges.append((edge_from_object, vertex_count))
+        spatial_obj_edges.append((objects[objs[0]], vertex_count))
 
         if spatial_edges is 2:
-            #print("TWO OBJECTS -- ")
-            edge_to_object = objects[objs[1]]
-            graph.add_edge(vertex_count, edge_to_object)
-            spatial_obj_edges.append( (vertex_count, edge_to_object) )
+            spatial_obj_edges.append( (vertex_count, objects[objs[1]]) )
 
         elif spatial_edges is 3:
-            #print("THREE OBJECTS -- ")
-            edge_from_object_2 = objects[objs[1]]
-            edge_from_object_3  = objects[objs[2]]
-            graph.add_edge(edge_from_object_2, vertex_count)
-            graph.add_edge(edge_from_object_3, vertex_count)
-            spatial_obj_edges.append( (edge_from_object_2, vertex_count) )
-            spatial_obj_edges.append( (edge_from_object_3, vertex_count) )
+            spatial_obj_edges.append( (objects[objs[1]], vertex_count) )
+            spatial_obj_edges.append( (objects[objs[2]], vertex_count) )
 
         spatial_data.append( (object_ids, vertex_count,  (intv_start, intv_end)) )
-        vertex_count += 1
     if vis: print("spatial data:", spatial_data )
     #############################################
     #   Temporal Nodes:                         #
     #############################################
-    #print("data: \n", spatial_data)
-    #print("objects \n", objects)
 
     # # Es and Ef sets removed. Activity Graph now contains these relations.
     # # Graphlets are not created if they contain two or more nodes which would be in the Es or Ef sets.
-    # E_s, E_f = utils.get_E_set(objects, spatial_data)
-    # if vis: print("E_s: ", E_s)
-    # if vis: print("E_f: ", E_f)
 
-    temporal_vertices = {}
-    for epi1, epi2 in combinations(spatial_data, 2):
-
-        # don't create a temporal relation between two episodes in the start set, or two in the end set.
-        # if ( epi1 in E_s and epi2 in E_s) or ( epi1 in E_f and epi2 in E_f): continue   # # Removed condition
-        (objs1, rels1, frames1) = epi1
-        (objs2, rels2, frames2) = epi2
-
-        #print (epi1, epi2)
+    if temporal_horizon is None:
+        pairs = combinations(spatial_data, 2)
+    else:
+        pairs = [(spatial_data[i], spatial_data[j])
+                 for i, j in utils.get_temporal_pairs([frames for _, _, frames in spatial_data], temporal_horizon)]
+    for (objs1, rels1, frames1), (objs2, rels2, frames2) in pairs:
         temporal_rel = utils.get_allen_relation(frames1, frames2)
 
         # If temporal_rel is in temporal_map get its value otherwise keep it the same
         # If the edges are directed, then we need to change the direction of the edges
         # if we change change the temporal relation to its inverse
-        temporal_rel_new = temporal_map.get(temporal_rel, temporal_rel)
-        #print(temporal_rel_new)
-
-        # Add temporal node to the graph
-        graph.add_vertex(temporal_rel_new)
-        graph.vs()[vertex_count]['node_type'] = 'temporal_relation'
-        temporal_rel_vertex_id = vertex_count
-        temporal_vertices[temporal_rel_new] = vertex_count
-        vertex_count += 1
+        temporal_rel_vertex_id = len(names)
+        names.append(temporal_map.get(temporal_rel, temporal_rel))
+        node_types.append('temporal_relation')
 
-        if temporal_rel_new == temporal_rel:
+        if temporal_rel not in temporal_map:
             # Add edges from spatial node to temporal node
-            graph.add_edge(rels1, temporal_rel_vertex_id)
-            graph.add_edge(temporal_rel_vertex_id, rels2)
             temp_spatial_edges.append((rels1, temporal_rel_vertex_id))
             temp_spatial_edges.append((temporal_rel_vertex_id, rels2))
         else:
             # If an inverse temporal relation has been used, switch the edges around
-            graph.add_edge(temporal_rel_vertex_id, rels1)
-            graph.add_edge(rels2, temporal_rel_vertex_id)
             temp_spatial_edges.append((temporal_rel_vertex_id, rels1))
             temp_spatial_edges.append((rels2, temporal_rel_vertex_id))
+
+    graph.add_vertices(len(names))
+    graph.vs["name"] = names
+    graph.vs["node_type"] = node_types
+    if obj_types:
+        graph.vs["obj_type"] = [obj_types.get(vertex) for vertex in xrange(len(names))]
+
+    # The edges of each episode, then those of each pair of episodes
+    graph.add_edges(spatial_obj_edges + temp_spatial_edges)
     return graph, spatial_obj_edges, temp_spatial_edges
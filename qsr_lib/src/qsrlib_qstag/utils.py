@@ -5,6 +5,9 @@
 from __future__ import print_function
 from itertools import combinations, permutations
 import copy, sys
+from collections import OrderedDict
+from bisect import bisect_right
+import hashlib
 from igraph import Graph as iGraph
 import numpy as np
 import warnings
@@ -20,6 +23,10 @@ def compute_episodes(world_qsr, params):
 
 	FILTERS: if any of the qsr values == Ignore, the entire episode will be ignored.
 
+	The relations of each object pair (and each QSR, if split_qsrs) are coded as integers, and the
+	episodes are found by :func:`get_episodes_from_codes`. The episodes are ordered by QSR, as given by
+	:func:`get_series_qsrs`, then by the frame where their objects are first found, then by time.
+
 	Example content:
 	----------------
 	o1,mug,o2,hand,sur,3,7
@@ -47,13 +54,12 @@ def compute_episodes(world_qsr, params):
 	if len(frames)==0:
 		return episodes
 
-	# Create a world trace based on QSRs, then Objects, in order to compute episodes
-	obj_based_qsr_world = {}
-	if split_qsrs:
-		for q in world_qsr.qsr_type.split(","):
-			obj_based_qsr_world[q] = {}
-	else:
-		obj_based_qsr_world[world_qsr.qsr_type] = {}
+	# Create a world trace based on QSRs, then Objects, in order to compute episodes.
+	# The objects are added in the order they are first found when looping through the frames,
+	# so that the episodes are in the same order when the trace grows.
+	obj_based_qsr_world = OrderedDict()
+	for q in get_series_qsrs(world_qsr.qsr_type, split_qsrs):
+		obj_based_qsr_world[q] = OrderedDict()
 
 	"""remove the first frame which cannot contain a qtcb relation"""
 	if "qtcbs" in world_qsr.qsr_type:
@@ -64,72 +70,115 @@ def compute_episodes(world_qsr, params):
 		for objs, qsrs in world_qsr.trace[frame].qsrs.items():
 			my_qsrs = {}
 			for qsr_key, qsr_val in qsrs.qsr.items():
-				if qsr_key is "tpcc":
+				if qsr_key == "tpcc":
 					origin,relatum,datum = objs.split(',')
 					new_key=("%s-%s,%s") % (origin,relatum,datum)
-					try:
-						obj_based_qsr_world[qsr_key][new_key].append((frame, {"tpcc": qsrs.qsr["tpcc"]}))
-					except KeyError:
-						obj_based_qsr_world[qsr_key][new_key] = [(frame, {"tpcc": qsrs.qsr["tpcc"]})]
+					_add_to_series(obj_based_qsr_world[qsr_key], new_key, frame, qsr_val, {"tpcc": qsr_val})
 				else:
 					my_qsrs[qsr_key] = qsr_val
 
-			if split_qsrs and my_qsrs != {}:
+			if split_qsrs:
 				for q, r in my_qsrs.items():
-					splits_up_qsrs = {q: r}
-					try:
-						obj_based_qsr_world[q][objs].append((frame, splits_up_qsrs))
-					except KeyError:
-						obj_based_qsr_world[q][objs] = [(frame, splits_up_qsrs)]
-
-			elif split_qsrs==False and my_qsrs != {}:
-				try:
-					obj_based_qsr_world[world_qsr.qsr_type][objs].append((frame, my_qsrs))
-				except KeyError:
-					obj_based_qsr_world[world_qsr.qsr_type][objs] = [(frame, my_qsrs)]
-
-
-	#print("s", obj_based_qsr_world[objs])
-	# for i in obj_based_qsr_world['Kettle_32,torso']:
-	# 	print(i)
-	# set a counter on the length of an episode when being created - so you can limit it.
+					_add_to_series(obj_based_qsr_world[q], objs, frame, r, {q: r})
+
+			elif my_qsrs != {}:
+				_add_to_series(obj_based_qsr_world[world_qsr.qsr_type], objs, frame,
+							   tuple(sorted(my_qsrs.items())), my_qsrs)
+
 	for q, obj_based_qsrs in obj_based_qsr_world.items():
-		for objs, frame_tuples in obj_based_qsrs.items():
-			epi_start, epi_rel = frame_tuples[0]
-			epi_end  = copy.copy(epi_start)
-			objects = objs.split(',')
-			counter = 0
-			for (frame, rel) in frame_tuples:
-				if episode_length_threshold == 0:
-					if rel == epi_rel:
-						epi_end = frame
-					else:
-						episodes.append( (objects, epi_rel, (epi_start, epi_end)) )
-						epi_start = epi_end = frame
-						epi_rel = rel
-				else:
-					if rel == epi_rel and counter <= episode_length_threshold:
-						epi_end = frame
-						counter+=1
-					else:
-						episodes.append( (objects, epi_rel, (epi_start, epi_end)) )
-						epi_start = epi_end = frame
-						epi_rel = rel
-						counter = 0
-			episodes.append((objects, epi_rel, (epi_start, epi_end)))
+		for objs, (series_frames, codes, code_of_value, relations) in obj_based_qsrs.items():
+			episodes.extend(get_episodes_from_codes(objs.split(','), series_frames, np.array(codes, dtype=int),
+													relations, episode_length_threshold))
+	return episodes
+
+def _add_to_series(obj_based_qsrs, objs, frame, value, relation):
+	"""Adds the relation of some objects at a frame to their series, as the integer code of its value.
+
+	:param obj_based_qsrs: the series of each of the objects, i.e. their frames, codes, the code of each value,
+		and the relation of each code
+	:type obj_based_qsrs: dict
+	:param objs: the objects, separated by commas
+	:type objs: str
+	:param frame: the frame
+	:type frame: int
+	:param value: a hashable value, which is equal for equal relations
+	:param relation: the relation dictionary, i.e. `{qsr: value}`
+	:type relation: dict
+	"""
+	try:
+		series_frames, codes, code_of_value, relations = obj_based_qsrs[objs]
+	except KeyError:
+		series_frames, codes, code_of_value, relations = obj_based_qsrs[objs] = ([], [], {}, [])
+	try:
+		code = code_of_value[value]
+	except KeyError:
+		code = code_of_value[value] = len(relations)
+		relations.append(relation)
+	series_frames.append(frame)
+	codes.append(code)
+
+def get_series_qsrs(qsr_type, split_qsrs=False):
+	"""Returns the QSRs whose episodes are computed separately, in the order of the episodes.
+	The tpcc relations are always separate, as they are between three objects.
+
+	:param qsr_type: the QSR type of the QSR_World_Trace, i.e. the names of its QSRs separated by commas
+	:type qsr_type: str
+	:param split_qsrs: whether each QSR has its own episodes
+	:type split_qsrs: bool
+	:return: the QSRs of the episodes, or the whole qsr_type for the QSRs that are not split
+	:rtype: list
+	"""
+	qsr_types = qsr_type.split(",")
+	if split_qsrs:
+		return qsr_types
+	if "tpcc" in qsr_types and qsr_type != "tpcc":
+		return [qsr_type, "tpcc"]
+	return [qsr_type]
+
+def get_episodes_from_codes(objects, frames, codes, relations, episode_length_threshold=0):
+	"""
+	Compute the QSR Episodes of some objects from their integer coded relations, i.e. the runs of equal codes.
+	The changes of relation are found with a vectorized difference of the codes.
+
+	If episode_length_threshold (the frames_per_ep parameter) is not 0, the runs are also split so that
+	the first episode has at most episode_length_threshold+1 frames, and the other ones at most
+	episode_length_threshold+2 frames.
+
+	FILTERS: if any of the qsr values == Ignore, the entire episode will be ignored.
+
+	:param objects: the objects of the relations
+	:type objects: list
+	:param frames: the frame of each relation, in increasing order
+	:type frames: list
+	:param codes: the code of the relation at each frame
+	:type codes: numpy.ndarray
+	:param relations: the relation dictionary of each code, i.e. `{qsr: value}`
+	:type relations: list
+	:param episode_length_threshold: the maximum number of frames of an episode, 0 for no maximum
+	:type episode_length_threshold: int
+	:return: the episodes, `(objects, {spatial relations}, (start_frame, end_frame))`
+	:rtype: list
+	"""
+	n = len(codes)
+	if n == 0:
+		return []
+	codes = np.asarray(codes)
+	run_starts = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1))
+	if episode_length_threshold == 0:
+		starts = run_starts
+	else:
+		lengths = np.diff(np.append(run_starts, n))
+		runs = np.repeat(np.arange(len(run_starts)), lengths)
+		offsets = np.arange(n) - run_starts[runs]
+		first_length = np.where(runs == 0, episode_length_threshold+1, episode_length_threshold+2)
+		starts = np.flatnonzero((offsets == 0) | ((offsets >= first_length) &
+							((offsets - first_length) % (episode_length_threshold+2) == 0)))
+	ends = np.append(starts[1:], n) - 1
 
 	"""If any of the qsr values == ignore. Remove that episode entirely. """
-	filtered_out_ignore = []
-	for ep in episodes:
-		ignore_flag = 0
-		for qsr, val in ep[1].items():
-			if val == "Ignore":	ignore_flag = 1
-		if ignore_flag == 0: filtered_out_ignore.append(ep)
-
-	print("number of eps:", len(filtered_out_ignore))
-	# for i in filtered_out_ignore:
-	# 	print(i)
-	return filtered_out_ignore
+	ignored = ["Ignore" in rel.values() for rel in relations]
+	return [(objects, dict(relations[code]), (frames[start], frames[end]))
+			for code, start, end in zip(codes[starts].tolist(), starts.tolist(), ends.tolist()) if not ignored[code]]
 
 def get_E_set(objects, spatial_data):
 	"""Returns the Starting episode set (E_s) and the Endding episode set (E_s)
@@ -221,6 +270,42 @@ def get_allen_relation(duration1, duration2):
 	elif ie1 == ie2 and is2 > is1:
 		return 'fi'
 
+def get_temporal_gap(duration1, duration2):
+	"""Returns the number of frames between two discrete durations of time, as counted by get_allen_relation.
+	It is 0 if they meet, and negative if they overlap.
+
+	:param duration1: First duration of time (start_frame, end_frame)
+	:type duration1: tuple
+	:param duration2: Second duration of time (start_frame, end_frame)
+	:type duration2: tuple
+	:return: the number of frames between the durations
+	:rtype: int
+	"""
+	return max(duration2[0] - duration1[1], duration1[0] - duration2[1]) - 1
+
+def get_temporal_pairs(durations, temporal_horizon):
+	"""Returns the pairs of durations of time which overlap, meet, or have at most temporal_horizon frames
+	between them. The durations are sorted by their start, so that the other durations of each pair are found
+	with a binary search, and the cost depends on the number of pairs returned rather than on all the pairs.
+
+	:param durations: durations of time (start_frame, end_frame)
+	:type durations: list
+	:param temporal_horizon: the maximum number of frames between the durations of a pair
+	:type temporal_horizon: int
+	:return: the pairs of indices of the durations (i, j), with i < j, in the order of `itertools.combinations`
+	:rtype: list
+	"""
+	order = sorted(xrange(len(durations)), key=lambda i: durations[i][0])
+	starts = [durations[i][0] for i in order]
+	pairs = []
+	for pos, i in enumerate(order):
+		# The durations which start later are within the horizon up to the first one starting after it
+		stop = bisect_right(starts, durations[i][1] + temporal_horizon + 1)
+		for j in order[pos+1:stop]:
+			pairs.append((i, j) if i < j else (j, i))
+	pairs.sort()
+	return pairs
+
 def graph_hash(G, node_name_attribute='name', edge_name_attribute=None):
 	"""
 	See Figure 4 in 'kLog: A Language for Logical and Relational Learning with Kernels'
@@ -257,46 +342,150 @@ def graph_hash(G, node_name_attribute='name', edge_name_attribute=None):
 	edge_hashes_string = ':'.join([repr(i) for i in edge_hashes])
 	return hash(edge_hashes_string)
 
+def _stable_label(value):
+	"""Returns a representation of a node or edge label that does not depend on the process,
+	i.e. with the items of dictionaries, such as the spatial relations, in sorted order.
+	"""
+	if isinstance(value, dict):
+		return "{%s}" % ", ".join(["%s: %s" % (_stable_label(k), _stable_label(v)) for k, v in sorted(value.items())])
+	return repr(value)
+
+def _digest(string):
+	"""Returns a digest of a string that is the same in every process, unlike the built-in `hash()`."""
+	return hashlib.sha1(string).hexdigest()
+
+def wl_graph_hash(G, node_name_attribute='name', edge_name_attribute=None, node_type_attribute='node_type'):
+	"""
+	Weisfeiler-Lehman hash of a graph, see 'Weisfeiler-Lehman Graph Kernels', Shervashidze et al., JMLR 2011.
+
+	Each node starts with a label made of its node type and name, i.e. the object, the spatial relations
+	or the temporal relation. At every iteration the label of a node is replaced by a digest of its label
+	and of the sorted labels of its successors and of its predecessors, together with the edge labels if
+	edge_name_attribute is given. The iterations stop when they no longer split any class of nodes with
+	the same label, and the hash is a digest of the sorted labels of all the iterations.
+
+	Isomorphic graphs with the same labels have the same hash. Unlike :func:`graph_hash`, which computes
+	the shortest paths from every node, it only costs a few passes over the edges, and the hash is a hex
+	digest string that is the same in every process, so that codebooks can be compared across processes.
+
+	:param G: igraph graph, such as an Activity Graph or a graphlet
+	:type G: igraph.Graph
+	:param node_name_attribute: node attribute used as the label of the nodes
+	:type node_name_attribute: str
+	:param edge_name_attribute: edge attribute used as the label of the edges, None to ignore edge labels
+	:type edge_name_attribute: str
+	:param node_type_attribute: node attribute used together with the name, None to only use the name
+	:type node_type_attribute: str
+	:return: the hash of the graph
+	:rtype: str
+	"""
+	names = G.vs[node_name_attribute] if G.vcount() else []
+	if node_type_attribute and node_type_attribute in G.vs.attributes():
+		types = G.vs[node_type_attribute]
+	else:
+		types = [None] * G.vcount()
+	labels = [_digest("%s|%s" % (_stable_label(t), _stable_label(n))) for t, n in zip(types, names)]
+
+	edges = G.get_edgelist()
+	if edge_name_attribute:
+		edge_labels = [_stable_label(e) for e in G.es[edge_name_attribute]]
+	else:
+		edge_labels = [""] * len(edges)
+
+	all_labels = list(labels)
+	num_of_classes = len(set(labels))
+	for _ in xrange(G.vcount()):
+		successors = [[] for _ in labels]
+		predecessors = [[] for _ in labels]
+		for (source, target), edge_label in zip(edges, edge_labels):
+			successors[source].append(labels[target] + edge_label)
+			predecessors[target].append(labels[source] + edge_label)
+		labels = [_digest("%s>%s<%s" % (label, ",".join(sorted(succ)), ",".join(sorted(pred))))
+				  for label, succ, pred in zip(labels, successors, predecessors)]
+		all_labels.extend(labels)
+		if len(set(labels)) == num_of_classes:
+			break
+		num_of_classes = len(set(labels))
+
+	all_labels.sort()
+	return _digest(":".join(all_labels))
+
+graph_hash_functions = {"wl": wl_graph_hash, "shortest_paths": graph_hash}
+"""dict: The graph hash functions that can be selected with the `graph_hash` parameter of the QSTAG, keyed by name."""
+
 def get_temporal_chords_from_episodes(episodes):
 	"""
-	Function returns temporal chords from a subset of episodes
+	Function returns temporal chords from a subset of episodes, i.e. the maximal intervals of frames
+	over which the same episodes hold. Frames where no episode holds are not part of any chord.
+
+	The start and end frames of the episodes are swept in order, so that the cost depends on the number
+	of episodes and not on their length.
 
 	:param episodes: a list of episodes, where one epiode has the format (start_frame, end_frame, id)
 	:type episodes: list
-	:return: list of chords
+	:return: list of chords [start_frame, end_frame, ids], where ids are in the order of the episodes
 	:rtype: list
 	"""
-	interval_data = {}
 	interval_breaks = []
-	# For each time point in the combined interval, get the state of the
-	# system which is just a list of relations active in that time point.
-
+	# The episodes which start, or stop holding, at each frame. An episode holds from frame int(s)
+	# up to int(e+1)-1, and is referred to by its position so that the ids keep their order.
 	#todo: can this work with floats? Not unless there is a measure of unit.
-	for (s, e, id_) in episodes:
-		for i in range(int(s), int(e+1)):
-			if i not in interval_data:
-				interval_data[i] = []
-			interval_data[i].append(id_)
-
-	keys = interval_data.keys()
-	keys.sort()
-
-	# Now based on the state changes, break the combined interval
-	# whenever there is a change in the state
-	start = keys[0]
-	interval_value = interval_data[start]
-	for i in keys:
-		if interval_value == interval_data[i]:
-			end = i
+	events = {}
+	for pos, (s, e, id_) in enumerate(episodes):
+		first, stop = int(s), int(e+1)
+		if first >= stop:
+			continue
+		events.setdefault(first, []).append((pos, id_))
+		events.setdefault(stop, []).append((pos, None))
+
+	# Between two consecutive events the state of the system, i.e. the list of episodes that hold,
+	# does not change. Break the combined interval whenever there is a change in the state.
+	active = {}
+	points = sorted(events)
+	for point, next_point in zip(points, points[1:]):
+		for pos, id_ in events[point]:
+			if id_ is None:
+				del active[pos]
+			else:
+				active[pos] = id_
+		if not active:
 			continue
+		interval_value = [active[pos] for pos in sorted(active)]
+		if interval_breaks and interval_breaks[-1][2] == interval_value:
+			interval_breaks[-1][1] = next_point - 1
 		else:
-			interval_breaks.append([start, end, interval_value])
-			start = i
-			end = i
-			interval_value = interval_data[start]
-	else:
-		# Adding the final interval
-		interval_breaks.append([start, end, interval_value])
+			interval_breaks.append([point, next_point - 1, interval_value])
+	return interval_breaks
+
+def overlay_temporal_chords(chords1, chords2):
+	"""
+	Function returns the temporal chords of the union of two disjoint sets of episodes,
+	from the temporal chords of each set, without going back to the episodes.
+
+	:param chords1: temporal chords of the first set of episodes, as returned by get_temporal_chords_from_episodes
+	:type chords1: list
+	:param chords2: temporal chords of the second set of episodes
+	:type chords2: list
+	:return: list of chords [start_frame, end_frame, ids], where the ids of the first set come first,
+		i.e. the chords of the first episodes followed by the second ones
+	:rtype: list
+	"""
+	interval_breaks = []
+	points = sorted(set([c[0] for c in chords1] + [c[1]+1 for c in chords1] +
+						[c[0] for c in chords2] + [c[1]+1 for c in chords2]))
+	i, j = 0, 0
+	for point, next_point in zip(points, points[1:]):
+		while i < len(chords1) and chords1[i][1] < point: i += 1
+		while j < len(chords2) and chords2[j][1] < point: j += 1
+		interval_value = []
+		if i < len(chords1) and chords1[i][0] <= point: interval_value = interval_value + chords1[i][2]
+		if j < len(chords2) and chords2[j][0] <= point: interval_value = interval_value + chords2[j][2]
+		if not interval_value:
+			continue
+		if interval_breaks and interval_breaks[-1][2] == interval_value:
+			interval_breaks[-1][1] = next_point - 1
+		else:
+			interval_breaks.append([point, next_point - 1, interval_value])
 	return interval_breaks
 
 def graph2dot(graph, out_dot_file):
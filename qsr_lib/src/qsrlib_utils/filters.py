@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 import sys
+from collections import deque
 import numpy as np
 from qsrlib_io.world_qsr_trace import World_QSR_Trace
 
@@ -24,51 +25,37 @@ def apply_median_filter(qsr_world, params):
 
     frames = qsr_world.get_sorted_timestamps()
     requested_qsrs = qsr_world.qsr_type.split(",")
-    # print("all frames:", len(frames), "param:", params)
-    # print("qsrs requested:", qsr_world.qsr_type)
 
-    # Obtain the QSR data for each object set, and each qsr type.
+    # Obtain the QSR data of each object set and qsr type, and the index of each frame in it, in one pass.
     obj_based_qsr_world = {}
     for frame in frames:
         for objs, qsrs in qsr_world.trace[frame].qsrs.items():
-            if objs not in obj_based_qsr_world:
-                obj_based_qsr_world[objs] = {}
-                for qsr_type in requested_qsrs:
-                    # print("adding data:", qsr_type)
-                    obj_based_qsr_world[objs][qsr_type] = []
-                    obj_based_qsr_world[objs][qsr_type+"_frames"] = []
-
             for qsr_type, qsr in qsrs.qsr.items():
-                obj_based_qsr_world[objs][qsr_type].append(qsr)
-                obj_based_qsr_world[objs][qsr_type+"_frames"].append(frame)
+                if qsr_type not in requested_qsrs:
+                    raise KeyError(qsr_type)
+                try:
+                    data = obj_based_qsr_world[(objs, qsr_type)]
+                except KeyError:
+                    data = obj_based_qsr_world[(objs, qsr_type)] = {"qsrs": [], "frames": {}}
+                data["frames"][frame] = len(data["qsrs"])
+                data["qsrs"].append(qsr)
 
     # Apply the Median Filter to each list of QSR seperately
-    for objs, data in obj_based_qsr_world.items():
-        for qsr_type in requested_qsrs:
-            # print("filtering:", qsr_type)
-
-            if data[qsr_type] != []:
-                obj_based_qsr_world[objs][qsr_type+"_filtered"] = median_filter(data[qsr_type], params["window"])
-
-    # check the filtering works:
-    # if 'Kettle_32,torso' in obj_based_qsr_world.keys():
-    #     objs = 'Kettle_32,torso'
-    #     for cnt, (i,j) in enumerate(zip(obj_based_qsr_world[objs]['qtcbs'], obj_based_qsr_world[objs]['qtcbs_filtered'])):
-    #         print(cnt, objs, "(",i,")", "   ", "(",j,")")
+    for data in obj_based_qsr_world.values():
+        data["filtered"] = median_filter(data["qsrs"], params["window"])
 
     # Overwrite the original QSR data with the filtered data, at the appropriate timepoints (merging QSR types back together in the process)
     for frame in frames:
-        for objs, data in obj_based_qsr_world.items():
+        for objs, qsrs in qsr_world.trace[frame].qsrs.items():
             new_qsrs = {}
             for qsr_type in requested_qsrs:
-                if frame in data[qsr_type+"_frames"]:
-                    ind = data[qsr_type+"_frames"].index(frame)
-                    # print("frame:", frame, qsr_type, "index:", ind)
-                    new_qsrs[qsr_type] = data[qsr_type+"_filtered"][ind]
-
-            # print("frame:", frame, "prev:", qsr_world.trace[frame].qsrs[objs].qsr, "new:", new_qsrs)
+                try:
+                    data = obj_based_qsr_world[(objs, qsr_type)]
+                    new_qsrs[qsr_type] = data["filtered"][data["frames"][frame]]
+                except KeyError:
+                    pass
             if new_qsrs != {}:
-                qsr_world.trace[frame].qsrs[objs].qsr = new_qsrs
+                qsrs.qsr = new_qsrs
     return qsr_world
 
 
@@ -93,31 +80,30 @@ def median_filter(data, n=3):
 
     """initial window < size of window. Add most common to all."""
     initial_window = data[0:n]
-    counts, value = get_counts_from_window(initial_window)
+    window = Window_Counts(initial_window)
     #if the max counted relation is unique, fill the window with this.
-    if counts.count(max(counts)) is 1:
+    unique, value = window.get_mode()
+    if unique:
         ret = [value]*n
     #otherwise, just pick one as they have no ordinal information
     else:
-        # print("relation is not unique in the initial window of size %s, selecting the latest relation: %s" % (n, initial_window[-1]))
         ret = [initial_window[-1]]*n
 
     """continue with windows of size 2*n"""
 
+    #window should be next n values. With previous n values (already filtered); the counts are kept from one window
+    #to the next, with the values that leave and enter it
+    window = Window_Counts(ret[0:n] + data[n:2*n+1])
     for i in range(n, len(data)):
-        #window should be next n values. With previous n values (already filtered)
-        next_n = data[i: i+n+1]
-        prev_n = ret[i-n: i]
-        window = prev_n + next_n
-        # print(window)
-        counts, value = get_counts_from_window(window)
-
         # If the max counted relation is unique, add it
-        if counts.count(max(counts)) is 1:
-            ret.append(value)
         # If multiple relations have same count, - add the previous relation
-        else:
-            ret.append(ret[-1])
+        unique, value = window.get_mode()
+        ret.append(value if unique else ret[-1])
+        window.remove(ret[i-n])
+        window.add(ret[i])
+        window.remove(data[i])
+        if i+n+1 < len(data):
+            window.add(data[i+n+1])
     return ret
 
 def get_counts_from_window(window):
@@ -129,3 +115,160 @@ def get_counts_from_window(window):
         values.append(x)
     value = values[np.argmax(counts)]
     return counts, value
+
+
+class Window_Counts(object):
+    """Counts of the values in a sliding window, with the values of each count, so that the most common value is
+    known without counting the window again when values enter or leave it."""
+
+    def __init__(self, window=()):
+        """Constructor.
+
+        :param window: The initial values of the window.
+        :type window: list
+        """
+        self.counts = {}
+        """dict: The count of each value in the window."""
+
+        self.values_by_count = {}
+        """dict: The set of values of each count."""
+
+        self.max_count = 0
+        """int: The highest count."""
+
+        for v in window:
+            self.add(v)
+
+    def add(self, value):
+        """Add a value to the window.
+
+        :param value: The value.
+        """
+        c = self.counts.get(value, 0)
+        if c:
+            self.values_by_count[c].discard(value)
+        self.counts[value] = c+1
+        self.values_by_count.setdefault(c+1, set()).add(value)
+        if c+1 > self.max_count:
+            self.max_count = c+1
+
+    def remove(self, value):
+        """Remove a value from the window.
+
+        :param value: The value.
+        """
+        c = self.counts[value]
+        self.values_by_count[c].discard(value)
+        if c > 1:
+            self.counts[value] = c-1
+            self.values_by_count[c-1].add(value)
+        else:
+            del self.counts[value]
+        if c == self.max_count and not self.values_by_count[c]:
+            self.max_count -= 1
+
+    def get_mode(self):
+        """Return whether the most common value is unique, and that value if it is.
+
+        :return: Whether the most common value is unique and the value, or None if it is not unique.
+        :rtype: tuple
+        """
+        values = self.values_by_count.get(self.max_count)
+        if values and len(values) == 1:
+            return True, next(iter(values))
+        return False, None
+
+
+class Streaming_Median_Filter(object):
+    """The filter of :func:`median_filter` over a sequence that is given one value at a time.
+
+    The filtered value of an element needs the `n` elements after it, so values come out `n` elements late; the
+    last ones come out with :meth:`flush` once the sequence is over. The filtered values are the same as those of
+    :func:`median_filter` on the whole sequence.
+    """
+
+    def __init__(self, n=3):
+        """Constructor.
+
+        :param n: The window the median filter is applied to.
+        :type n: int
+        """
+        self.n = n
+        """int: The window the median filter is applied to."""
+
+        self.__pending = deque()
+        """collections.deque: The (key, value) of the elements that are not filtered yet."""
+
+        self.__filtered = deque(maxlen=n)
+        """collections.deque: The last `n` filtered values."""
+
+        self.__window = None
+        """Window_Counts: The counts of the window of the next element, i.e. the last `n` filtered values and the
+        values of the first `n`+1 pending elements."""
+
+    def push(self, key, value):
+        """Add the next element of the sequence.
+
+        :param key: Key of the element, e.g. its timestamp, given back with its filtered value.
+        :param value: Value of the element.
+        :return: The (key, filtered value) of the elements whose filtered value is now known.
+        :rtype: list of tuples
+        """
+        self.__pending.append((key, value))
+        if not self.__filtered:
+            return self.__filter_initial_window() if len(self.__pending) == self.n else []
+        if len(self.__pending) <= self.n+1:
+            self.__window.add(value)
+        ret = []
+        while len(self.__pending) > self.n:
+            ret.append(self.__filter_next())
+        return ret
+
+    def flush(self):
+        """End the sequence and filter the remaining elements.
+
+        :return: The (key, filtered value) of the remaining elements.
+        :rtype: list of tuples
+        """
+        ret = self.__filter_initial_window() if not self.__filtered and self.__pending else []
+        while self.__pending:
+            ret.append(self.__filter_next())
+        return ret
+
+    def __filter_initial_window(self):
+        """Filter the first `n` elements, which all get the most common value of them.
+
+        :return: The (key, filtered value) of the first elements.
+        :rtype: list of tuples
+        """
+        initial_window = [v for _, v in self.__pending]
+        unique, value = Window_Counts(initial_window).get_mode()
+        # otherwise, just pick one as they have no ordinal information
+        if not unique:
+            value = initial_window[-1]
+        ret = [(key, value) for key, _ in self.__pending]
+        self.__filtered.extend([value]*self.n)
+        self.__window = Window_Counts(self.__filtered)
+        self.__pending.clear()
+        return ret
+
+    def __filter_next(self):
+        """Filter the next element, over the previous `n` filtered values and the next `n`+1 values.
+
+        :return: The (key, filtered value) of the element.
+        :rtype: tuple
+        """
+        unique, value = self.__window.get_mode()
+        # If multiple relations have same count, - add the previous relation
+        if not unique:
+            value = self.__filtered[-1]
+        key, old_value = self.__pending.popleft()
+        # the window moves on by one element, the counts are updated with the values that leave and enter it
+        self.__window.remove(self.__filtered[0])
+        self.__window.add(value)
+        self.__filtered.append(value)
+        self.__window.remove(old_value)
+        if len(self.__pending) > self.n:
+            self.__window.add(self.__pending[self.n][1])
+        return key, value
+
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division
+import multiprocessing
+import random
+from qsrlib_io.world_qsr_trace import World_QSR_Trace
+
+
+_worker_state = {}
+"""dict: The QSRs, input data, dynamic args and chunks of a worker process, set once when the worker starts."""
+
+
+def get_parallel_params(dynamic_args):
+    """Return the parallel execution parameters of a request, with their defaults filled in.
+
+    The parameters are read from `dynamic_args["parallel"]`:
+
+    * `processes`: Number of worker processes, defaults to the number of CPUs.
+    * `min_timestamps`: Inputs with fewer timestamps than this are computed serially, defaults to 1000.
+    * `chunk_size`: Number of timestamps per task of the QSRs that are split along time, defaults to an equal share
+      of the timestamps for each process.
+
+    :param dynamic_args: The dynamic args of the request.
+    :type dynamic_args: dict
+    :return: The parameters, or None if parallel execution was not requested.
+    :rtype: dict or None
+    """
+    try:
+        params = dynamic_args["parallel"]
+    except KeyError:
+        return None
+    ret = {"processes": None, "min_timestamps": 1000, "chunk_size": None}
+    for k, v in params.items():
+        if k not in ret:
+            raise KeyError("%s is an unknown parameter of 'parallel'" % str(k))
+        ret[k] = v
+    if ret["processes"] is None:
+        ret["processes"] = multiprocessing.cpu_count()
+    if not isinstance(ret["processes"], int) or ret["processes"] < 1:
+        raise ValueError("'processes' of 'parallel' must be a positive integer")
+    if ret["chunk_size"] is not None and (not isinstance(ret["chunk_size"], int) or ret["chunk_size"] < 1):
+        raise ValueError("'chunk_size' of 'parallel' must be a positive integer")
+    return ret
+
+
+def compute_qsrs(qsrs, which_qsrs, input_data, dynamic_args, params=None):
+    """Compute each of the requested QSRs, in parallel worker processes if requested and worth it.
+
+    The input data and the dynamic args are given to each worker once, when it starts; where processes are forked,
+    as on Linux, they are inherited by the workers without being copied or pickled. Only the results are sent back.
+
+    The QSRs that only need one or two adjacent world states per timestamp, i.e. those with a
+    `_time_shard_overlap`, are split along time in chunks of `params["chunk_size"]` timestamps, which are computed
+    by the workers and stitched back together; the chunks of the QSRs over two timestamps start one timestamp early.
+    The other QSRs are computed by a worker each as a whole.
+
+    The workers compute each task starting from the state of the `random` module at the time of the call, so that the
+    results of QSRs that draw random numbers do not depend on the number of workers; they are the same as in the serial
+    computation if only one of the QSRs draws random numbers. The `random` module of the calling process is then left
+    in the state of the last task, in the order of `which_qsrs`, that drew random numbers, so that, as after the
+    serial computation, the draws of that QSR are consumed from its stream.
+
+    The computation is serial if `params` is None, if there are fewer than two tasks or processes, or if the input
+    data has fewer timestamps than `params["min_timestamps"]`.
+
+    :param qsrs: The QSRs registry, a mapping between the QSRs unique names and their objects.
+    :type qsrs: dict
+    :param which_qsrs: Names of the QSRs to be computed.
+    :type which_qsrs: list of str
+    :param input_data: Input data.
+    :type input_data: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
+    :param dynamic_args: The dynamic args of the request.
+    :type dynamic_args: dict
+    :param params: Parallel execution parameters, as returned by :func:`get_parallel_params`.
+    :type params: dict or None
+    :return: The World QSR traces of the QSRs, in the order of `which_qsrs`.
+    :rtype: list of :class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`
+    """
+    if params and params["processes"] > 1 and len(input_data.get_sorted_timestamps()) >= params["min_timestamps"]:
+        shards, tasks = _make_tasks(qsrs, which_qsrs, input_data, dynamic_args, params)
+    else:
+        tasks = []
+    processes = min(params["processes"], len(tasks)) if params else 1
+    if processes < 2:
+        return [qsrs[which_qsr].get_qsrs(input_data=input_data, dynamic_args=dynamic_args) for which_qsr in which_qsrs]
+
+    pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                initargs=(qsrs, input_data, dynamic_args, shards, random.getstate()))
+    try:
+        results = pool.map(_compute_task, tasks, chunksize=1)
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    for _, random_state in results:
+        if random_state is not None:
+            random.setstate(random_state)
+    ret = []
+    results = iter([world_qsr_trace for world_qsr_trace, _ in results])
+    for which_qsr in which_qsrs:
+        if which_qsr not in shards:
+            ret.append(next(results))
+            continue
+        qsr_params, world_trace, timestamps, chunks = shards[which_qsr]
+        world_qsr_trace = World_QSR_Trace(qsr_type=qsrs[which_qsr].unique_id)
+        for _ in chunks:
+            world_qsr_trace.trace.update(next(results).trace)
+        ret.append(qsrs[which_qsr]._postprocess_world_qsr_trace(world_qsr_trace, world_trace, timestamps, qsr_params,
+                                                                {"input_data": input_data,
+                                                                 "dynamic_args": dynamic_args}))
+    return ret
+
+
+def _make_tasks(qsrs, which_qsrs, input_data, dynamic_args, params):
+    """Split the computation of the QSRs in tasks for the workers.
+
+    :param qsrs: The QSRs registry.
+    :type qsrs: dict
+    :param which_qsrs: Names of the QSRs to be computed.
+    :type which_qsrs: list of str
+    :param input_data: Input data.
+    :type input_data: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
+    :param dynamic_args: The dynamic args of the request.
+    :type dynamic_args: dict
+    :param params: Parallel execution parameters.
+    :type params: dict
+    :return: The QSR parameters, input world trace, timestamps and chunks of the QSRs that are split along time, and
+    the tasks, `(which_qsr, start, stop)` for a chunk or `(which_qsr, None, None)` for a whole QSR.
+    :rtype: (dict, list)
+    """
+    shards = {}
+    tasks = []
+    for which_qsr in which_qsrs:
+        qsr = qsrs[which_qsr]
+        if qsr._time_shard_overlap is None:
+            tasks.append((which_qsr, None, None))
+            continue
+        qsr_params = qsr._process_qsr_parameters_from_request_parameters({"input_data": input_data,
+                                                                          "dynamic_args": dynamic_args})
+        world_trace, timestamps = qsr._set_input_world_trace(input_data, qsr_params)
+        chunk_size = params["chunk_size"] or max(-(-len(timestamps) // params["processes"]), 1)
+        chunks = [(start, min(start+chunk_size, len(timestamps))) for start in range(0, len(timestamps), chunk_size)]
+        shards[which_qsr] = (qsr_params, world_trace, timestamps, chunks)
+        tasks.extend((which_qsr, start, stop) for start, stop in chunks)
+    return shards, tasks
+
+
+def _init_worker(qsrs, input_data, dynamic_args, shards, random_state):
+    """Keep the state shared by all the tasks of a worker process.
+
+    :param qsrs: The QSRs registry.
+    :type qsrs: dict
+    :param input_data: Input data.
+    :type input_data: :class:`World_Trace <qsrlib_io.world_trace.World_Trace>`
+    :param dynamic_args: The dynamic args of the request.
+    :type dynamic_args: dict
+    :param shards: The QSR parameters, input world trace, timestamps and chunks of the QSRs that are split along time.
+    :type shards: dict
+    :param random_state: State of the `random` module of the parent process.
+    :type random_state: tuple
+    """
+    _worker_state["qsrs"] = qsrs
+    _worker_state["input_data"] = input_data
+    _worker_state["dynamic_args"] = dynamic_args
+    _worker_state["shards"] = shards
+    _worker_state["random_state"] = random_state
+
+
+def _compute_task(task):
+    """Compute a QSR, or a chunk of its timestamps, in a worker process.
+
+    :param task: Name of the QSR and the start and stop index of the chunk of timestamps, or None for all of them.
+    :type task: tuple
+    :return: The World QSR trace of the QSR, not post-processed for a chunk, and the state of the `random` module
+    after the task, or None if the task did not draw random numbers.
+    :rtype: (:class:`World_QSR_Trace <qsrlib_io.world_qsr_trace.World_QSR_Trace>`, tuple)
+    """
+    which_qsr, start, stop = task
+    qsr = _worker_state["qsrs"][which_qsr]
+    random.setstate(_worker_state["random_state"])
+    if start is None:
+        ret = qsr.get_qsrs(input_data=_worker_state["input_data"], dynamic_args=_worker_state["dynamic_args"])
+    else:
+        qsr_params, world_trace, timestamps, _ = _worker_state["shards"][which_qsr]
+        ret = qsr.make_world_qsr_trace(world_trace, timestamps[max(start-qsr._time_shard_overlap, 0):stop],
+                                       qsr_params, {"input_data": _worker_state["input_data"],
+                                                    "dynamic_args": _worker_state["dynamic_args"]})
+    random_state = random.getstate()
+    return ret, (random_state if random_state != _worker_state["random_state"] else None)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function, division
+from collections import defaultdict
+from itertools import combinations
+import math
+
+
+def get_candidate_pairs(extents, max_cells_per_object=1024):
+    """Return the pairs of objects whose extents intersect, using a uniform grid instead of testing all pairs.
+
+    An extent is an axis aligned rectangle `(x1, y1, x2, y2)` with `x1 <= x2` and `y1 <= y2`. Two extents intersect
+    when they share at least one point, boundaries included. Objects whose extent is None, not finite, or that would
+    cover more than `max_cells_per_object` cells are paired with every other object.
+
+    The cell size is the median of the extents sizes, so that each object typically falls in a few cells and only
+    objects sharing a cell are tested against each other.
+
+    :param extents: Extents of the objects, keyed by the objects names.
+    :type extents: dict
+    :param max_cells_per_object: Objects covering more cells than this are paired with every other object.
+    :type max_cells_per_object: int
+    :return: The candidate pairs, including mirrors, e.g. both `('a', 'b')` and `('b', 'a')`.
+    :rtype: set of tuples of str
+    """
+    unbounded = []
+    bounded = {}
+    for name, e in extents.items():
+        if e is None or not all(-float("inf") < v < float("inf") for v in e):
+            unbounded.append(name)
+        else:
+            bounded[name] = e
+
+    ret = set()
+    if bounded:
+        sizes = sorted(max(e[2]-e[0], e[3]-e[1]) for e in bounded.values())
+        cell = sizes[len(sizes)//2]
+        if not cell > 0:
+            cell = max(sizes[-1], 1.0)
+        grid = defaultdict(list)
+        for name, (x1, y1, x2, y2) in bounded.items():
+            i1, i2 = int(math.floor(x1/cell)), int(math.floor(x2/cell))
+            j1, j2 = int(math.floor(y1/cell)), int(math.floor(y2/cell))
+            if (i2-i1+1) * (j2-j1+1) > max_cells_per_object:
+                unbounded.append(name)
+                continue
+            for i in range(i1, i2+1):
+                for j in range(j1, j2+1):
+                    grid[(i, j)].append(name)
+        for members in grid.values():
+            for a, b in combinations(members, 2):
+                if (a, b) in ret:
+                    continue
+                ea, eb = bounded[a], bounded[b]
+                if ea[0] <= eb[2] and eb[0] <= ea[2] and ea[1] <= eb[3] and eb[1] <= ea[3]:
+                    ret.add((a, b))
+                    ret.add((b, a))
+
+    for a in unbounded:
+        for b in extents:
+            if a != b:
+                ret.add((a, b))
+                ret.add((b, a))
+    return ret
@@ -20,6 +20,11 @@ class ArgD_Test(Abstractclass_Unittest_Dyadic):
         # floats
         self.assertItemsEqual(*self.custom("data4", "data4_argd_defaults.txt", {self._unique_id: self.__params}))
 
+    def test_spatial_index(self):
+        params = dict(self.__params, spatial_index=True)
+        self.assertItemsEqual(*self.custom("data2", "data2_argd_defaults.txt", {self._unique_id: params}))
+        self.assertItemsEqual(*self.custom("data3", "data3_argd_defaults.txt", {self._unique_id: params}))
+
     def test_qsrs_for_global_namespace(self):
         self.assertItemsEqual(*self.custom("data2", "data2_argd_qsrs_for_global_namespace.txt",
                                            {"for_all_qsrs": {"qsrs_for": [("o2", "o1")]}, self._unique_id: self.__params}))
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy as np
+from qsrlib.qsrlib import QSRlib, QSRlib_Request_Message
+from qsrlib_qstag.qstag import Activity_Graph
+from qsrlib_qstag.codebook_store import Graphlet_Codebook_Store
+from unittests_data_loaders import *
+
+
+class Codebook_Store_Test(unittest.TestCase):
+    def __init__(self, *args):
+        super(Codebook_Store_Test, self).__init__(*args)
+        self._world = load_input_data2_first100()
+        world_qsr = QSRlib().request_qsrs(QSRlib_Request_Message(["rcc2", "mos"], self._world)).qsrs
+        timestamps = world_qsr.get_sorted_timestamps()
+        params = {"min_rows": 1, "max_rows": 2, "max_eps": 3, "graph_hash": "wl"}
+        self._graphlets = {}
+        for clip, (start, stop) in zip("abc", [(0, 40), (30, 70), (60, 100)]):
+            clip_qsr = world_qsr.get_at_timestamp_range(timestamps[start], timestamps[stop-1])
+            self._graphlets[clip] = Activity_Graph(self._world, clip_qsr, object_types={}, params=params).graphlets
+
+    def setUp(self):
+        self._path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._path)
+
+    def assert_histograms(self, store, clips):
+        for clip in clips:
+            graphlets = self._graphlets[clip]
+            histogram = store.get_histogram(clip)
+            self.assertEqual(len(histogram), len(store.code_book))
+            self.assertEqual(dict((h, c) for h, c in zip(store.code_book, histogram) if c),
+                             dict(zip(graphlets.code_book, graphlets.histogram)))
+
+    def test_flush_and_reopen(self):
+        path = os.path.join(self._path, "store")
+        store = Graphlet_Codebook_Store(path)
+        store.add_clip("a", self._graphlets["a"])
+        self.assertRaises(ValueError, store.add_clip, "a", self._graphlets["a"])
+        self.assertEqual(store.flush(), "00000000")
+        self.assertEqual(store.flush(), None)
+        store.add_clip("b", self._graphlets["b"])
+        self.assertEqual(store.flush(), "00000001")
+        self.assertEqual(sorted(os.listdir(path)), ["00000000.graphlets", "00000000.segment",
+                                                     "00000001.graphlets", "00000001.segment"])
+
+        reopened = Graphlet_Codebook_Store(path)
+        self.assertEqual(reopened.code_book, store.code_book)
+        self.assertEqual(reopened.clips, ["a", "b"])
+        self.assertEqual([reopened.index(h) for h in store.code_book], range(len(store.code_book)))
+        self.assert_histograms(reopened, "ab")
+        for h in store.code_book:
+            self.assertIn(h, reopened)
+            graphlet = reopened.get_graphlet(h)
+            self.assertEqual((graphlet.vcount(), graphlet.ecount()),
+                             (store.get_graphlet(h).vcount(), store.get_graphlet(h).ecount()))
+        self.assertEqual(reopened.get_graphlet("not a hash"), None)
+
+        # the indices of the flushed hashes do not change when more clips are added
+        code_book = list(reopened.code_book)
+        reopened.add_clip("c", self._graphlets["c"])
+        reopened.flush()
+        reopened = Graphlet_Codebook_Store(path)
+        self.assertEqual(reopened.code_book[:len(code_book)], code_book)
+        self.assert_histograms(reopened, "abc")
+
+    def test_merge(self):
+        workers = []
+        for name, clips in [("worker1", "ab"), ("worker2", "bc")]:
+            worker = Graphlet_Codebook_Store(os.path.join(self._path, name))
+            for clip in clips:
+                worker.add_clip(clip, self._graphlets[clip])
+            worker.flush()
+            workers.append(worker)
+        self.assertTrue(set(workers[0].code_book) & set(workers[1].code_book))
+
+        store = Graphlet_Codebook_Store(os.path.join(self._path, "store"))
+        self.assertEqual(store.merge(workers[0]), 2)
+        self.assertEqual(store.merge(os.path.join(self._path, "worker2")), 1)
+        self.assertEqual(store.merge(workers[1]), 0)
+        self.assertEqual(store.clips, ["a", "b", "c"])
+        self.assertEqual(sorted(store.code_book), sorted(set(workers[0].code_book) | set(workers[1].code_book)))
+        self.assert_histograms(store, "abc")
+
+        store.flush()
+        reopened = Graphlet_Codebook_Store(os.path.join(self._path, "store"))
+        self.assertEqual(reopened.code_book, store.code_book)
+        self.assert_histograms(reopened, "abc")
+        for h in reopened.code_book:
+            self.assertNotEqual(reopened.get_graphlet(h), None)
+
+    def test_histogram_matrix(self):
+        store = Graphlet_Codebook_Store(self._path)
+        for clip in "abc":
+            store.add_clip(clip, self._graphlets[clip])
+        store.flush()
+        store = Graphlet_Codebook_Store(self._path)
+
+        expected = np.array([store.get_histogram(clip) for clip in "abc"])
+        data, row, col, shape = store.get_coo()
+        self.assertEqual(shape, expected.shape)
+        dense = np.zeros(shape, dtype=int)
+        dense[row, col] = data
+        self.assertTrue(np.array_equal(dense, expected))
+
+        data, row, col, shape = store.get_coo(["c", "a"])
+        dense = np.zeros(shape, dtype=int)
+        dense[row, col] = data
+        self.assertTrue(np.array_equal(dense, expected[[2, 0]]))
+
+        try:
+            import scipy
+        except ImportError:
+            return
+        self.assertTrue(np.array_equal(store.get_csr_matrix().toarray(), expected))
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun("qsr_lib", "codebook_store_test", Codebook_Store_Test, sys.argv)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys
+import unittest
+import numpy as np
+from qsrlib.qsrlib import QSRlib, QSRlib_Request_Message
+from qsrlib_qstag.qstag import Activity_Graph, Graphlet_Codebook
+from unittests_data_loaders import *
+
+
+class Graphlet_Codebook_Test(unittest.TestCase):
+    def __init__(self, *args):
+        super(Graphlet_Codebook_Test, self).__init__(*args)
+        world = load_input_data2_first100()
+        world_qsr = QSRlib().request_qsrs(QSRlib_Request_Message(["rcc2", "mos"], world)).qsrs
+        timestamps = world_qsr.get_sorted_timestamps()
+        params = {"min_rows": 1, "max_rows": 2, "max_eps": 3}
+        self._graphlets = []
+        for start, stop in [(0, 40), (30, 70), (60, 100)]:
+            clip_qsr = world_qsr.get_at_timestamp_range(timestamps[start], timestamps[stop-1])
+            self._graphlets.append(Activity_Graph(world, clip_qsr, object_types={}, params=params).graphlets)
+
+    def test_insertion_order(self):
+        code_book = Graphlet_Codebook()
+        expected = []
+        for graphlets in self._graphlets:
+            code_book.add_graphlets(graphlets)
+            expected.extend(h for h in graphlets.code_book if h not in expected)
+        self.assertEqual(code_book.code_book, expected)
+        self.assertEqual([code_book.index(h) for h in expected], range(len(expected)))
+        self.assertEqual(len(code_book), len(expected))
+        self.assertEqual(sorted(code_book.graphlets.keys()), sorted(expected))
+
+        self.assertEqual(code_book.add(expected[1]), 1)
+        self.assertEqual(code_book.add("new hash"), len(expected))
+        self.assertIn("new hash", code_book)
+        self.assertRaises(KeyError, code_book.index, "other hash")
+
+    def test_histograms(self):
+        code_book = Graphlet_Codebook()
+        histograms = [code_book.add_graphlets(graphlets) for graphlets in self._graphlets]
+        matrix = code_book.get_histograms(self._graphlets)
+        self.assertEqual(matrix.shape, (len(self._graphlets), len(code_book)))
+        for row, (graphlets, histogram) in enumerate(zip(self._graphlets, histograms)):
+            # the histogram returned when adding is aligned with the code book at that time
+            self.assertTrue(np.array_equal(matrix[row, :len(histogram)], histogram))
+            self.assertTrue(np.array_equal(graphlets.get_histogram(code_book), matrix[row]))
+            self.assertEqual(dict((h, c) for h, c in zip(code_book.code_book, matrix[row]) if c),
+                             dict(zip(graphlets.code_book, graphlets.histogram)))
+        self.assertTrue(np.array_equal(code_book.histogram, matrix.sum(axis=0)))
+
+        # graphlets which are not in the code book are not counted
+        first = Graphlet_Codebook()
+        first.add_graphlets(self._graphlets[0])
+        histogram = first.get_histogram(self._graphlets[1])
+        self.assertEqual(len(histogram), len(first))
+        self.assertEqual(histogram.sum(), sum(c for h, c in zip(self._graphlets[1].code_book,
+                                                                 self._graphlets[1].histogram) if h in first))
+
+    def test_accumulation(self):
+        code_book = Graphlet_Codebook()
+        for graphlets in self._graphlets + self._graphlets[:1]:
+            code_book.add_graphlets(graphlets)
+        expected = {}
+        for graphlets in self._graphlets + self._graphlets[:1]:
+            for h, c in zip(graphlets.code_book, graphlets.histogram):
+                expected[h] = expected.get(h, 0) + c
+        self.assertEqual(dict(zip(code_book.code_book, code_book.histogram)), expected)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun("qsr_lib", "graphlet_codebook_test", Graphlet_Codebook_Test, sys.argv)
@@ -48,6 +48,32 @@ class Multiple_Test(AbstractClass_UnitTest):
         self.assertItemsEqual(*self.qsrs_for_qsr_namespace_over_global_namespace("data2_first100",
                                                                                  "data2_first100_multiple_qsrs_for_qsr_namespace_over_global.txt"))
 
+    def test_parallel(self):
+        dynamic_args = deepcopy(self.__dynamic_args)
+        dynamic_args["parallel"] = {"processes": 2, "min_timestamps": 0}
+        random.seed(self.__seed)
+        self.assertItemsEqual(*self.custom("data2_first100", "data2_first100_multiple_defaults.txt", dynamic_args))
+        # small chunks of timestamps for the QSRs that are split along time
+        dynamic_args["parallel"]["chunk_size"] = 7
+        random.seed(self.__seed)
+        self.assertItemsEqual(*self.custom("data2_first100", "data2_first100_multiple_defaults.txt", dynamic_args))
+        # the same results as in test_qsrs_for_global_namespace
+        dynamic_args["for_all_qsrs"] = {"qsrs_for": [("o3", "o2", "o1"), ("o2", "o1"), "o2"]}
+        random.seed(self.__seed)
+        self.assertItemsEqual(*self.custom("data2_first100", "data2_first100_multiple_qsrs_for_global_namespace.txt",
+                                           dynamic_args))
+        # the random numbers drawn by the QSRs are consumed in the calling process, as in the serial computation
+        draws = []
+        for parallel in (False, True):
+            dynamic_args = deepcopy(self.__dynamic_args)
+            if parallel:
+                dynamic_args["parallel"] = {"processes": 2, "min_timestamps": 0}
+            random.seed(self.__seed)
+            self._qsrlib.request_qsrs(QSRlib_Request_Message(self.__which_qsr, self._worlds["data2_first100"],
+                                                             dynamic_args))
+            draws.append(random.random())
+        self.assertEqual(draws[0], draws[1])
+
     # overwrites parent method
     def defaults(self, world_name, gt_filename):
         expected = unittest_read_qsrs_as_one_long_list(find_resource(PKG, gt_filename)[0])
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys
+import random
+import unittest
+from qsrlib.qsrlib import QSRlib, QSRlib_Request_Message
+from qsrlib.qsrlib_session import QSRlib_Session
+from qsrlib_io.world_trace import World_State
+from qsrlib_utils.utils import merge_world_qsr_traces
+from unittests_data_loaders import *
+from unittests_utils import *
+
+
+class QSRlib_Session_Test(unittest.TestCase):
+    def __init__(self, *args):
+        super(QSRlib_Session_Test, self).__init__(*args)
+        self._world = load_input_data2_first100()
+        self._qsrlib = QSRlib()
+        self._which_qsr = ["rcc8", "cardir", "argd", "argprobd", "mos", "ra", "tpcc", "qtcbs", "qtccs", "qtcbcs"]
+        self._dynamic_args = {"argd": {"qsr_relations_and_values": {"close": 10.0, "near": 20.0,
+                                                                    "far": 30.0, "veryfar": 40.0}},
+                              "argprobd": {"qsr_relations_and_values": {"close": (10, 10/2), "near": (20, 20/2),
+                                                                        "far": (30, 30/2), "veryfar": (40, 40/2)}}}
+
+    def qsrs(self, dynamic_args):
+        random.seed(100)
+        expected = self._qsrlib.request_qsrs(QSRlib_Request_Message(self._which_qsr, self._world, dynamic_args)).qsrs
+        random.seed(100)
+        session = QSRlib_Session(self._qsrlib, self._which_qsr, dynamic_args)
+        world_qsr_traces = [session.push(self._world.trace[t]) for t in self._world.get_sorted_timestamps()]
+        world_qsr_traces.append(session.flush())
+        actual = merge_world_qsr_traces(world_qsr_traces, expected.qsr_type)
+        return self.qsrs_list(expected), self.qsrs_list(actual)
+
+    def qsrs_list(self, world_qsr_trace):
+        # the QTC states are keyed by integers and the timestamps by floats, and which of them ends up as the key of a
+        # merged state depends on the order of merging
+        return [(float(t), between, sorted(qsr.qsr.items()))
+                for t, world_qsr_state in world_qsr_trace.trace.items()
+                for between, qsr in world_qsr_state.qsrs.items()]
+
+    def test_defaults(self):
+        self.assertItemsEqual(*self.qsrs(self._dynamic_args))
+
+    def test_qtc_no_collapse(self):
+        dynamic_args = dict(self._dynamic_args, qtcs={"no_collapse": True})
+        self.assertItemsEqual(*self.qsrs(dynamic_args))
+        dynamic_args["qtcs"]["validate"] = False
+        self.assertItemsEqual(*self.qsrs(dynamic_args))
+
+    def test_median_filter(self):
+        dynamic_args = dict(self._dynamic_args, filters={"median_filter": {"window": 3}})
+        self.assertItemsEqual(*self.qsrs(dynamic_args))
+
+    def test_push_order(self):
+        session = QSRlib_Session(self._qsrlib, "rcc8")
+        session.push(self._world.trace[2.0])
+        self.assertRaises(ValueError, session.push, self._world.trace[1.0])
+        self.assertRaises(ValueError, QSRlib_Session, self._qsrlib, "rcc8", {"qstag": {}})
+
+    def test_rejected_push(self):
+        # qtcbs neither collapses nor validates, so it accepts a world state with a missing object which qtccs rejects
+        which_qsr = [q for q in self._which_qsr if q != "argprobd"]
+        dynamic_args = dict(self._dynamic_args, qtcbs={"no_collapse": True, "validate": False})
+        timestamps = self._world.get_sorted_timestamps()
+        bad = World_State(timestamps[2]+0.5)
+        name = sorted(self._world.trace[timestamps[2]].objects.keys())[0]
+        bad.add_object_state(self._world.trace[timestamps[2]].objects[name])
+
+        qsrs = []
+        for push_bad in (False, True):
+            session = QSRlib_Session(self._qsrlib, which_qsr, dynamic_args)
+            for t in timestamps[:3]:
+                session.push(self._world.trace[t])
+            if push_bad:
+                self.assertRaises(KeyError, session.push, bad)
+            world_qsr_traces = [session.push(self._world.trace[t]) for t in timestamps[3:]]
+            world_qsr_traces.append(session.flush())
+            qsrs.append(self.qsrs_list(merge_world_qsr_traces(world_qsr_traces, ",".join(which_qsr))))
+        self.assertItemsEqual(*qsrs)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun("qsr_lib", "qsrlib_session_test", QSRlib_Session_Test, sys.argv)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys
+import unittest
+from qsrlib_io.world_qsr_trace import World_QSR_Trace, QSR
+from qsrlib_qstag.utils import compute_episodes
+
+
+class QSTAG_Episodes_Test(unittest.TestCase):
+    """The expected episodes are the output of the original frame by frame compute_episodes."""
+    def __init__(self, *args):
+        super(QSTAG_Episodes_Test, self).__init__(*args)
+        rcc2 = {"o1,o2": ["dc", "dc", "dc", "c", "c", "c", "c", "dc"],
+                "o2,o3": ["dc", "dc", "dc", None, "dc", "dc", "dc", "dc"]}
+        rcc8 = {"o1,o2": ["dc", "dc", "ec", "ec", "ec", "po", "po", "dc"],
+                "o2,o3": ["po", "po", "Ignore", None, "po", "po", "po", "po"]}
+        tpcc = {"o1,o2,o3": ["left", "left", "left", "right", "right", "Ignore", "left", "left"]}
+        self._qsrs = {"rcc2": rcc2, "rcc8": rcc8, "tpcc": tpcc}
+
+    def world_qsr(self, qsr_type):
+        world_qsr = World_QSR_Trace(qsr_type)
+        for i, t in enumerate(range(1, 9)):
+            for between in ["o1,o2", "o2,o3", "o1,o2,o3"]:
+                qsr = dict((q, self._qsrs[q][between][i]) for q in qsr_type.split(",")
+                           if self._qsrs[q].get(between, [None]*8)[i] is not None)
+                if qsr:
+                    world_qsr.add_qsr(QSR(t, between, qsr), t)
+        return world_qsr
+
+    def test_defaults(self):
+        expected = [(['o1', 'o2'], {'rcc8': 'dc', 'rcc2': 'dc'}, (1, 2)),
+                    (['o1', 'o2'], {'rcc8': 'ec', 'rcc2': 'dc'}, (3, 3)),
+                    (['o1', 'o2'], {'rcc8': 'ec', 'rcc2': 'c'}, (4, 5)),
+                    (['o1', 'o2'], {'rcc8': 'po', 'rcc2': 'c'}, (6, 7)),
+                    (['o1', 'o2'], {'rcc8': 'dc', 'rcc2': 'dc'}, (8, 8)),
+                    (['o2', 'o3'], {'rcc8': 'po', 'rcc2': 'dc'}, (1, 2)),
+                    (['o2', 'o3'], {'rcc8': 'po', 'rcc2': 'dc'}, (5, 8))]
+        self.assertEqual(compute_episodes(self.world_qsr("rcc2,rcc8"), {}), expected)
+
+    def test_frames_per_ep(self):
+        expected = [(['o1', 'o2'], {'rcc8': 'dc', 'rcc2': 'dc'}, (1, 2)),
+                    (['o1', 'o2'], {'rcc8': 'ec', 'rcc2': 'dc'}, (3, 3)),
+                    (['o1', 'o2'], {'rcc8': 'ec', 'rcc2': 'c'}, (4, 5)),
+                    (['o1', 'o2'], {'rcc8': 'po', 'rcc2': 'c'}, (6, 7)),
+                    (['o1', 'o2'], {'rcc8': 'dc', 'rcc2': 'dc'}, (8, 8)),
+                    (['o2', 'o3'], {'rcc8': 'po', 'rcc2': 'dc'}, (1, 2)),
+                    (['o2', 'o3'], {'rcc8': 'po', 'rcc2': 'dc'}, (5, 7)),
+                    (['o2', 'o3'], {'rcc8': 'po', 'rcc2': 'dc'}, (8, 8))]
+        self.assertEqual(compute_episodes(self.world_qsr("rcc2,rcc8"), {"frames_per_ep": 1}), expected)
+
+    def test_split_qsrs(self):
+        expected = [(['o1', 'o2'], {'rcc2': 'dc'}, (1, 3)),
+                    (['o1', 'o2'], {'rcc2': 'c'}, (4, 7)),
+                    (['o1', 'o2'], {'rcc2': 'dc'}, (8, 8)),
+                    (['o2', 'o3'], {'rcc2': 'dc'}, (1, 8)),
+                    (['o1', 'o2'], {'rcc8': 'dc'}, (1, 2)),
+                    (['o1', 'o2'], {'rcc8': 'ec'}, (3, 5)),
+                    (['o1', 'o2'], {'rcc8': 'po'}, (6, 7)),
+                    (['o1', 'o2'], {'rcc8': 'dc'}, (8, 8)),
+                    (['o2', 'o3'], {'rcc8': 'po'}, (1, 2)),
+                    (['o2', 'o3'], {'rcc8': 'po'}, (5, 8))]
+        self.assertEqual(compute_episodes(self.world_qsr("rcc2,rcc8"), {"split_qsrs": True}), expected)
+
+    def test_tpcc(self):
+        expected = [(['o1-o2', 'o3'], {'tpcc': 'left'}, (1, 3)),
+                    (['o1-o2', 'o3'], {'tpcc': 'right'}, (4, 5)),
+                    (['o1-o2', 'o3'], {'tpcc': 'left'}, (7, 8))]
+        self.assertEqual(compute_episodes(self.world_qsr("tpcc"), {}), expected)
+        expected = [(['o1-o2', 'o3'], {'tpcc': 'left'}, (1, 2)),
+                    (['o1-o2', 'o3'], {'tpcc': 'left'}, (3, 3)),
+                    (['o1-o2', 'o3'], {'tpcc': 'right'}, (4, 5)),
+                    (['o1-o2', 'o3'], {'tpcc': 'left'}, (7, 8))]
+        self.assertEqual(compute_episodes(self.world_qsr("tpcc"), {"frames_per_ep": 1}), expected)
+
+    def test_tpcc_and_dyadic(self):
+        world_qsr = World_QSR_Trace("rcc8,tpcc")
+        for t, tpcc in zip(range(1, 5), ["left", "left", "right", "right"]):
+            world_qsr.add_qsr(QSR(t, "o1,o2", {"rcc8": "dc"}), t)
+            world_qsr.add_qsr(QSR(t, "o1,o2,o3", {"tpcc": tpcc}), t)
+        expected = [(['o1', 'o2'], {'rcc8': 'dc'}, (1, 4)),
+                    (['o1-o2', 'o3'], {'tpcc': 'left'}, (1, 2)),
+                    (['o1-o2', 'o3'], {'tpcc': 'right'}, (3, 4))]
+        self.assertEqual(compute_episodes(world_qsr, {"split_qsrs": True}), expected)
+
+        expected = [(['o1', 'o2'], {'rcc2': 'dc'}, (1, 3)),
+                    (['o1', 'o2'], {'rcc2': 'c'}, (4, 7)),
+                    (['o1', 'o2'], {'rcc2': 'dc'}, (8, 8)),
+                    (['o2', 'o3'], {'rcc2': 'dc'}, (1, 3)),
+                    (['o2', 'o3'], {'rcc2': 'dc'}, (5, 8)),
+                    (['o1', 'o2'], {'rcc8': 'dc'}, (1, 2)),
+                    (['o1', 'o2'], {'rcc8': 'ec'}, (3, 5)),
+                    (['o1', 'o2'], {'rcc8': 'po'}, (6, 7)),
+                    (['o1', 'o2'], {'rcc8': 'dc'}, (8, 8)),
+                    (['o2', 'o3'], {'rcc8': 'po'}, (1, 2)),
+                    (['o2', 'o3'], {'rcc8': 'po'}, (5, 8)),
+                    (['o1-o2', 'o3'], {'tpcc': 'left'}, (1, 3)),
+                    (['o1-o2', 'o3'], {'tpcc': 'right'}, (4, 5)),
+                    (['o1-o2', 'o3'], {'tpcc': 'left'}, (7, 8))]
+        self.assertEqual(compute_episodes(self.world_qsr("rcc2,rcc8,tpcc"), {"split_qsrs": True, "frames_per_ep": 2}),
+                         expected)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun("qsr_lib", "qstag_episodes_test", QSTAG_Episodes_Test, sys.argv)
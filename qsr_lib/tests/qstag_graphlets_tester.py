@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys
+import unittest
+from qsrlib_qstag.qstag import _select_episodes
+from qsrlib_qstag.utils import get_temporal_chords_from_episodes
+
+
+class QSTAG_Graphlets_Test(unittest.TestCase):
+    def test_select_episodes_once(self):
+        # Episode 32 holds from frame 1 and episodes 0 to 7 join it at frame 2, so the set of all of them is
+        # reached from both chords, with 32 added first from the first one and last from the second one.
+        intervals = [[2, 2, ep_id] for ep_id in range(8)] + [[1, 2, 32]]
+        chords = get_temporal_chords_from_episodes(intervals)
+        self.assertEqual(chords, [[1, 1, [32]], [2, 2, range(8) + [32]]])
+        # The sets of 9 episode ids iterate in a different order depending on which one was added first.
+        self.assertNotEqual(tuple(set([32] + range(8))), tuple(set(range(8) + [32])))
+
+        selected = _select_episodes(chords, 9, set([]), set([]))
+        self.assertEqual(selected, [frozenset([32]), frozenset(range(8) + [32])])
+        self.assertEqual(_select_episodes(chords, 8, set([]), set([])), [frozenset([32])])
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun("qsr_lib", "qstag_graphlets_test", QSTAG_Graphlets_Test, sys.argv)
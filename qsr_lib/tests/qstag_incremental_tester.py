@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys
+import unittest
+from itertools import combinations
+from qsrlib.qsrlib import QSRlib, QSRlib_Request_Message
+from qsrlib_io.world_qsr_trace import World_QSR_Trace
+from qsrlib_qstag.qstag import Activity_Graph, temporal_map
+from qsrlib_qstag.utils import get_temporal_gap
+from qsrlib_qstag.incremental_qstag import Incremental_Activity_Graph
+from unittests_data_loaders import *
+
+
+class Incremental_QSTAG_Test(unittest.TestCase):
+    def __init__(self, *args):
+        super(Incremental_QSTAG_Test, self).__init__(*args)
+        self._world = load_input_data2_first100()
+        self._qsrlib = QSRlib()
+        self._params = {"min_rows": 1, "max_rows": 2, "max_eps": 3}
+
+    def qsrs(self, which_qsr):
+        return self._qsrlib.request_qsrs(QSRlib_Request_Message(which_qsr, self._world)).qsrs
+
+    def vertex_colors(self, graph, colors):
+        ret = []
+        for v in graph.vs:
+            name = tuple(sorted(v["name"].items())) if isinstance(v["name"], dict) else v["name"]
+            ret.append(colors.setdefault((v["node_type"], name, v["obj_type"]), len(colors)))
+        return ret
+
+    def assert_equal_to_rebuild(self, world_qsr, params, step):
+        activity_graph = Incremental_Activity_Graph(params=params)
+        timestamps = world_qsr.get_sorted_timestamps()
+        for stop in range(step, len(timestamps)+step, step):
+            world_qsr_so_far = World_QSR_Trace(world_qsr.qsr_type,
+                                               dict((t, world_qsr.trace[t]) for t in timestamps[:stop]))
+            activity_graph.update(self._world, world_qsr_so_far)
+            expected = Activity_Graph(self._world, world_qsr_so_far, object_types={}, params=params)
+
+            self.assertEqual(activity_graph.episodes, expected.episodes)
+            colors = {}
+            self.assertEqual(activity_graph.graph.ecount(), expected.graph.ecount())
+            self.assertTrue(activity_graph.graph.isomorphic_vf2(expected.graph,
+                                                                color1=self.vertex_colors(activity_graph.graph, colors),
+                                                                color2=self.vertex_colors(expected.graph, colors)))
+            self.assertItemsEqual(activity_graph.spatial_obj_edges + activity_graph.temp_spatial_edges,
+                                  activity_graph.graph.get_edgelist())
+            self.assertEqual(len(activity_graph.temp_spatial_edges), len(expected.temp_spatial_edges))
+
+            graphlets, expected_graphlets = activity_graph.graphlets, expected.graphlets
+            self.assertEqual(dict(zip(graphlets.code_book, graphlets.histogram)),
+                             dict(zip(expected_graphlets.code_book, expected_graphlets.histogram)))
+            self.assertItemsEqual(graphlets.graphlets.keys(), expected_graphlets.graphlets.keys())
+            self.assertEqual(graphlets.graphlet_timepoints,
+                             dict((h, sorted(timepoints))
+                                  for h, timepoints in expected_graphlets.graphlet_timepoints.items()))
+
+    def test_defaults(self):
+        self.assert_equal_to_rebuild(self.qsrs("rcc8"), self._params, 5)
+
+    def test_split_qsrs(self):
+        self.assert_equal_to_rebuild(self.qsrs(["rcc2", "rcc3"]), dict(self._params, split_qsrs=True), 7)
+
+    def test_frames_per_ep(self):
+        self.assert_equal_to_rebuild(self.qsrs(["rcc2", "mos"]), dict(self._params, frames_per_ep=3), 10)
+
+    def test_temporal_horizon(self):
+        params = dict(self._params, temporal_horizon=2)
+        self.assert_equal_to_rebuild(self.qsrs("rcc8"), params, 10)
+
+        activity_graph = Activity_Graph(self._world, self.qsrs("rcc8"), object_types={}, params=params)
+        episodes = activity_graph.episodes
+        expected = [temporal_map.get(rel, rel) for rel in
+                    [activity_graph.get_temporal_relation(i, j) for i, j in combinations(range(len(episodes)), 2)
+                     if get_temporal_gap(episodes[i][2], episodes[j][2]) <= 2]]
+        self.assertLess(len(expected), len(episodes) * (len(episodes) - 1) // 2)
+        self.assertEqual([v["name"] for v in activity_graph.temporal_nodes], expected)
+
+    def test_processes(self):
+        params = dict(self._params, max_rows=3)
+        world_qsr = self.qsrs(["rcc2", "mos"])
+        expected = Activity_Graph(self._world, world_qsr, object_types={}, params=params).graphlets
+        for processes in (2, 3):
+            graphlets = Activity_Graph(self._world, world_qsr, object_types={},
+                                       params=dict(params, processes=processes)).graphlets
+            self.assertEqual(graphlets.code_book, expected.code_book)
+            self.assertEqual(graphlets.histogram, expected.histogram)
+            self.assertEqual(graphlets.graphlet_timepoints, expected.graphlet_timepoints)
+            self.assertEqual(sorted(graphlets.graphlets.keys()), sorted(expected.graphlets.keys()))
+        self.assertRaises(ValueError, Activity_Graph, self._world, world_qsr, object_types={},
+                          params=dict(params, processes=0))
+
+    def test_params(self):
+        self.assertRaises(ValueError, Incremental_Activity_Graph, params=dict(self._params, max_graphlets=100))
+        self.assertRaises(ValueError, Incremental_Activity_Graph, params=dict(self._params, graph_hash="none"))
+        activity_graph = Incremental_Activity_Graph(self._world, self.qsrs("rcc2"), params=self._params)
+        self.assertRaises(ValueError, activity_graph.update, self._world, self.qsrs("rcc3"))
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun("qsr_lib", "qstag_incremental_test", Incremental_QSTAG_Test, sys.argv)
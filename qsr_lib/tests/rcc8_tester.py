@@ -40,6 +40,13 @@ class RCC8_Test(Abstractclass_Unittest_Dyadic):
     def test_floats(self):
         self.assertItemsEqual(*self.defaults("data4", "data4_rcc8_defaults.txt"))
 
+    def test_spatial_index(self):
+        self.assertItemsEqual(*self.custom("data1", "data1_rcc8_defaults.txt", {self._unique_id: {"spatial_index": True}}))
+        self.assertItemsEqual(*self.custom("data1", "data1_rcc8_q_factor_2p0.txt",
+                                           {"for_all_qsrs": {"spatial_index": True},
+                                            self._unique_id: {"quantisation_factor": 2.0}}))
+        self.assertItemsEqual(*self.custom("data2", "data2_rcc8_defaults.txt", {self._unique_id: {"spatial_index": True}}))
+
     def test_custom(self):
         self.assertItemsEqual(*self.custom("data1", "data1_rcc8_custom.txt", self.__custom))
 
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+from __future__ import print_function, division
+import sys
+import unittest
+import numpy as np
+from qsrlib.qsrlib import QSRlib, QSRlib_Request_Message
+from qsrlib_io.world_trace_columnar import World_Trace_Columnar
+from unittests_data_loaders import *
+from unittests_utils import *
+
+
+class World_Trace_Columnar_Test(unittest.TestCase):
+    def __init__(self, *args):
+        super(World_Trace_Columnar_Test, self).__init__(*args)
+        self._world = World_Trace_Columnar.from_world_trace(load_input_data1())
+        self._qsrlib = QSRlib()
+
+    def qsrs(self, which_qsr, gt_filename):
+        expected = unittest_read_qsrs_as_one_long_list(find_resource(PKG, gt_filename)[0])
+        req_msg = QSRlib_Request_Message(which_qsr, self._world)
+        actual = unittest_get_qsrs_as_one_long_list(self._qsrlib.request_qsrs(req_msg).qsrs)
+        return expected, actual
+
+    def test_dyadic(self):
+        self.assertItemsEqual(*self.qsrs("rcc8", "data1_rcc8_defaults.txt"))
+        self.assertItemsEqual(*self.qsrs("cardir", "data1_cardir_defaults.txt"))
+
+    def test_monadic(self):
+        self.assertItemsEqual(*self.qsrs("mos", "data1_mos_defaults.txt"))
+
+    def test_qtc(self):
+        self.assertItemsEqual(*self.qsrs("qtcbs", "data1_qtcbs_defaults.txt"))
+
+    def test_columns(self):
+        world = World_Trace_Columnar()
+        world.add_object_track_from_list([(1, 1), (2, 2)], "o1", t0=2)
+        world.add_object_state(Object_State(name="o2", timestamp=1, x=5, y=5, xsize=2, ysize=2, object_type="cup"))
+        self.assertEqual(world.get_sorted_timestamps(), [1.0, 2.0, 3.0])
+        o1 = world.get_object_columns("o1")
+        self.assertEqual(o1["mask"].tolist(), [False, True, True])
+        self.assertEqual(o1["x"][1:].tolist(), [1.0, 2.0])
+        self.assertEqual(sorted(world.trace[1].objects.keys()), ["o2"])
+        self.assertEqual(world.trace[1].objects["o2"].kwargs, {"object_type": "cup"})
+        self.assertEqual(world.trace[1].objects["o2"].return_bounding_box_2d(), [4.0, 4.0, 6.0, 6.0])
+        self.assertTrue(np.array_equal(world.get_object_bounding_boxes_2d("o2")[0], [4.0, 4.0, 6.0, 6.0]))
+
+    def test_integers(self):
+        world = World_Trace()
+        for t in range(20):
+            world.add_object_state(Object_State(name="o1", timestamp=t, x=(3*t) % 7, y=(5*t) % 9))
+            world.add_object_state(Object_State(name="o2", timestamp=t, x=(2*t) % 5, y=1.5*t))
+        columnar = World_Trace_Columnar.from_world_trace(world)
+        o1, o2 = columnar.trace[3].objects["o1"], columnar.trace[3].objects["o2"]
+        self.assertEqual((o1.x, o2.x, o2.y), (2, 1, 4.5))
+        self.assertEqual((type(o1.x), type(o2.x), type(o2.y)), (int, int, float))
+        for which_qsr in ["qtcbs", "qtccs", "qtcbcs"]:
+            expected = self._qsrlib.request_qsrs(QSRlib_Request_Message(which_qsr, world)).qsrs
+            actual = self._qsrlib.request_qsrs(QSRlib_Request_Message(which_qsr, columnar)).qsrs
+            self.assertEqual(unittest_get_qsrs_as_one_long_list(actual), unittest_get_qsrs_as_one_long_list(expected))
+
+    def test_views(self):
+        world = World_Trace_Columnar()
+        world.add_object_track_from_list([(1, 1), (2, 2)], "o1", t0=2)
+        world_state = world.trace[2]
+        self.assertIs(world.trace[2], world_state)
+        self.assertIs(world.trace[2].objects["o1"], world_state.objects["o1"])
+        world.add_object_state(Object_State(name="o2", timestamp=2, x=5, y=5))
+        self.assertIs(world.trace[2], world_state)
+        self.assertEqual(sorted(world_state.objects.keys()), ["o1", "o2"])
+        world_state.objects["o2"].x = 6.5
+        self.assertEqual(world.get_object_columns("o2")["x"][0], 6.5)
+        world_state.objects = {"o3": Object_State(name="o3", timestamp=2, x=1, y=1)}
+        self.assertEqual(sorted(world.trace[2].objects.keys()), ["o3"])
+        # inserting an earlier timestamp moves the rows
+        world.add_object_state(Object_State(name="o1", timestamp=1, x=0, y=0))
+        self.assertEqual(world.trace[2].objects["o3"].x, 1)
+        self.assertEqual(world.trace[3].objects["o1"].x, 2)
+
+
+if __name__ == '__main__':
+    import rosunit
+    rosunit.unitrun("qsr_lib", "world_trace_columnar_test", World_Trace_Columnar_Test, sys.argv)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time the creation, loglikelihood and sampling of the QSR HMMs with the ghmm and the numpy backends.
+
+The training chains are sampled from the test HMMs in tests/data. For each QSR the script prints the seconds taken by
+each backend and the difference between the loglikelihoods of the chains under the HMMs the two backends trained.
+Without the ghmm bindings only the numpy backend is timed.
+
+Example:
+    ./benchmark_hmm_backends.py --chains 10 100 --qsr_types qtcb qtcc qtcbc
+"""
+from __future__ import print_function, division
+import argparse
+import json
+import os
+import sys
+import timeit
+from qsrrep_hmms.hmm_abstractclass import gh
+from qsrrep_hmms.qtcb_hmm import QTCBHMM
+from qsrrep_hmms.qtcc_hmm import QTCCHMM
+from qsrrep_hmms.qtcbc_hmm import QTCBCHMM
+from qsrrep_hmms.rcc3_hmm import RCC3HMM
+from qsrrep_hmms.numpy_hmm import NumpyHMM
+
+
+test_hmms = {
+    "qtcb": (QTCBHMM, "qtcb_passby_left.hmm"),
+    "qtcc": (QTCCHMM, "qtcc_passby_left.hmm"),
+    "qtcbc": (QTCBCHMM, "qtcbc_passby_left.hmm"),
+    "rcc3": (RCC3HMM, "rcc3_test.hmm")
+}
+
+
+def make_chains(hmm_class, hmm_file, chains, max_length, seed=0):
+    with open(hmm_file, "r") as f:
+        d = json.load(f)
+    hmm = NumpyHMM(d["trans"], d["emi"], d["start"], seed=seed)
+    ret = []
+    while len(ret) < chains:
+        chain = hmm_class()._symbol_to_qsr([hmm.sampleSingle(max_length)])[0]
+        if len(chain) > 1:
+            ret.append(chain)
+    return ret
+
+
+def quiet(f):
+    """Calls f with the prints of the HMM training discarded."""
+    stdout = sys.stdout
+    with open(os.devnull, "w") as sys.stdout:
+        try:
+            return f()
+        finally:
+            sys.stdout = stdout
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chains", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--max_length", type=int, default=30)
+    parser.add_argument("--qsr_types", nargs="+", default=sorted(test_hmms), choices=sorted(test_hmms))
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "data"))
+    args = parser.parse_args()
+
+    backends = ["ghmm", "numpy"] if gh is not None else ["numpy"]
+    print("%6s %7s %8s %10s %12s %10s %12s" % ("qsr", "chains", "backend", "create", "loglikelihood", "sample",
+                                              "loglike diff"))
+    for qsr_type in args.qsr_types:
+        hmm_class, hmm_file = test_hmms[qsr_type]
+        for chains in args.chains:
+            qsr_seq = make_chains(hmm_class, os.path.join(args.data, hmm_file), chains, args.max_length)
+            loglikes = {}
+            for backend in backends:
+                result = []
+                create = timeit.timeit(lambda: result.append(quiet(lambda: hmm_class().get_hmm(
+                    qsr_seq=qsr_seq, pseudo_transitions=False, start_at_zero=True, backend=backend))), number=1)
+                hmm = result[0]
+                loglike = timeit.timeit(lambda: result.append(hmm_class().get_log_likelihood(
+                    hmm=hmm, qsr_seq=qsr_seq)), number=1)
+                loglikes[backend] = result[1]
+                sample = timeit.timeit(lambda: hmm_class().get_samples(
+                    hmm=hmm, max_length=args.max_length, num_samples=chains), number=1)
+                diff = abs(loglikes[backend] - loglikes[backends[0]])
+                print("%6s %7d %8s %10.3f %12.3f %10.3f %12.2e" % (qsr_type, chains, backend, create, loglike, sample,
+                                                                    diff))
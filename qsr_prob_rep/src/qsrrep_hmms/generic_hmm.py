@@ -79,6 +79,24 @@ class GenericHMM(HMMAbstractclass):
 
         return super(self.__class__, self)._log_likelihood(**kwargs)
 
+    def _log_likelihoods(self, **kwargs):
+        """Computes the loglikelihood of each of the given samples to be
+        produced by each of the given HMMs.
+
+        :param kwargs:
+            * qsr_seq: A list of N lists of qsr sequences to check against the HMMs
+            * hmms: The list of M HMMs to generate the loglikelihoods for
+
+        :return: The MxN numpy array of loglikelihoods
+        """
+
+        self._state_list = kwargs["lookup_table"]
+        if self._state_list == None:
+            raise Exception("Generic HMMs need at least a state look-up table.")
+        self.num_possible_states = len(self._state_list)
+
+        return super(self.__class__, self)._log_likelihoods(**kwargs)
+
     def _qsr_to_symbol(self, qsr_data):
         """Transforms a list of qsr state chains to a list of lists of numbers according to the alphabet.
         Needs to be overridden by the specific QSR to handle the correct symbols.
@@ -2,14 +2,20 @@
 
 from abc import abstractmethod, ABCMeta
 import numpy as np
-import ghmm as gh
 from copy import deepcopy
+from qsrrep_hmms.numpy_hmm import NumpyHMM, batch_loglikelihoods
+try:
+    import ghmm as gh
+except ImportError:
+    gh = None
 
 
 class HMMAbstractclass():
     """Abstract class for HMM generation"""
     __metaclass__ = ABCMeta
 
+    backends_available = ("ghmm", "numpy")
+
     def __init__(self):
         """Initialising the class.
         Setting self.num_possible_states. This has to be overridden by classes
@@ -65,6 +71,30 @@ class HMMAbstractclass():
         # If no errors, calculate loglikelihood
         return self._log_likelihood(**kwargs)
 
+    def get_log_likelihoods(self, **kwargs):
+        """Getter function to compute and get the loglikelihood of each of the
+        given samples to be generated by each of the given HMMs.
+
+        :param kwargs:
+            * qsr_seq: A list of N lists of qsr sequences to check against the HMMs
+            * hmms: The list of M HMMs to generate the loglikelihoods for
+
+        :return: The MxN numpy array of loglikelihoods
+        """
+
+        # TODO: Some error checking
+
+        # If no errors, calculate loglikelihoods
+        return self._log_likelihoods(**kwargs)
+
+    def get_end_symbol(self):
+        """Getting the symbol ending all the state chains. Please override if
+        your QSR uses one.
+
+        :return: The end symbol, None if there is none
+        """
+        return None
+
     def get_num_possible_states(self):
         """Get the number of possiblr states
 
@@ -72,6 +102,32 @@ class HMMAbstractclass():
         """
         return self.num_possible_states
 
+    def create_hmm_from_matrices(self, trans, emi, start, num_symbols, backend="ghmm"):
+        """Creates a HMM object of the given backend from its parameters.
+
+        :param trans: the transition matrix as a list of lists or numpy array
+        :param emi: the emission matrix as a list of lists or numpy array
+        :param start: the start probabilities as a list or numpy array
+        :param num_symbols: the number of symbols of the alphabet
+        :param backend: the HMM implementation, one of 'backends_available'
+
+        :return: the ghmm hmm object or a 'NumpyHMM'
+        """
+        if backend == "numpy":
+            return NumpyHMM(trans, emi, start)
+        if backend != "ghmm":
+            raise ValueError("HMM backend must be one of: %s" % ", ".join(self.backends_available))
+        if gh is None:
+            raise ImportError("The ghmm backend needs the ghmm python bindings, use backend 'numpy' instead.")
+        symbols = self.generate_alphabet(num_symbols)
+        return gh.HMMFromMatrices(
+            symbols,
+            gh.DiscreteDistribution(symbols),
+            np.asarray(trans).tolist(),
+            np.asarray(emi).tolist(),
+            np.asarray(start).tolist()
+        )
+
     def _create_sequence_set(self, qsr_seq, symbols):
         """Creating a sequence set for training
 
@@ -133,7 +189,7 @@ class HMMAbstractclass():
         """
         return gh.IntegerRange(0, num_symbols)
 
-    def _train(self, seq, trans, emi, num_possible_states, pseudo_transitions=False, start_at_zero=False):
+    def _train(self, seq, trans, emi, num_possible_states, pseudo_transitions=False, start_at_zero=False, backend="ghmm"):
         """Uses the given parameters to train a multinominal HMM to represent
         the given seqences of observations. Uses Baum-Welch training.
         Please override if special training is necessary for your QSR.
@@ -142,14 +198,13 @@ class HMMAbstractclass():
         :param trans: the transition matrix as a numpy array
         :param emi: the emission matrix as a numpy array
         :param num_possible_states: the total number of possible states
+        :param backend: the HMM implementation, one of 'backends_available'
 
         :return: the via baum-welch training generated hmm
         """
 
         print 'Generating HMM:'
         print seq
-        print '\tCreating symbols...'
-        symbols = self.generate_alphabet(num_possible_states)
         if start_at_zero:
             startprob = np.zeros(num_possible_states)
             startprob[0] = 1
@@ -157,17 +212,13 @@ class HMMAbstractclass():
             startprob = np.ones(num_possible_states)
             startprob = startprob/np.sum(startprob)
         print startprob
-        print '\t\t', symbols
         print '\tCreating HMM...'
-        hmm = gh.HMMFromMatrices(
-            symbols,
-            gh.DiscreteDistribution(symbols),
-            trans.tolist(),
-            emi.tolist(),
-            startprob.tolist()
-        )
+        hmm = self.create_hmm_from_matrices(trans, emi, startprob, num_possible_states, backend=backend)
         print '\tTraining...'
-        hmm.baumWelch(self._create_sequence_set(seq, symbols))
+        if isinstance(hmm, NumpyHMM):
+            hmm.baumWelch(seq)
+        else:
+            hmm.baumWelch(self._create_sequence_set(seq, self.generate_alphabet(num_possible_states)))
 
         if pseudo_transitions:
             print '\tAdding pseudo transitions...'
@@ -178,13 +229,7 @@ class HMMAbstractclass():
             trans_trained, emi, start = hmm.asMatrices()
             trans_trained = np.array(trans_trained)+pseudo
 
-            hmm = gh.HMMFromMatrices(
-                symbols,
-                gh.DiscreteDistribution(symbols),
-                trans_trained.tolist(),
-                emi,
-                start
-            )
+            hmm = self.create_hmm_from_matrices(trans_trained, emi, start, num_possible_states, backend=backend)
 
             hmm.normalize()
 
@@ -214,7 +259,8 @@ class HMMAbstractclass():
             emi,
             self.get_num_possible_states(),
             pseudo_transitions=kwargs["pseudo_transitions"],
-            start_at_zero=kwargs["start_at_zero"]
+            start_at_zero=kwargs["start_at_zero"],
+            backend=kwargs.get("backend", "ghmm")
         )
         print '...done'
         return hmm
@@ -232,14 +278,16 @@ class HMMAbstractclass():
 
         """
         hmm = kwargs["hmm"]
+        if isinstance(hmm, NumpyHMM):
+            return self._symbol_to_qsr(hmm.sample(
+                kwargs["num_samples"],
+                kwargs["max_length"],
+                end_symbol=self.get_end_symbol()
+            ))
         ret = []
+        external = self.generate_alphabet(num_symbols=self.num_possible_states).external
         for i in range(int(kwargs["num_samples"])):
-            ret.append(
-                map(
-                    self.generate_alphabet(num_symbols=self.num_possible_states).external,
-                    hmm.sampleSingle(int(kwargs["max_length"]))
-                )
-            )
+            ret.append(map(external, hmm.sampleSingle(int(kwargs["max_length"]))))
         return self._symbol_to_qsr(ret)
 
 
@@ -254,7 +302,26 @@ class HMMAbstractclass():
         :return: The accumulated loglikelihood for all the given samples
         """
 
+        if isinstance(kwargs["hmm"], NumpyHMM):
+            return kwargs["hmm"].loglikelihood(self._qsr_to_symbol(kwargs["qsr_seq"]))
         return kwargs["hmm"].loglikelihood(self._create_sequence_set(
             qsr_seq=self._qsr_to_symbol(kwargs["qsr_seq"]),
             symbols=self.generate_alphabet(num_symbols=self.num_possible_states)
         ))
+
+    def _log_likelihoods(self, **kwargs):
+        """Computes the loglikelihood of each of the given samples to be
+        produced by each of the given HMMs. The sequences are converted to
+        symbols once and scored against all the HMMs with one vectorised
+        forward pass, see 'numpy_hmm.batch_loglikelihoods'. ghmm HMMs are
+        converted to 'NumpyHMM' first.
+
+        :param kwargs:
+            * qsr_seq: A list of N lists of qsr sequences to check against the HMMs
+            * hmms: The list of M HMMs to generate the loglikelihoods for
+
+        :return: The MxN numpy array of loglikelihoods, -inf where production is impossible
+        """
+
+        hmms = [h if isinstance(h, NumpyHMM) else NumpyHMM(*h.asMatrices()) for h in kwargs["hmms"]]
+        return batch_loglikelihoods(hmms, self._qsr_to_symbol(kwargs["qsr_seq"]))
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+
+"""A discrete HMM implemented with NumPy arrays only, which can be used instead
+of the ghmm bindings. It offers the subset of the ghmm HMM interface used by
+this package: 'baumWelch', 'loglikelihood', 'loglikelihoods', 'sampleSingle',
+'normalize' and 'asMatrices', and 'sample' to draw many sequences at once.
+
+All the sequences given to one call are processed together: they are padded to
+the length of the longest one and the scaled forward and backward recursions
+run over the time steps on (sequences x states) arrays. 'batch_loglikelihoods'
+extends the forward recursion to several HMMs of the same size at once.
+"""
+
+import numpy as np
+
+
+class NumpyHMM(object):
+    """Discrete HMM with the same parametrisation as a ghmm 'DiscreteEmissionHMM'."""
+
+    def __init__(self, trans, emi, start, seed=None):
+        """
+        :param trans: The NxN transition probability matrix
+        :param emi: The NxM emission probability matrix
+        :param start: The N start probabilities
+        :param seed: The seed of the random number generator used for sampling
+        """
+        self.trans = np.array(trans, dtype=float)
+        self.emi = np.array(emi, dtype=float)
+        self.start = np.array(start, dtype=float)
+        n = self.start.shape[0]
+        if self.trans.shape != (n, n) or self.emi.ndim != 2 or self.emi.shape[0] != n:
+            raise ValueError("Transition matrix needs to be NxN and emission matrix NxM for N start probabilities.")
+        self.rng = np.random.RandomState(seed)
+
+    def asMatrices(self):
+        """Getting the parameters of the HMM, like ghmm does.
+
+        :return: The transition matrix, emission matrix and start probabilities as lists
+        """
+        return self.trans.tolist(), self.emi.tolist(), self.start.tolist()
+
+    def normalize(self):
+        """Normalises the rows of the transition and emission matrices and the start probabilities to sum to 1."""
+        self.trans = _normalize_rows(self.trans)
+        self.emi = _normalize_rows(self.emi)
+        self.start = _normalize_rows(self.start[np.newaxis])[0]
+
+    def loglikelihoods(self, seq):
+        """Computes the loglikelihood of each sequence to be produced by the HMM.
+
+        :param seq: A list of lists of symbols
+
+        :return: The numpy array of loglikelihoods, -inf for sequences which cannot be produced
+        """
+        return batch_loglikelihoods([self], seq)[0]
+
+    def loglikelihood(self, seq):
+        """Computes the loglikelihood of all the sequences to be produced by the HMM.
+
+        :param seq: A list of lists of symbols
+
+        :return: The sum of the loglikelihoods of the sequences
+        """
+        return float(self.loglikelihoods(seq).sum())
+
+    def sampleSingle(self, seqLength):
+        """Samples one sequence of at most 'seqLength' symbols. Like in ghmm, the
+        sample stops early in a state without outgoing transitions.
+
+        :param seqLength: The maximum length of the sample
+
+        :return: The list of emitted symbols
+        """
+        return self.sample(1, seqLength)[0]
+
+    def sample(self, num_samples, max_length, end_symbol=None):
+        """Samples many sequences at once. All the sequences advance together,
+        their states and symbols being drawn by inverse CDF lookups in the
+        cumulative start, transition and emission tables. A sequence stops
+        after 'max_length' symbols, in a state without outgoing transitions,
+        or after emitting 'end_symbol'.
+
+        :param num_samples: The number of sequences
+        :param max_length: The maximum length of the sequences
+        :param end_symbol: The symbol ending a sequence, None if there is none
+
+        :return: The list of lists of emitted symbols
+        """
+        num_samples, max_length = int(num_samples), int(max_length)
+        num_states, num_symbols = self.emi.shape
+        cum_start = _cumulative_table(self.start[np.newaxis])
+        cum_trans = _cumulative_table(self.trans)
+        cum_emi = _cumulative_table(self.emi)
+        final = self.trans.sum(axis=1) <= 0.
+        symbols = np.zeros((num_samples, max_length), dtype=int)
+        lengths = np.zeros(num_samples, dtype=int) + max_length
+        alive = np.ones(num_samples, dtype=bool)
+        state = _draw(cum_start, np.zeros(num_samples, dtype=int), self.rng.rand(num_samples), num_states)
+        for t in xrange(max_length):
+            symbols[:, t] = _draw(cum_emi, state, self.rng.rand(num_samples), num_symbols)
+            done = alive & final[state]
+            if end_symbol is not None:
+                done |= alive & (symbols[:, t] == end_symbol)
+            lengths[done] = t+1
+            alive &= ~done
+            if not alive.any():
+                break
+            state = _draw(cum_trans, state, self.rng.rand(num_samples), num_states)
+        return [s[:l].tolist() for s, l in zip(symbols, lengths)]
+
+    def baumWelch(self, seq, nrSteps=500, loglikelihoodCutoff=0.0001):
+        """Trains the HMM with the Baum-Welch algorithm on the given sequences.
+        Uses the stopping rule of ghmm: the training stops after 'nrSteps' steps
+        or when the loglikelihood improves by less than 'loglikelihoodCutoff'
+        times its absolute value. Sequences which cannot be produced by the
+        HMM are ignored.
+
+        :param seq: A list of lists of symbols
+        :param nrSteps: The maximum number of reestimation steps
+        :param loglikelihoodCutoff: The relative improvement of the loglikelihood below which the training stops
+
+        :return: The loglikelihood of the sequences before the last reestimation step
+        """
+        obs, lengths = _pad(seq)
+        mask = np.arange(obs.shape[1]) < lengths[:, np.newaxis]
+        log_p_old = None
+        for _ in xrange(nrSteps):
+            alpha, scale, log_p_seq = self._forward(obs, lengths)
+            valid = np.isfinite(log_p_seq)
+            if not valid.any():
+                break
+            log_p = log_p_seq[valid].sum()
+            beta = self._backward(obs, lengths, scale)
+            self._reestimate(obs, mask & valid[:, np.newaxis], alpha, beta, scale)
+            if log_p_old is not None and log_p - log_p_old <= abs(loglikelihoodCutoff * log_p):
+                break
+            log_p_old = log_p
+        return log_p_old if log_p_old is not None else float("-inf")
+
+    def _forward(self, obs, lengths):
+        """Scaled forward algorithm over a padded set of sequences.
+
+        :param obs: The BxT array of padded symbols
+        :param lengths: The B lengths of the sequences
+
+        :return: The BxTxN scaled forward variables, the BxT scaling factors and the B loglikelihoods
+        """
+        num_seq, max_len = obs.shape
+        alpha = np.zeros((num_seq, max_len, self.start.shape[0]))
+        scale = np.ones((num_seq, max_len))
+        if max_len == 0:
+            return alpha, scale, np.zeros(num_seq)
+        emi_t = self.emi.T
+        a = self.start * emi_t[obs[:, 0]]
+        for t in xrange(max_len):
+            if t > 0:
+                a = np.dot(alpha[:, t-1], self.trans) * emi_t[obs[:, t]]
+            active = t < lengths
+            c = a.sum(axis=1)
+            c[~active] = 1.
+            scale[:, t] = c
+            with np.errstate(invalid="ignore", divide="ignore"):
+                alpha[:, t] = np.where((c > 0.)[:, np.newaxis], a / c[:, np.newaxis], 0.)
+            alpha[~active, t] = alpha[~active, t-1] if t > 0 else 0.
+        with np.errstate(divide="ignore"):
+            log_p = np.log(scale).sum(axis=1)
+        return alpha, scale, log_p
+
+    def _backward(self, obs, lengths, scale):
+        """Scaled backward algorithm over a padded set of sequences, using the
+        scaling factors of the forward algorithm.
+
+        :param obs: The BxT array of padded symbols
+        :param lengths: The B lengths of the sequences
+        :param scale: The BxT scaling factors returned by '_forward'
+
+        :return: The BxTxN scaled backward variables
+        """
+        num_seq, max_len = obs.shape
+        beta = np.ones((num_seq, max_len, self.start.shape[0]))
+        emi_t = self.emi.T
+        for t in xrange(max_len-2, -1, -1):
+            active = t+1 < lengths
+            b = np.dot(emi_t[obs[:, t+1]] * beta[:, t+1], self.trans.T)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                b = np.where((scale[:, t+1] > 0.)[:, np.newaxis], b / scale[:, t+1, np.newaxis], 0.)
+            beta[active, t] = b[active]
+        return beta
+
+    def _reestimate(self, obs, mask, alpha, beta, scale):
+        """One Baum-Welch reestimation of the parameters from the expected counts
+        of the masked time steps. Like in ghmm, a state without any expected
+        transition count loses all its transitions, while emission rows without
+        any expected count are kept.
+
+        :param obs: The BxT array of padded symbols
+        :param mask: The BxT boolean array of the time steps to use
+        :param alpha: The scaled forward variables
+        :param beta: The scaled backward variables
+        :param scale: The scaling factors
+        """
+        num_states, num_symbols = self.emi.shape
+        gamma = alpha * beta * mask[:, :, np.newaxis]
+
+        start = gamma[:, 0].sum(axis=0)
+
+        emi = np.zeros((num_symbols, num_states))
+        np.add.at(emi, obs[mask], gamma[mask])
+        emi = emi.T
+
+        trans = np.zeros((num_states, num_states))
+        emi_t = self.emi.T
+        for t in xrange(obs.shape[1]-1):
+            step = mask[:, t+1]
+            if not step.any():
+                break
+            right = emi_t[obs[step, t+1]] * beta[step, t+1] / scale[step, t+1, np.newaxis]
+            trans += np.dot(alpha[step, t].T, right)
+        trans *= self.trans
+
+        self.start = _normalize_rows(start[np.newaxis], self.start[np.newaxis])[0]
+        self.trans = _normalize_rows(trans)
+        self.emi = _normalize_rows(emi, self.emi)
+
+
+def batch_loglikelihoods(hmms, seq):
+    """Computes the loglikelihood of each sequence to be produced by each HMM.
+    The scaled forward algorithm runs once over (HMMs x sequences x states)
+    arrays, the sequences being padded to the length of the longest one.
+
+    :param hmms: A list of M 'NumpyHMM' with the same numbers of states and symbols
+    :param seq: A list of N lists of symbols
+
+    :return: The MxN numpy array of loglikelihoods, -inf for sequences which cannot be produced
+    """
+    obs, lengths = _pad(seq)
+    try:
+        trans = np.array([h.trans for h in hmms])
+        emi_t = np.array([h.emi.T for h in hmms])
+        start = np.array([h.start for h in hmms])
+    except ValueError:
+        raise ValueError("All the HMMs need to have the same numbers of states and symbols.")
+    log_p = np.zeros((len(hmms), obs.shape[0]))
+    if obs.shape[1] == 0 or len(hmms) == 0:
+        return log_p
+    alpha = start[:, np.newaxis, :] * emi_t[:, obs[:, 0], :]
+    for t in xrange(obs.shape[1]):
+        if t > 0:
+            alpha = np.einsum('mbi,mij->mbj', alpha, trans) * emi_t[:, obs[:, t], :]
+        c = alpha.sum(axis=2)
+        active = t < lengths
+        with np.errstate(invalid="ignore", divide="ignore"):
+            log_p[:, active] += np.log(c[:, active])
+            alpha = np.where((c > 0.)[:, :, np.newaxis], alpha / c[:, :, np.newaxis], 0.)
+    return log_p
+
+
+def _pad(seq):
+    """Pads a list of lists of symbols to a rectangular array.
+
+    :param seq: A list of lists of symbols, or a single list of symbols
+
+    :return: The BxT integer array of symbols, padded with 0, and the B lengths
+    """
+    if len(seq) and not hasattr(seq[0], "__len__"):
+        seq = [seq]
+    lengths = np.array([len(s) for s in seq], dtype=int)
+    obs = np.zeros((len(seq), lengths.max() if len(seq) else 0), dtype=int)
+    for i, s in enumerate(seq):
+        obs[i, :len(s)] = s
+    return obs, lengths
+
+
+def _normalize_rows(m, default=None):
+    """Normalises the rows of a matrix to sum to 1.
+
+    :param m: The matrix
+    :param default: The rows to use where the rows of 'm' sum to 0. If None these rows are kept as they are.
+
+    :return: The normalised matrix
+    """
+    s = m.sum(axis=1, keepdims=True)
+    ret = m / np.where(s > 0., s, 1.)
+    if default is not None:
+        ret = np.where(s > 0., ret, default)
+    return ret
+
+
+def _cumulative_table(probs):
+    """Creates the flat table of the cumulative probabilities of each row of a
+    matrix, normalised to end at 1 and offset by the index of the row, so that
+    '_draw' can look up any row with one 'searchsorted'. Rows summing to 0 draw
+    the first column.
+
+    :param probs: The RxK probability matrix
+
+    :return: The R*K cumulative table
+    """
+    cum = np.cumsum(probs, axis=1)
+    total = cum[:, -1:]
+    cum = np.where(total > 0., cum / np.where(total > 0., total, 1.), 1.)
+    return (cum + np.arange(probs.shape[0])[:, np.newaxis]).ravel()
+
+
+def _draw(table, rows, u, num_cols):
+    """Draws one column index for each of the given rows by inverse CDF lookup.
+
+    :param table: The cumulative table created by '_cumulative_table'
+    :param rows: The B rows to draw from
+    :param u: The B uniform random numbers in [0, 1)
+    :param num_cols: The number of columns of the table
+
+    :return: The B drawn indices
+    """
+    ret = np.searchsorted(table, rows + u, side="right") - rows * num_cols
+    return np.minimum(ret, num_cols-1)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
-from abc import ABCMeta
+from abc import ABCMeta, abstractmethod
+import warnings
 import numpy as np
 from qsrrep_hmms.hmm_abstractclass import HMMAbstractclass
 
@@ -8,6 +9,9 @@ from qsrrep_hmms.hmm_abstractclass import HMMAbstractclass
 class QTCHMMAbstractclass(HMMAbstractclass):
     __metaclass__ = ABCMeta
 
+    _symbol_tables = {}
+    _cnd_cache = {}
+
     def __init__(self):
         super(QTCHMMAbstractclass, self).__init__()
 
@@ -20,28 +24,10 @@ class QTCHMMAbstractclass(HMMAbstractclass):
         :return: The transition matrix only allowing transitions according to the CND
         """
 
-        qtc = np.array(kwargs["qtc"])
-
-        # TODO insert matlab documentation on how this works here
         trans = np.zeros((size, size))
-        for i1 in xrange(qtc.shape[0]):
-            for i2 in xrange(i1+1, qtc.shape[0]):
-                trans[i1+1, i2+1] = np.nanmax(np.absolute(qtc[i1]-qtc[i2])) != 2
-                if trans[i1+1, i2+1] == 1:
-                    for j1 in xrange(qtc.shape[1]-1):
-                        for j2 in xrange(j1+1, qtc.shape[1]):
-                            if sum(np.absolute(qtc[i1, [j1, j2]])) == 1 \
-                                    and sum(np.absolute(qtc[i2, [j1, j2]])) == 1:
-                                if np.nanmax(np.absolute(qtc[i1, [j1, j2]]-qtc[i2, [j1, j2]])) > 0 \
-                                        and sum(qtc[i1, [j1, j2]]-qtc[i2, [j1,j2]]) != 1:
-                                    trans[i1+1, i2+1] = 5
-                                    break
-                        if trans[i1+1, i2+1] != 1:
-                            break
-                trans[i2+1, i1+1] = trans[i1+1, i2+1]
+        trans[1:-1, 1:-1] = self.get_cnd(kwargs["qtc"])
 
         # Setting start and end transition probs and pseudo probs
-        trans[trans != 1] = 0
         trans[trans == 0] = 0.00001
         trans[0] = 1
         trans[:, 0] = 0
@@ -53,6 +39,44 @@ class QTCHMMAbstractclass(HMMAbstractclass):
 
         return trans / trans.sum(axis=1).reshape(-1, 1)
 
+    def get_cnd(self, qtc):
+        """Gets the Conditional Neighbourhood Diagram of the qtc states, i.e.
+        which states can follow each other. It is computed once per qtc
+        variant, for all pairs of states at once.
+
+        Two different states are neighbours if no relation changes directly
+        between - and +, and no two relations of which exactly one is 0
+        swap, e.g. from '0+' to '+0' or '-0'.
+
+        :param qtc: list of lists containing all possible qtc states, NaN for the relations a state does not have
+
+        :return: The boolean matrix of the neighbouring states, without the start and end states
+        """
+
+        try:
+            return self._cnd_cache[self.__class__].copy()
+        except KeyError:
+            pass
+
+        qtc = np.array(qtc, dtype=float)
+        q1 = qtc[:, np.newaxis, :]
+        q2 = qtc[np.newaxis, :, :]
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning) # All-NaN relations of qtcb states in qtcbc
+            cnd = np.nanmax(np.absolute(q1 - q2), axis=2) != 2
+            for j1 in xrange(qtc.shape[1]-1):
+                for j2 in xrange(j1+1, qtc.shape[1]):
+                    j = [j1, j2]
+                    d = q1[:, :, j] - q2[:, :, j]
+                    cnd &= ~((np.absolute(q1[:, :, j]).sum(axis=2) == 1)
+                             & (np.absolute(q2[:, :, j]).sum(axis=2) == 1)
+                             & (np.nanmax(np.absolute(d), axis=2) > 0))
+
+        # The self transitions only get the pseudo probabilities
+        np.fill_diagonal(cnd, False)
+        self._cnd_cache[self.__class__] = cnd
+        return cnd.copy()
+
     def _create_emission_matrix(self, size, **kwargs):
         """Creating an emission matrix with the highest prob along the diagonal
         and a "pseudo" prob for all other states.
@@ -99,6 +123,38 @@ class QTCHMMAbstractclass(HMMAbstractclass):
 
         return state_rep
 
+    def get_end_symbol(self):
+        """Getting the symbol ending all the qtc state chains.
+
+        :return: The end symbol
+        """
+        return self.num_possible_states-1
+
+    @abstractmethod
+    def symbol_to_qsr(self, symbol):
+        """Transforms an alphabet symbol to the corresponding qtc state.
+
+        :return: The qtc state as a numpy array
+        """
+        return
+
+    def _symbol_to_qsr(self, symbols):
+        """Transforming alphabet symbols to qtc states, leaving out the start
+        and end symbols. The strings of all the symbols are computed once per
+        qtc variant and looked up.
+
+        :param symbols: A list of lists of symbols
+
+        :return: The list of lists of corresponding qtc strings
+        """
+        try:
+            table = self._symbol_tables[self.__class__]
+        except KeyError:
+            table = self._qtc_num_to_str([self.symbol_to_qsr(c) for c in xrange(self.num_possible_states)])
+            self._symbol_tables[self.__class__] = table
+
+        return [[table[c] for c in s[1:-1]] for s in symbols]
+
     def _qtc_num_to_str(self, qtc_num_list):
         """Transforms qtc array representation to string
 
@@ -29,24 +29,6 @@ class QTCBHMM(QTCHMMAbstractclass):
         # Calling parent to generate actual matrix
         return super(QTCBHMM, self)._create_transition_matrix(size=size, qtc=qtc)
 
-    def _symbol_to_qsr(self, symbols):
-        """Transforming alphabet symbols to QTCB states.
-
-        :param symbols: A list of symbols
-
-        :return: The list of corresponding qtc symbols
-        """
-
-        ret = []
-        for s in symbols:
-            qtc = []
-            for c in s[1:-1]:
-                qtc.append(self.symbol_to_qsr(c))
-
-            ret.append(self._qtc_num_to_str(qtc))
-
-        return ret
-
     def symbol_to_qsr(self, symbol):
         rc = np.array([symbol-1])
         f = np.array([np.floor(rc[0]/self.multiplier[0])])
@@ -37,26 +37,16 @@ class QTCBCHMM(QTCHMMAbstractclass):
         # Calling parent to generate actual matrix
         return super(QTCBCHMM, self)._create_transition_matrix(size=size, qtc=qtc)
 
-    def _symbol_to_qsr(self, symbols):
-        """Transforming alphabet symbols to QTCBC states.
+    def symbol_to_qsr(self, symbol):
+        """Transforming an alphabet symbol to a QTCB or QTCC state.
 
-        :param symbols: A list of symbols
+        :param symbol: The symbol
 
-        :return: The list of corresponding qtc symbols
+        :return: The qtc state as a numpy array
         """
-
-        ret = []
-        for s in symbols:
-            qtc = []
-            for c in s[1:-1]:
-                if c <= 9: # QTCB
-                    qtc.append(self.qtcb.symbol_to_qsr(c))
-                else:
-                    qtc.append(self.qtcc.symbol_to_qsr(c-9))
-
-            ret.append(self._qtc_num_to_str(qtc))
-
-        return ret
+        if symbol <= 9: # QTCB
+            return self.qtcb.symbol_to_qsr(symbol)
+        return self.qtcc.symbol_to_qsr(symbol-9)
 
     def _qsr_to_symbol(self, qsr_data):
         """Transforms a qtc state chain to a list of numbers
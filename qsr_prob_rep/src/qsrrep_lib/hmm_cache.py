@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+import hashlib
+import numpy as np
+
+
+class HMMCache(object):
+    """A least recently used cache of built HMM objects, so that a model sent
+    many times is only built once. Counts the hits and misses of 'get'."""
+
+    def __init__(self, max_size=128):
+        """
+        :param max_size: The maximum number of HMMs kept
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__hmms = OrderedDict()
+
+    @staticmethod
+    def digest(qsr_type, trans, emi, start):
+        """Creates a digest of the parameters of a HMM, used as its id.
+
+        :param qsr_type: The QSR the HMM is modelling
+        :param trans: The transition matrix
+        :param emi: The emission matrix
+        :param start: The start probabilities
+
+        :return: The hex digest as a string
+        """
+        h = hashlib.sha1(str(qsr_type).encode("utf-8"))
+        for m in (trans, emi, start):
+            m = np.ascontiguousarray(m, dtype=np.float64)
+            h.update(str(m.shape).encode("utf-8"))
+            h.update(m)
+        return h.hexdigest()
+
+    def get(self, key):
+        """Getting a HMM and marking it as the most recently used.
+
+        :param key: The key of the HMM
+
+        :return: The HMM or None if it is not in the cache
+        """
+        try:
+            hmm = self.__hmms.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.__hmms[key] = hmm
+        self.hits += 1
+        return hmm
+
+    def put(self, key, hmm):
+        """Adding a HMM, removing the least recently used ones if the cache is full.
+
+        :param key: The key of the HMM
+        :param hmm: The HMM object
+        """
+        self.__hmms.pop(key, None)
+        self.__hmms[key] = hmm
+        while len(self.__hmms) > self.max_size:
+            self.__hmms.popitem(last=False)
+
+    def clear(self):
+        """Removing all the HMMs and resetting the counters."""
+        self.__hmms.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """Getting the state of the cache.
+
+        :return: A dictionary with the number of 'hits', 'misses', the current 'size' and the 'max_size'
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.__hmms),
+            "max_size": self.max_size
+        }
@@ -2,14 +2,15 @@
 
 #from rep_abstractclass import RepAbstractclass
 from rep_io import ServiceManager
-from rep_io_hmm import HMMRepRequestCreate, HMMRepRequestSample, HMMRepRequestLogLikelihood
-from rep_io_hmm import HMMReqResponseCreate, HMMReqResponseSample, HMMReqResponseLogLikelihood
+from rep_io_hmm import HMMRepRequestCreate, HMMRepRequestSample, HMMRepRequestLogLikelihood, HMMRepRequestLogLikelihoods
+from rep_io_hmm import HMMReqResponseCreate, HMMReqResponseSample, HMMReqResponseLogLikelihood, HMMReqResponseLogLikelihoods
+from rep_io_hmm import HMMRepRequestRegister, HMMRepRequestCacheInfo, HMMReqResponseRegister, HMMReqResponseCacheInfo
+from hmm_cache import HMMCache
 from qsrrep_hmms.qtcc_hmm import QTCCHMM
 from qsrrep_hmms.qtcb_hmm import QTCBHMM
 from qsrrep_hmms.qtcbc_hmm import QTCBCHMM
 from qsrrep_hmms.rcc3_hmm import RCC3HMM
 from qsrrep_hmms.generic_hmm import GenericHMM
-import ghmm as gh
 import json
 
 
@@ -28,6 +29,9 @@ class RepHMM(object):
 
     namespace = "hmm"
 
+    model_cache = HMMCache()
+    __registered_models = {}
+
     def __init__(self):
         pass
 
@@ -40,6 +44,7 @@ class RepHMM(object):
             * qsr_type: The type of HMM, needs to be a key in 'hmm_types_available'
             * qsr_seq: The list of lists of the QSR state chains
             * store: Unused. Might leave that to client side.
+            * backend: The HMM implementation, 'ghmm' or 'numpy'
 
         :return: A 'HMMReqResponseCreate' object containing the resulting data
 
@@ -57,9 +62,11 @@ class RepHMM(object):
 
         :param kwargs:
             * qsr_type: The type of HMM, needs to be a key in 'hmm_types_available'
-            * xml: The xml representation of the HMM from which to sample
+            * dictionary: The dictionary representation of the HMM from which to sample
+            * model_id: The id of a registered HMM, used instead of dictionary
             * max_length: The maximum length of the sample. This will be kept if at all possible
             * num_samples: The number of samples to take
+            * backend: The HMM implementation, 'ghmm' or 'numpy'
 
 
         :return: A 'HMMReqResponseSamples' object containing the resulting data
@@ -67,7 +74,7 @@ class RepHMM(object):
         """
         num_symbols = len(kwargs["lookup_table"]) if kwargs["qsr_type"] == "generic" else self.hmm_types_available[kwargs["qsr_type"]]().get_num_possible_states()
         sample = self.hmm_types_available[kwargs["qsr_type"]]().get_samples(
-            hmm=self.__create_hmm_from_dict(dictionary=kwargs["dictionary"], qsr_type=kwargs["qsr_type"], num_symbols=num_symbols),
+            hmm=self.__get_hmm(dictionary=kwargs["dictionary"], model_id=kwargs.get("model_id"), qsr_type=kwargs["qsr_type"], num_symbols=num_symbols, backend=kwargs.get("backend", "ghmm")),
             **kwargs
         )
         return HMMReqResponseSample(data=json.dumps(sample), qsr_type=kwargs["qsr_type"])
@@ -80,8 +87,10 @@ class RepHMM(object):
 
         :param kwargs:
             * qsr_type: The type of HMM, needs to be a key in 'hmm_types_available'
-            * xml: The xml representation of the HMM from which to sample
+            * dictionary: The dictionary representation of the HMM
+            * model_id: The id of a registered HMM, used instead of dictionary
             * qsr_seq: A list of lists of QSR state chains to check against the given HMM
+            * backend: The HMM implementation, 'ghmm' or 'numpy'
 
 
         :return: A 'HMMReqResponseLogLikelihood' object containing the resulting data
@@ -89,11 +98,100 @@ class RepHMM(object):
         """
         num_symbols = len(kwargs["lookup_table"]) if kwargs["qsr_type"] == "generic" else self.hmm_types_available[kwargs["qsr_type"]]().get_num_possible_states()
         loglike = self.hmm_types_available[kwargs["qsr_type"]]().get_log_likelihood(
-            hmm=self.__create_hmm_from_dict(dictionary=kwargs["dictionary"], qsr_type=kwargs["qsr_type"], num_symbols=num_symbols),
+            hmm=self.__get_hmm(dictionary=kwargs["dictionary"], model_id=kwargs.get("model_id"), qsr_type=kwargs["qsr_type"], num_symbols=num_symbols, backend=kwargs.get("backend", "ghmm")),
             **kwargs
         )
         return HMMReqResponseLogLikelihood(data=json.dumps(loglike), qsr_type=kwargs["qsr_type"])
 
+    @ServiceManager.service_function(namespace, HMMRepRequestLogLikelihoods, HMMReqResponseLogLikelihoods)
+    def log_likelihoods(self, **kwargs):
+        """Calculates the loglikelihood of each of the given state chains for each of the given HMMs
+        by calling the get_log_likelihoods function in hmm_abstractclass.py. The HMMs are scored
+        with the numpy backend, all at once.
+        Called by the 'HMMRepRequestLogLikelihoods' request class in rep_io.py.
+
+        :param kwargs:
+            * qsr_type: The type of the HMMs, needs to be a key in 'hmm_types_available'
+            * dictionaries: The list of M dictionary representations of the HMMs, or None
+            * model_ids: The list of M ids of registered HMMs, used if dictionaries is None
+            * qsr_seq: A list of N lists of QSR state chains to check against the given HMMs
+
+
+        :return: A 'HMMReqResponseLogLikelihoods' object containing the MxN loglikelihoods
+
+        """
+        num_symbols = len(kwargs["lookup_table"]) if kwargs["qsr_type"] == "generic" else self.hmm_types_available[kwargs["qsr_type"]]().get_num_possible_states()
+        dictionaries, model_ids = kwargs["dictionaries"], kwargs["model_ids"]
+        if dictionaries is None:
+            dictionaries = [None] * len(model_ids)
+        else:
+            model_ids = [None] * len(dictionaries)
+        loglikes = self.hmm_types_available[kwargs["qsr_type"]]().get_log_likelihoods(
+            hmms=[self.__get_hmm(dictionary=d, model_id=m, qsr_type=kwargs["qsr_type"], num_symbols=num_symbols, backend="numpy") for d, m in zip(dictionaries, model_ids)],
+            **kwargs
+        )
+        return HMMReqResponseLogLikelihoods(data=json.dumps(loglikes.tolist()), qsr_type=kwargs["qsr_type"])
+
+    @ServiceManager.service_function(namespace, HMMRepRequestRegister, HMMReqResponseRegister)
+    def register(self, **kwargs):
+        """Registers a HMM on the server, so that the other requests can refer
+        to it by its id instead of sending its matrices again.
+        Called by the 'HMMRepRequestRegister' request class in rep_io.py.
+
+        :param kwargs:
+            * qsr_type: The type of HMM, needs to be a key in 'hmm_types_available'
+            * dictionary: The dictionary representation of the HMM
+
+        :return: A 'HMMReqResponseRegister' object containing the id of the HMM, a digest of its matrices and qsr_type
+
+        """
+        d = kwargs["dictionary"]
+        model_id = self.model_cache.digest(kwargs["qsr_type"], d[self.TRANS], d[self.EMI], d[self.START])
+        self.__registered_models[model_id] = (kwargs["qsr_type"], d)
+        return HMMReqResponseRegister(data=model_id, qsr_type=kwargs["qsr_type"])
+
+    @ServiceManager.service_function(namespace, HMMRepRequestCacheInfo, HMMReqResponseCacheInfo)
+    def cache_info(self, **kwargs):
+        """Gets the hit and miss counters and the size of the cache of built
+        HMMs, and the number of registered HMMs.
+        Called by the 'HMMRepRequestCacheInfo' request class in rep_io.py.
+
+        :return: A 'HMMReqResponseCacheInfo' object containing the resulting data
+
+        """
+        info = self.model_cache.info()
+        info["registered"] = len(self.__registered_models)
+        return HMMReqResponseCacheInfo(data=json.dumps(info), qsr_type=None)
+
+    def __get_hmm(self, dictionary, model_id, qsr_type, num_symbols, backend="ghmm"):
+        """Gets the hmm from the cache, or creates it from its dictionary
+        representation and adds it to the cache. The cache is keyed by the
+        digest of the matrices and qsr_type, the backend and the number of
+        symbols.
+
+        :param dictionary: The dictionary containing the transition, emission, and start probailities, or None
+        :param model_id: The id of a registered HMM, used if dictionary is None
+        :param backend: The HMM implementation, 'ghmm' or 'numpy'
+
+        :return: the ghmm hmm object or a 'NumpyHMM'
+        """
+        if dictionary is None:
+            try:
+                registered_type, dictionary = self.__registered_models[model_id]
+            except KeyError:
+                raise KeyError("No HMM registered with id %s" % model_id)
+            if registered_type != qsr_type:
+                raise ValueError("The HMM %s models %s, not %s" % (model_id, registered_type, qsr_type))
+        else:
+            model_id = self.model_cache.digest(qsr_type, dictionary[self.TRANS], dictionary[self.EMI], dictionary[self.START])
+
+        key = (model_id, backend, num_symbols)
+        hmm = self.model_cache.get(key)
+        if hmm is None:
+            hmm = self.__create_hmm_from_dict(dictionary=dictionary, qsr_type=qsr_type, num_symbols=num_symbols, backend=backend)
+            self.model_cache.put(key, hmm)
+        return hmm
+
     def __create_dict_from_hmm(self, hmm):
         """Creates a dictionary representation of the hmm.
 
@@ -111,21 +209,20 @@ class RepHMM(object):
 
         return ret
 
-    def __create_hmm_from_dict(self, dictionary, qsr_type, num_symbols):
-        """Creates a hmm from the xml representation. Not nice to use tempfile
-        but not otherwise possible due to hidden code and swig in ghmm.
+    def __create_hmm_from_dict(self, dictionary, qsr_type, num_symbols, backend="ghmm"):
+        """Creates a hmm from the dictionary representation.
 
-        :param xml: The xml string
+        :param dictionary: The dictionary containing the transition, emission, and start probailities
+        :param backend: The HMM implementation, 'ghmm' or 'numpy'
 
-        :return: the ghmm hmm object
+        :return: the ghmm hmm object or a 'NumpyHMM'
         """
-        symbols = self.hmm_types_available[qsr_type]().generate_alphabet(num_symbols)
-        hmm = gh.HMMFromMatrices(
-            symbols,
-            gh.DiscreteDistribution(symbols),
+        hmm = self.hmm_types_available[qsr_type]().create_hmm_from_matrices(
             dictionary[self.TRANS],
             dictionary[self.EMI],
-            dictionary[self.START]
+            dictionary[self.START],
+            num_symbols,
+            backend=backend
         )
 
         return hmm
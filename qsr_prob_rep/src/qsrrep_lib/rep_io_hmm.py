@@ -65,11 +65,12 @@ class HMMReqResponseAbstractclass(ReqResponseAbstractclass):
 
 class HMMRepRequestCreate(HMMRepRequestAbstractclass):
 
-    def __init__(self, qsr_type, qsr_seq, pseudo_transitions=False, lookup_table=None, transition_matrix=None, emission_matrix=None, start_at_zero=False):
+    def __init__(self, qsr_type, qsr_seq, pseudo_transitions=False, lookup_table=None, transition_matrix=None, emission_matrix=None, start_at_zero=False, backend="ghmm"):
         """
         :param qsr_type: The QSR this HMM is modelling
         :param qsr_seq: The list of lists of the QSR state chains
         :param store: Unused. Might leave that to client side.
+        :param backend: The HMM implementation, 'ghmm' or 'numpy'
         """
         super(self.__class__, self).__init__()
         self.kwargs = {
@@ -79,7 +80,8 @@ class HMMRepRequestCreate(HMMRepRequestAbstractclass):
             "lookup_table": lookup_table,
             "transition_matrix": transition_matrix,
             "emission_matrix": emission_matrix,
-            "start_at_zero": start_at_zero
+            "start_at_zero": start_at_zero,
+            "backend": backend
         }
 
 
@@ -94,20 +96,24 @@ class HMMReqResponseCreate(HMMReqResponseAbstractclass):
 
 class HMMRepRequestSample(HMMRepRequestAbstractclass):
 
-    def __init__(self, qsr_type, dictionary, max_length, num_samples=1, lookup_table=None):
+    def __init__(self, qsr_type, dictionary, max_length, num_samples=1, lookup_table=None, backend="ghmm", model_id=None):
         """
         :param qsr_type: The QSR this HMM is modelling
-        :param dictionary: The HMM in its dictionary json representation
+        :param dictionary: The HMM in its dictionary json representation, None if model_id is given
         :param max_length: The maximum length of the sample. This will be kept if at all possible
         :param num_samples: The number of samples to take
+        :param backend: The HMM implementation, 'ghmm' or 'numpy'
+        :param model_id: The id of a HMM registered with 'HMMRepRequestRegister', used instead of dictionary
         """
         super(self.__class__, self).__init__()
         self.kwargs = {
             "qsr_type": qsr_type,
-            "dictionary": dictionary if isinstance(dictionary, dict) else json.loads(dictionary),
+            "dictionary": dictionary if dictionary is None or isinstance(dictionary, dict) else json.loads(dictionary),
             "max_length": max_length,
             "num_samples": num_samples,
-            "lookup_table": lookup_table
+            "lookup_table": lookup_table,
+            "backend": backend,
+            "model_id": model_id
         }
 
 
@@ -122,18 +128,22 @@ class HMMReqResponseSample(HMMReqResponseAbstractclass):
 
 class HMMRepRequestLogLikelihood(HMMRepRequestAbstractclass):
 
-    def __init__(self, qsr_type, dictionary, qsr_seq, lookup_table=None):
+    def __init__(self, qsr_type, dictionary, qsr_seq, lookup_table=None, backend="ghmm", model_id=None):
         """
         :param qsr_type: The QSR this HMM is modelling
-        :param dictionary: The HMM in its dictionary json representation
+        :param dictionary: The HMM in its dictionary json representation, None if model_id is given
         :param qsr_seq: A list of lists of QSR state chains to check against the given HMM
+        :param backend: The HMM implementation, 'ghmm' or 'numpy'
+        :param model_id: The id of a HMM registered with 'HMMRepRequestRegister', used instead of dictionary
         """
         super(self.__class__, self).__init__()
         self.kwargs = {
             "qsr_type": qsr_type,
-            "dictionary": dictionary if isinstance(dictionary, dict) else json.loads(dictionary),
+            "dictionary": dictionary if dictionary is None or isinstance(dictionary, dict) else json.loads(dictionary),
             "qsr_seq": qsr_seq,
-            "lookup_table": lookup_table
+            "lookup_table": lookup_table,
+            "backend": backend,
+            "model_id": model_id
         }
 
 
@@ -144,3 +154,72 @@ class HMMReqResponseLogLikelihood(HMMReqResponseAbstractclass):
         :return: The accumulated loglikelihood of the given state chains being produced by the given HMM as a json.dump
         """
         return super(self.__class__, self).get()
+
+
+class HMMRepRequestLogLikelihoods(HMMRepRequestAbstractclass):
+
+    def __init__(self, qsr_type, dictionaries, qsr_seq, lookup_table=None, model_ids=None):
+        """
+        :param qsr_type: The QSR the HMMs are modelling
+        :param dictionaries: The list of M HMMs in their dictionary json representation, None if model_ids is given
+        :param qsr_seq: A list of N lists of QSR state chains to check against each of the given HMMs
+        :param model_ids: The list of M ids of HMMs registered with 'HMMRepRequestRegister', used instead of dictionaries
+        """
+        super(self.__class__, self).__init__()
+        if (dictionaries is None) == (model_ids is None):
+            raise ValueError("Exactly one of dictionaries and model_ids has to be given")
+        self.kwargs = {
+            "qsr_type": qsr_type,
+            "dictionaries": None if dictionaries is None else [d if isinstance(d, dict) else json.loads(d) for d in dictionaries],
+            "qsr_seq": qsr_seq,
+            "lookup_table": lookup_table,
+            "model_ids": model_ids
+        }
+
+
+class HMMReqResponseLogLikelihoods(HMMReqResponseAbstractclass):
+
+    def get(self):
+        """
+        :return: The MxN list of lists of the loglikelihoods of each state chain being produced by each HMM as a json.dump
+        """
+        return super(self.__class__, self).get()
+
+
+class HMMRepRequestRegister(HMMRepRequestAbstractclass):
+
+    def __init__(self, qsr_type, dictionary):
+        """
+        :param qsr_type: The QSR this HMM is modelling
+        :param dictionary: The HMM in its dictionary json representation
+        """
+        super(self.__class__, self).__init__()
+        self.kwargs = {
+            "qsr_type": qsr_type,
+            "dictionary": dictionary if isinstance(dictionary, dict) else json.loads(dictionary)
+        }
+
+
+class HMMReqResponseRegister(HMMReqResponseAbstractclass):
+
+    def get(self):
+        """
+        :return: The id of the registered HMM as a str
+        """
+        return str(super(self.__class__, self).get())
+
+
+class HMMRepRequestCacheInfo(HMMRepRequestAbstractclass):
+
+    def __init__(self):
+        super(self.__class__, self).__init__()
+        self.kwargs = {}
+
+
+class HMMReqResponseCacheInfo(HMMReqResponseAbstractclass):
+
+    def get(self):
+        """
+        :return: The hits, misses, size and max_size of the HMM cache and the number of registered HMMs as a json.dump
+        """
+        return super(self.__class__, self).get()
@@ -7,7 +7,8 @@ import sys
 import unittest
 from roslib.packages import find_resource
 from qsrrep_ros.ros_client import ROSClient
-from qsrrep_lib.rep_io_hmm import HMMRepRequestCreate, HMMRepRequestSample, HMMRepRequestLogLikelihood
+from qsrrep_lib.rep_io_hmm import HMMRepRequestCreate, HMMRepRequestSample, HMMRepRequestLogLikelihood, HMMRepRequestLogLikelihoods
+from qsrrep_lib.rep_io_hmm import HMMRepRequestRegister, HMMRepRequestCacheInfo
 import json
 import hashlib
 
@@ -53,37 +54,40 @@ class TestHMM(unittest.TestCase):
 
         self.r = ROSClient()
 
-    def _create_hmm(self, qsr_file, qsr_type, start_at_zero=True):
+    def _create_hmm(self, qsr_file, qsr_type, start_at_zero=True, backend="ghmm"):
         with open(qsr_file, 'r') as f: qsr_seq = json.load(f)
         d = self.r.call_service(
             HMMRepRequestCreate(
                 qsr_seq=qsr_seq,
                 qsr_type=qsr_type,
-                start_at_zero=start_at_zero
+                start_at_zero=start_at_zero,
+                backend=backend
             )
         )
         return d
 
-    def _create_sample(self, hmm_file, qsr_type):
+    def _create_sample(self, hmm_file, qsr_type, backend="ghmm"):
         with open(hmm_file, 'r') as f: hmm = json.load(f)
         s = self.r.call_service(
             HMMRepRequestSample(
                 qsr_type=qsr_type,
                 dictionary=hmm,
                 max_length=10,
-                num_samples=1
+                num_samples=1,
+                backend=backend
             )
         )
         return s
 
-    def _calculate_loglikelihood(self, hmm_file, qsr_file, qsr_type):
+    def _calculate_loglikelihood(self, hmm_file, qsr_file, qsr_type, backend="ghmm"):
         with open(qsr_file, 'r') as f: qsr_seq = json.load(f)
         with open(hmm_file, 'r') as f: hmm = json.load(f)
         l = self.r.call_service(
             HMMRepRequestLogLikelihood(
                 qsr_type=qsr_type,
                 dictionary=hmm,
-                qsr_seq=qsr_seq
+                qsr_seq=qsr_seq,
+                backend=backend
             )
         )
         return round(l, 5)
@@ -139,6 +143,112 @@ class TestHMM(unittest.TestCase):
         res = self._calculate_loglikelihood(self.RCC3_TEST_HMM, self.RCC3_QSR, 'rcc3')
         self.assertEqual(res, self.correct_loglikelihoods["rcc3"])
 
+    def test_numpy_loglikelihood(self):
+        for hmm_file, qsr_file, qsr_type in [
+            (self.QTCB_PASSBY_LEFT_HMM, self.QTCB_QSR, 'qtcb'),
+            (self.QTCC_PASSBY_LEFT_HMM, self.QTCC_QSR, 'qtcc'),
+            (self.QTCBC_PASSBY_LEFT_HMM, self.QTCBC_QSR, 'qtcbc'),
+            (self.RCC3_TEST_HMM, self.RCC3_QSR, 'rcc3')
+        ]:
+            res = self._calculate_loglikelihood(hmm_file, qsr_file, qsr_type, backend="numpy")
+            self.assertEqual(res, self.correct_loglikelihoods[qsr_type])
+
+    def test_numpy_sample(self):
+        for hmm_file, qsr_type in [
+            (self.QTCB_SAMPLE_TEST_HMM, 'qtcb'),
+            (self.QTCC_SAMPLE_TEST_HMM, 'qtcc'),
+            (self.QTCBC_SAMPLE_TEST_HMM, 'qtcbc')
+        ]:
+            res = self._create_sample(hmm_file, qsr_type, backend="numpy")
+            # The numpy sampler stops at the end symbol, so there is no trailing end state
+            self.assertEqual(res, [[x for x in s if x != u'---'] for s in self.correct_samples[qsr_type]])
+
+    def test_numpy_sample_many(self):
+        with open(self.QTCB_SAMPLE_TEST_HMM, 'r') as f: hmm = json.load(f)
+        res = self.r.call_service(
+            HMMRepRequestSample(
+                qsr_type='qtcb',
+                dictionary=hmm,
+                max_length=10,
+                num_samples=1000,
+                backend="numpy"
+            )
+        )
+        self.assertEqual(len(res), 1000)
+        self.assertTrue(all(s == self.correct_samples["qtcb"][0] for s in res))
+
+    def test_numpy_create(self):
+        for qsr_file, qsr_type in [
+            (self.QTCB_QSR, 'qtcb'),
+            (self.QTCC_QSR, 'qtcc'),
+            (self.QTCBC_QSR, 'qtcbc'),
+            (self.RCC3_QSR, 'rcc3')
+        ]:
+            with open(qsr_file, 'r') as f: qsr_seq = json.load(f)
+            res = [
+                self.r.call_service(
+                    HMMRepRequestLogLikelihood(
+                        qsr_type=qsr_type,
+                        dictionary=self._create_hmm(qsr_file, qsr_type, backend=backend),
+                        qsr_seq=qsr_seq,
+                        backend=backend
+                    )
+                ) for backend in ("ghmm", "numpy")
+            ]
+            self.assertAlmostEqual(res[0], res[1], places=3)
+
+    def test_log_likelihoods(self):
+        hmm_files = [self.QTCB_PASSBY_LEFT_HMM, self.QTCB_SAMPLE_TEST_HMM]
+        with open(self.QTCB_QSR, 'r') as f: qsr_seq = json.load(f)
+        hmms = []
+        for hmm_file in hmm_files:
+            with open(hmm_file, 'r') as f: hmms.append(json.load(f))
+        qsr_seqs = [qsr_seq, qsr_seq[:3], qsr_seq[1:]]
+        res = self.r.call_service(
+            HMMRepRequestLogLikelihoods(
+                qsr_type='qtcb',
+                dictionaries=hmms,
+                qsr_seq=qsr_seqs
+            )
+        )
+        self.assertEqual(len(res), len(hmms))
+        self.assertEqual(round(res[0][0], 5), self.correct_loglikelihoods["qtcb"])
+        for hmm, row in zip(hmms, res):
+            self.assertEqual(len(row), len(qsr_seqs))
+            for seq, l in zip(qsr_seqs, row):
+                single = self.r.call_service(
+                    HMMRepRequestLogLikelihood(
+                        qsr_type='qtcb',
+                        dictionary=hmm,
+                        qsr_seq=[seq],
+                        backend="numpy"
+                    )
+                )
+                self.assertAlmostEqual(l, single, places=8)
+        self.assertRaises(ValueError, HMMRepRequestLogLikelihoods, qsr_type='qtcb', dictionaries=None, qsr_seq=qsr_seqs)
+        self.assertRaises(ValueError, HMMRepRequestLogLikelihoods, qsr_type='qtcb', dictionaries=hmms, qsr_seq=qsr_seqs,
+                          model_ids=["id"] * len(hmms))
+
+    def test_registered_model(self):
+        with open(self.QTCB_PASSBY_LEFT_HMM, 'r') as f: hmm = json.load(f)
+        with open(self.QTCB_QSR, 'r') as f: qsr_seq = json.load(f)
+        model_id = self.r.call_service(HMMRepRequestRegister(qsr_type='qtcb', dictionary=hmm))
+        self.assertEqual(self.r.call_service(HMMRepRequestRegister(qsr_type='qtcb', dictionary=hmm)), model_id)
+        info = self.r.call_service(HMMRepRequestCacheInfo())
+        for _ in range(2):
+            l = self.r.call_service(HMMRepRequestLogLikelihood(qsr_type='qtcb', dictionary=None, qsr_seq=qsr_seq,
+                                                               backend="numpy", model_id=model_id))
+            self.assertEqual(round(l, 5), self.correct_loglikelihoods["qtcb"])
+        res = self.r.call_service(HMMRepRequestLogLikelihoods(qsr_type='qtcb', dictionaries=None, qsr_seq=[qsr_seq],
+                                                              model_ids=[model_id]))
+        self.assertEqual(round(res[0][0], 5), self.correct_loglikelihoods["qtcb"])
+        l = self._calculate_loglikelihood(self.QTCB_PASSBY_LEFT_HMM, self.QTCB_QSR, 'qtcb', backend="numpy")
+        self.assertEqual(l, self.correct_loglikelihoods["qtcb"])
+        new_info = self.r.call_service(HMMRepRequestCacheInfo())
+        self.assertEqual(new_info["hits"] + new_info["misses"], info["hits"] + info["misses"] + 4)
+        self.assertGreaterEqual(new_info["hits"], info["hits"] + 2)
+        self.assertGreaterEqual(new_info["registered"], 1)
+
 
 if __name__ == '__main__':
     import rostest